@@ -1,12 +1,38 @@
-from flask import Flask, request, render_template, redirect, url_for, session, flash, jsonify
+from flask import Flask, request, render_template, redirect, url_for, session, flash, jsonify, Response, stream_with_context, g
+from flask import before_render_template, template_rendered, send_file
 from werkzeug.utils import secure_filename
 import os
 import requests
 import json
 from dotenv import load_dotenv
 import base64
-from PIL import Image, ImageDraw, ImageFont
-import io
+from PIL import Image
+import secrets
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.classifier import LocalDiseaseClassifier
+from utils.result_cache import ResultCache, make_cache_key
+from utils.phash import PerceptualIndex
+from utils.preprocess import ImagePreprocessor
+from utils.ollama_pool import OllamaPool
+from utils.circuit_breaker import CircuitOpenError
+from utils.cassette import Cassette
+from utils.single_flight import SingleFlight
+from utils.prompts import PromptRegistry, DISEASE_PROMPT, SOIL_PROMPT, FERTILIZER_PROMPT
+from utils.response_parser import (
+    DISEASE_SCANNER, PLANT_INDICATORS, STRICT_NO_FLORA_PHRASES,
+    find_json_object, normalize_crop_name, parse_soil_text_response, parse_text_response, strip_code_fence
+)
+from utils.stream_parser import PartialFieldScanner, sse_event
+from utils.job_queue import JobQueue, JobQueueFull
+from utils.metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.token_usage import TokenUsage
+from utils.profiler import SamplingProfiler
+from utils.overlay import render_highlight, open_display_copy
+from utils.result_images import ResultImageStore, choose_format
 
 # Load environment variables
 load_dotenv()
@@ -19,11 +45,300 @@ UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# ---------------------------------------------
+# 🔹 Metrics
+# ---------------------------------------------
+
+# Served at /metrics in Prometheus text format. Stage timings are labelled with
+# the route whose work they belong to (background jobs and batch workers use
+# their own labels).
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram('axiom_stage_seconds', 'Time spent in each stage of an analysis',
+                                  ('route', 'stage'))
+HTTP_REQUESTS = metrics.counter('axiom_http_requests_total', 'Requests served', ('route', 'method', 'status'))
+HTTP_IN_FLIGHT = metrics.gauge('axiom_http_requests_in_flight', 'Requests being served', ('route',))
+HTTP_SECONDS = metrics.histogram('axiom_http_request_duration_seconds',
+                                 'Request time until the response body was sent', ('route',))
+
+
+def stage(name):
+    """Time a block into axiom_stage_seconds under the current route."""
+    return STAGE_SECONDS.time(route=metrics.current_route, stage=name)
+
+
+@app.before_request
+def start_request_metrics():
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.set_route(route)
+    g.metrics_route = route
+    g.metrics_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(route=route)
+
+
+@app.after_request
+def finish_request_metrics(response):
+    route = g.pop('metrics_route', None)
+    if route is None:
+        return response
+    started = g.pop('metrics_started')
+    method = request.method
+    status = response.status_code
+
+    # Streamed bodies are still being sent here, so count the request once it closes
+    def finish():
+        HTTP_IN_FLIGHT.dec(route=route)
+        HTTP_SECONDS.observe(time.perf_counter() - started, route=route)
+        HTTP_REQUESTS.inc(route=route, method=method, status=status)
+
+    response.call_on_close(finish)
+    return response
+
+
+_render_started = threading.local()
+
+
+def _start_template_timer(sender, template, context, **extra):
+    _render_started.value = time.perf_counter()
+
+
+def _stop_template_timer(sender, template, context, **extra):
+    started = getattr(_render_started, 'value', None)
+    if started is not None:
+        STAGE_SECONDS.observe(time.perf_counter() - started, route=metrics.current_route, stage='template_render')
+        _render_started.value = None
+
+
+before_render_template.connect(_start_template_timer, app)
+template_rendered.connect(_stop_template_timer, app)
+
+
+def save_upload(file, file_path):
+    with stage('upload_save'):
+        file.save(file_path)
+
+
+def read_file_bytes(file_path):
+    with stage('file_read'):
+        with open(file_path, 'rb') as f:
+            return f.read()
+
+
+def encode_base64(data):
+    with stage('base64_encode'):
+        return base64.b64encode(data).decode('utf-8')
+
+# ---------------------------------------------
+# 🔹 Profiling
+# ---------------------------------------------
+
+# /debug/profile and the X-Profile request header are only enabled when
+# PROFILE_TOKEN is set, and every use must present it (X-Profile-Token header)
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000.0
+PROFILE_FOLDER = os.getenv('PROFILE_FOLDER', os.path.join(app.instance_path, 'profiles'))
+PROFILED_ENDPOINTS = {'disease_prediction', 'disease_prediction_stream_upload', 'disease_prediction_stream'}
+# Only the newest PROFILE_KEEP per-request profiles are kept on disk
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+# One profile at a time, whole-process or per-request; they are not free and would sample each other
+profile_lock = threading.Lock()
+
+
+def profile_authorized():
+    supplied = request.headers.get('X-Profile-Token', '')
+    return bool(PROFILE_TOKEN) and secrets.compare_digest(supplied.encode(), PROFILE_TOKEN.encode())
+
+
+@app.before_request
+def start_request_profile():
+    if request.endpoint not in PROFILED_ENDPOINTS or not request.headers.get('X-Profile'):
+        return
+    if not profile_authorized():
+        return jsonify({"error": "Profiling is disabled or the X-Profile-Token is wrong"}), 403
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({"error": "A profile is already running"}), 409
+    g.request_profiler = SamplingProfiler(PROFILE_INTERVAL, thread_ids=[threading.get_ident()]).start()
+
+
+@app.after_request
+def finish_request_profile(response):
+    profiler = g.pop('request_profiler', None)
+    if profiler is None:
+        return response
+    profile_id = uuid.uuid4().hex
+    path = request.path
+    response.headers['X-Profile-Id'] = profile_id
+    response.headers['X-Profile-URL'] = url_for('saved_profile', profile_id=profile_id)
+    # Streamed bodies are generated after this hook, so keep sampling until the response is sent
+    response.call_on_close(lambda: save_request_profile(profiler, profile_id, path))
+    return response
+
+
+@app.teardown_request
+def abandon_request_profile(error=None):
+    # Only left here when the request failed before finish_request_profile ran
+    profiler = g.pop('request_profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        profile_lock.release()
+
+
+def save_request_profile(profiler, profile_id, path):
+    try:
+        profiler.stop()
+    finally:
+        profile_lock.release()
+    os.makedirs(PROFILE_FOLDER, exist_ok=True)
+    with open(os.path.join(PROFILE_FOLDER, f"{profile_id}.folded"), 'w') as f:
+        f.write(profiler.collapsed())
+    print(f"[PROFILE] {path}: {profiler.samples} samples over {profiler.elapsed:.2f}s -> {profile_id}")
+    remove_old_profiles()
+
+
+def remove_old_profiles():
+    saved = []
+    for name in os.listdir(PROFILE_FOLDER):
+        if name.endswith('.folded'):
+            path = os.path.join(PROFILE_FOLDER, name)
+            try:
+                saved.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+    for _, path in sorted(saved)[:max(len(saved) - PROFILE_KEEP, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# ---------------------------------------------
+# 🔹 Local Disease Classifier (ResNet9 fast path)
+# ---------------------------------------------
+
+# Images the local ResNet9 classifies below this probability fall through to Ollama
+DISEASE_MODEL_PATH = os.getenv('DISEASE_MODEL_PATH', 'model/plant_disease_model.pth')
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv('LOCAL_CLASSIFIER_THRESHOLD', '0.85'))
+LOCAL_CLASSIFIER_ENABLED = os.getenv('LOCAL_CLASSIFIER_ENABLED', 'True').lower() == 'true'
+
+local_classifier = None
+if LOCAL_CLASSIFIER_ENABLED:
+    local_classifier = LocalDiseaseClassifier(
+        DISEASE_MODEL_PATH,
+        threshold=LOCAL_CLASSIFIER_THRESHOLD,
+        num_threads=int(os.getenv('LOCAL_CLASSIFIER_THREADS', '0')) or None,
+        max_batch_size=int(os.getenv('CLASSIFIER_MAX_BATCH_SIZE', '8')),
+        max_wait_ms=float(os.getenv('CLASSIFIER_MAX_WAIT_MS', '10')),
+        max_entropy=float(os.getenv('LOCAL_CLASSIFIER_MAX_ENTROPY', '0.25'))
+    )
+    if local_classifier.available:
+        print(f"[CLASSIFIER] ResNet9 ({local_classifier.backend}) loaded from {DISEASE_MODEL_PATH} "
+              f"(threshold {LOCAL_CLASSIFIER_THRESHOLD})")
+    else:
+        print(f"[CLASSIFIER] Local tier disabled: {local_classifier.load_error}")
+
+# ---------------------------------------------
+# 🔹 Analysis Result Cache
+# ---------------------------------------------
+
+# Prompts are precompiled per language at import. The cache keys include each
+# prompt's version, so bump it in utils/prompts.py whenever the text changes.
+prompt_registry = PromptRegistry(
+    [DISEASE_PROMPT, SOIL_PROMPT, FERTILIZER_PROMPT],
+    keep_alive=os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+)
+DISEASE_PROMPT_VERSION = DISEASE_PROMPT.key
+SOIL_PROMPT_VERSION = SOIL_PROMPT.key
+
+# Token counts and generation speed per task, model and language, from the
+# metadata Ollama returns with every answer; one JSON line per call is kept
+# in a size-rotated log (OLLAMA_TOKEN_LOG= disables it)
+token_usage = TokenUsage(
+    os.getenv('OLLAMA_TOKEN_LOG', os.path.join(app.instance_path, 'ollama_tokens.log')) or None,
+    max_bytes=int(os.getenv('OLLAMA_TOKEN_LOG_BYTES', str(10 * 1024 * 1024))),
+    backups=int(os.getenv('OLLAMA_TOKEN_LOG_BACKUPS', '5')),
+    cold_load_ms=float(os.getenv('OLLAMA_COLD_LOAD_MS', '1000'))
+)
+
+result_cache = ResultCache(
+    os.getenv('RESULT_CACHE_DB', os.path.join(app.instance_path, 'result_cache.db')),
+    memory_entries=int(os.getenv('RESULT_CACHE_MEMORY_ENTRIES', '256')),
+    db_entries=int(os.getenv('RESULT_CACHE_DB_ENTRIES', '10000')),
+    ttl_seconds=int(os.getenv('RESULT_CACHE_TTL', str(7 * 24 * 3600)))
+)
+
+# Near-duplicate lookup catches resized / recompressed copies of earlier uploads
+PHASH_ENABLED = os.getenv('PHASH_ENABLED', 'True').lower() == 'true'
+phash_index = None
+if PHASH_ENABLED:
+    phash_index = PerceptualIndex(
+        os.getenv('PHASH_DB', os.path.join(app.instance_path, 'phash_index.db')),
+        max_distance=int(os.getenv('PHASH_MAX_DISTANCE', '4')),
+        hash_name=os.getenv('PHASH_ALGORITHM', 'dhash'),
+        # Near-duplicate hits must not outlive the exact-match entries they stand in for
+        ttl_seconds=int(os.getenv('RESULT_CACHE_TTL', str(7 * 24 * 3600))),
+        max_entries=int(os.getenv('PHASH_MAX_ENTRIES', '10000'))
+    )
+
+# Identical uploads analysed at the same time share a single Ollama call; with
+# SINGLE_FLIGHT_SHARED the lock is also shared between workers
+single_flight = SingleFlight(
+    os.getenv('SINGLE_FLIGHT_DB', os.path.join(app.instance_path, 'single_flight.db'))
+    if os.getenv('SINGLE_FLIGHT_SHARED', 'False').lower() == 'true' else None,
+    lock_ttl=float(os.getenv('SINGLE_FLIGHT_LOCK_TTL', '180'))
+)
+
+# Uploads are shrunk to the vision model's working size before being sent to Ollama
+image_preprocessor = ImagePreprocessor(
+    max_side=int(os.getenv('OLLAMA_IMAGE_MAX_SIDE', '672')),
+    quality=int(os.getenv('OLLAMA_IMAGE_QUALITY', '85')),
+    enabled=os.getenv('OLLAMA_IMAGE_PREPROCESS', 'True').lower() == 'true'
+)
+
+
+def encode_image_for_ollama(img_bytes):
+    """Preprocess an upload and return it base64-encoded for the Ollama images field."""
+    with stage('preprocess'):
+        payload, info = image_preprocessor.prepare(img_bytes)
+    print(f"[PREPROCESS] {info['original_bytes']} -> {info['payload_bytes']} bytes "
+          f"(saved {info['bytes_saved']})")
+    return encode_base64(payload)
+
+
+def find_cached_analysis(task, img_bytes, lang, prompt_version):
+    """Look up an earlier analysis of this image: exact bytes first, then perceptual near-duplicates.
+
+    Returns (result, cache_key, image_hash); result is None on a miss.
+    """
+    cache_key = make_cache_key(task, img_bytes, lang, prompt_version)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        print(f"[CACHE] {task} result served from cache ({cache_key[-12:]})")
+        return cached, cache_key, None
+
+    image_hash = None
+    if phash_index is not None:
+        try:
+            image_hash = phash_index.hash_image(img_bytes)
+            match, distance = phash_index.lookup(f"{task}:{prompt_version}:{lang}", image_hash)
+            if match is not None:
+                print(f"[PHASH] {task} near-duplicate found (distance {distance})")
+                result_cache.set(cache_key, match)
+                return match, cache_key, image_hash
+        except Exception as e:
+            print(f"[PHASH] Lookup failed: {e}")
+    return None, cache_key, image_hash
+
+
+def store_analysis(task, cache_key, image_hash, lang, prompt_version, result):
+    """Remember a fresh analysis in the exact cache and the perceptual index."""
+    result_cache.set(cache_key, result)
+    if phash_index is not None and image_hash is not None:
+        phash_index.add(f"{task}:{prompt_version}:{lang}", image_hash, result)
+
 # ---------------------------------------------
 # 🔹 Multilingual Support (English & Kannada)
 # ---------------------------------------------
@@ -42,6 +357,7 @@ TRANSLATIONS = {
         'crop_name': 'Crop Name',
         'symptoms_detected': 'Symptoms Detected',
         'confidence_level': 'Confidence Level',
+        'answered_by': 'Answered by',
         'treatment_recommendation': 'Treatment Recommendation',
         'no_flora_detected': 'No Flora Detected',
         'no_soil_detected': 'No Soil Detected',
@@ -236,6 +552,7 @@ TRANSLATIONS = {
         'crop_name': 'ಬೆಳೆಯ ಹೆಸರು',
         'symptoms_detected': 'ಪತ್ತೆಯಾದ ರೋಗಲಕ್ಷಣಗಳು',
         'confidence_level': 'ನಂಬಿಕೆಯ ಮಟ್ಟ',
+        'answered_by': 'ಉತ್ತರಿಸಿದ ಮಾದರಿ',
         'treatment_recommendation': 'ಚಿಕಿತ್ಸೆಯ ಶಿಫಾರಸು',
         'no_flora_detected': 'ಯಾವುದೇ ಸಸ್ಯ ಕಂಡುಬಂದಿಲ್ಲ',
         'no_soil_detected': 'ಯಾವುದೇ ಮಣ್ಣು ಕಂಡುಬಂದಿಲ್ಲ',
@@ -440,26 +757,243 @@ app.jinja_env.globals['translate'] = translate
 app.jinja_env.globals['get_translations'] = get_translations
 app.jinja_env.globals['get_language'] = get_language
 
+# Comma-separated list of Ollama servers; OLLAMA_API_URL is still honoured for a single one
+OLLAMA_BACKEND_URLS = [
+    url.strip().rstrip('/')
+    for url in os.getenv('OLLAMA_API_URLS', os.getenv('OLLAMA_API_URL', 'http://localhost:11434')).split(',')
+    if url.strip()
+]
+OLLAMA_BASE_URL = ', '.join(OLLAMA_BACKEND_URLS)
+
+# Record Ollama traffic to a cassette file, or replay it without Ollama running
+# (for reproducible performance tests of the parsing, caching and routing layers)
+OLLAMA_CASSETTE = os.getenv('OLLAMA_CASSETTE')
+ollama_cassette = None
+if OLLAMA_CASSETTE:
+    ollama_cassette = Cassette(
+        OLLAMA_CASSETTE,
+        mode=os.getenv('OLLAMA_CASSETTE_MODE', 'replay').lower(),
+        latency_scale=float(os.getenv('OLLAMA_CASSETTE_LATENCY_SCALE', '1.0')),
+        fallback=os.getenv('OLLAMA_CASSETTE_FALLBACK', 'True').lower() == 'true'
+    )
+    print(f"[CASSETTE] {ollama_cassette.mode.capitalize()} mode using {OLLAMA_CASSETTE}")
+
+# Each backend gets a keep-alive connection pool shared by the disease, soil and
+# fertilizer analyzers, and a model list refreshed in the background that doubles
+# as its health probe. Calls go to the healthy backend with the fewest in flight.
+ollama_pool = OllamaPool(
+    OLLAMA_BACKEND_URLS,
+    registry_ttl=float(os.getenv('OLLAMA_MODEL_REGISTRY_TTL', '30')),
+    # A backend that keeps failing or stalling is skipped for a while; with all
+    # of them tripped, analyses return a "temporarily unavailable" result at once
+    breaker_options={
+        'failure_rate_threshold': float(os.getenv('OLLAMA_BREAKER_FAILURE_RATE', '0.5')),
+        'slow_call_ms': float(os.getenv('OLLAMA_BREAKER_SLOW_CALL_MS', '90000')),
+        'window': int(os.getenv('OLLAMA_BREAKER_WINDOW', '20')),
+        'min_calls': int(os.getenv('OLLAMA_BREAKER_MIN_CALLS', '5')),
+        'open_seconds': float(os.getenv('OLLAMA_BREAKER_OPEN_SECONDS', '30')),
+    },
+    pool_size=int(os.getenv('OLLAMA_POOL_SIZE', '10')),
+    connect_timeout=float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '3')),
+    timeouts={
+        'disease': float(os.getenv('OLLAMA_DISEASE_TIMEOUT', '120')),
+        'soil': float(os.getenv('OLLAMA_SOIL_TIMEOUT', '120')),
+        'fertilizer': float(os.getenv('OLLAMA_FERTILIZER_TIMEOUT', '60')),
+    },
+    cassette=ollama_cassette
+)
+ollama_pool.start()
+
+
 def check_ollama_model(model_name="llava"):
     """Check if the specified model is available in Ollama."""
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        if response.status_code == 200:
-            models_data = response.json()
-            available_models = [model.get('name', '') for model in models_data.get('models', [])]
-            # Check for exact match or partial match (e.g., "llava:latest" or "llava:7b")
-            for model in available_models:
-                if model_name in model.lower():
-                    return True, model
-            return False, available_models
-        return False, []
+        return ollama_pool.find(model_name)
     except Exception as e:
         print(f"Error checking Ollama models: {e}")
         return False, []
 
 
-def ollama_predict_crop_disease(image_path):
+def ollama_predict_crop_disease(image_path, lang=None):
     """Use Ollama vision model to predict crop and disease."""
+    try:
+        if lang is None:
+            lang = get_language()
+
+        img_bytes = read_file_bytes(image_path)
+
+        # Same (or near-identical) photo, language and prompt -> reuse the earlier analysis
+        cached, cache_key, image_hash = find_cached_analysis('disease', img_bytes, lang, DISEASE_PROMPT_VERSION)
+        if cached is not None:
+            return cached
+
+        def analyze():
+            result = _ollama_predict_crop_disease(img_bytes, lang)
+            if result.get('crop_name') != 'Error':
+                store_analysis('disease', cache_key, image_hash, lang, DISEASE_PROMPT_VERSION, result)
+            return result
+
+        # The cache key already combines endpoint, prompt version, language and image hash
+        return single_flight.do(cache_key, analyze, recheck=lambda: result_cache.get(cache_key))
+    except Exception as e:
+        print(f"Ollama Prediction Error: {e}")
+        return {
+            'label': 'Error - Analysis failed',
+            'score': 0.0,
+            'crop_name': 'Error',
+            'disease_name': 'Analysis Error',
+            'description': f'An error occurred: {str(e)}',
+            'treatment_tip': 'Please try again with a different image.'
+        }
+
+
+def parse_disease_response(response_text):
+    """Turn llava's disease answer (JSON, fenced JSON or free text) into a prediction dict."""
+    result_json = find_json_object(response_text)
+    if result_json is None:
+        # If JSON parsing fails, extract information from text
+        print("Failed to parse JSON, extracting from text...")
+        response_text = strip_code_fence(response_text)
+        scan = DISEASE_SCANNER.scan(response_text)
+        parsed_result = parse_text_response(response_text, scan)
+
+        # Enhanced validation: Double-check flora detection from the same scan
+        has_explicit_no_flora = scan.any(STRICT_NO_FLORA_PHRASES)
+        has_plant_indicators = scan.any(PLANT_INDICATORS)
+    
+        # Only set no_flora if explicitly stated AND no plant indicators
+        if has_explicit_no_flora and not has_plant_indicators:
+            parsed_result['no_flora'] = True
+            parsed_result['disease_name'] = 'No Flora Detected'
+            parsed_result['crop_name'] = 'No Flora'
+        # If disease/plant indicators are present, ensure no_flora is False
+        elif has_plant_indicators:
+            parsed_result['no_flora'] = False
+            # Ensure disease_name is not "No Flora Detected" if plants are present
+            if parsed_result.get('disease_name', '').lower() == 'no flora detected':
+                parsed_result['disease_name'] = 'Unknown'
+                parsed_result['confidence_level'] = 'Low'
+    
+        # Validate and clean the parsed result
+        if not parsed_result.get('symptoms_detected') or not isinstance(parsed_result.get('symptoms_detected'), list):
+            if parsed_result.get('disease_name', '').lower() not in ['healthy', 'no flora detected']:
+                parsed_result['symptoms_detected'] = ['Symptoms detected']
+            else:
+                parsed_result['symptoms_detected'] = []
+    
+        return parsed_result
+
+    # Extract new format fields first
+    disease_name = result_json.get('disease_name', 'Unknown').strip()
+    symptoms = result_json.get('symptoms_detected', [])
+    confidence_level = result_json.get('confidence_level', 'Medium')
+    treatment_tip = result_json.get('treatment_tip', 'No treatment recommendation available.').strip()
+    disease_location = result_json.get('disease_location', 'center').strip()
+    crop_name = result_json.get('crop_name', 'Unknown').strip()
+    
+    # Validate and normalize crop_name against the shared crop alias index
+    if crop_name and crop_name.lower() != 'unknown':
+        crop_name_normalized = crop_name.strip().capitalize()
+        crop_name, match = normalize_crop_name(crop_name)
+        if match == 'exact':
+            print(f"[CROP VALIDATION] Validated crop: {crop_name}")
+        elif match == 'partial':
+            print(f"[CROP VALIDATION] Matched crop: {crop_name} (from '{crop_name_normalized}')")
+        else:
+            # If not found in valid crops but not 'unknown', keep it but log warning
+            print(f"[CROP VALIDATION] Warning: Crop name '{crop_name}' not in standard list, keeping as is")
+
+        # Additional validation: Check if crop name makes sense with disease
+        # Log if there's a mismatch (e.g., wheat disease but crop is tomato)
+        if disease_name and disease_name.lower() not in ['healthy', 'unknown', 'no flora detected']:
+            print(f"[CROP VALIDATION] Crop: {crop_name}, Disease: {disease_name}")
+    else:
+        crop_name = 'Unknown'
+        print(f"[CROP VALIDATION] Crop name not provided, using 'Unknown'")
+    
+    # Check if flora was detected - prioritize explicit flora_detected flag
+    flora_detected = result_json.get('flora_detected', True)  # Default to True for backward compatibility
+    
+    # Get disease name and check
+    disease_lower = disease_name.lower() if disease_name else ''
+    
+    # VALIDATION: Ensure logical consistency
+    # Rule 1: If disease is detected (not "No Flora Detected", "Unknown", or empty), flora MUST be present
+    if disease_lower not in ['no flora detected', 'unknown', '', 'healthy'] and disease_lower:
+        flora_detected = True  # Force flora_detected to true if disease is detected
+    
+    # Rule 2: If disease_name explicitly says "No Flora Detected", override flora_detected
+    if disease_lower == 'no flora detected':
+        flora_detected = False
+    
+    # Rule 3: If disease is "Healthy", flora MUST be present
+    if disease_lower == 'healthy':
+        flora_detected = True
+    
+    # Rule 4: If flora_detected is false, disease_name should be "No Flora Detected"
+    if not flora_detected:
+        disease_name = 'No Flora Detected'
+        disease_lower = 'no flora detected'
+    
+    # Only show "no flora" if explicitly stated and validated
+    if not flora_detected or disease_lower == 'no flora detected':
+        # No flora detected in the image
+        return {
+            'label': 'No Flora Detected',
+            'score': 1.0,
+            'crop_name': 'No Flora',
+            'disease_name': 'No Flora Detected',
+            'description': result_json.get('treatment_tip', 'No flora (plants, crops, or vegetation) detected in this image.'),
+            'treatment_tip': result_json.get('treatment_tip', 'Please upload an image containing plants, crops, or vegetation for analysis.'),
+            'disease_location': 'none',
+            'symptoms_detected': [],
+            'confidence_level': 'High',
+            'no_flora': True
+        }
+    
+    # Convert confidence level to numeric score for display
+    confidence_map = {'Low': 0.6, 'Medium': 0.75, 'High': 0.9}
+    confidence_score = confidence_map.get(confidence_level, 0.75)
+    
+    # Validate and clean symptoms list
+    if not symptoms or not isinstance(symptoms, list):
+        symptoms = ['Symptoms detected' if disease_lower not in ['healthy', 'no flora detected'] else '']
+    else:
+        # Filter out empty strings and ensure all are strings
+        symptoms = [str(s).strip() for s in symptoms if s and str(s).strip()]
+        if not symptoms and disease_lower not in ['healthy', 'no flora detected']:
+            symptoms = ['Symptoms detected']
+    
+    # Format description with symptoms
+    if symptoms and disease_lower not in ['healthy', 'no flora detected']:
+        description = f"Symptoms: {', '.join(symptoms)}"
+    elif disease_lower == 'healthy':
+        description = "The plant appears healthy with no visible disease symptoms."
+    else:
+        description = f"Analysis complete. {disease_name} detected."
+    
+    # Format the result to match template expectations
+    if crop_name and crop_name.lower() != 'unknown':
+        disease_label = f"{crop_name} - {disease_name}"
+    else:
+        disease_label = disease_name
+    
+    return {
+        'label': disease_label,
+        'score': confidence_score,
+        'crop_name': crop_name if crop_name and crop_name.lower() != 'unknown' else 'Unknown Crop',
+        'disease_name': disease_name,
+        'description': description,
+        'treatment_tip': treatment_tip if treatment_tip else 'Please consult with an agricultural expert for specific treatment recommendations.',
+        'disease_location': disease_location if disease_location else 'center',
+        'symptoms_detected': symptoms,
+        'confidence_level': confidence_level,
+        'no_flora': False
+    }
+
+
+def _ollama_predict_crop_disease(img_bytes, lang):
+    """Run the llava disease analysis on raw image bytes."""
     try:
         # First check if llava model is available
         model_available, model_info = check_ollama_model("llava")
@@ -483,352 +1017,26 @@ def ollama_predict_crop_disease(image_path):
         # Use the available model (could be "llava:latest", "llava:7b", etc.)
         model_to_use = model_info if isinstance(model_info, str) else "llava"
         
-        # Encode image to base64
-        with open(image_path, "rb") as f:
-            img_bytes = f.read()
-        img_base64 = base64.b64encode(img_bytes).decode("utf-8")
-
-        # Get current language
-        lang = get_language()
-        lang_instruction = ""
-        if lang == 'kn':
-            lang_instruction = " IMPORTANT: Respond in Kannada (ಕನ್ನಡ) language. All text in the JSON response should be in Kannada script."
-
-        # Enhanced Prompt for Ollama - expert agricultural assistant format with improved accuracy
-        prompt = (
-            "You are an expert agricultural pathologist with 20+ years of experience in plant disease diagnosis. "
-            "Analyze the given image with EXTREME CARE and ACCURACY.\n\n"
-            
-            "=== STEP 1: FLORA DETECTION (CRITICAL) ===\n"
-            "First, determine if this image contains ANY FLORA (plants, crops, vegetation):\n"
-            "- Look for: plants, crops, trees, shrubs, leaves, stems, flowers, fruits, agricultural vegetation\n"
-            "- Be VERY CAREFUL: Only set flora_detected=false if there are ABSOLUTELY NO plants visible\n"
-            "- If you see ANY plant parts (even partially visible), flora_detected MUST be true\n"
-            "- Examples of NO FLORA: only soil, animals, objects, people, buildings, sky, vehicles, tools\n"
-            "- Examples of FLORA PRESENT: any leaves, stems, fruits, flowers, or plant parts\n\n"
-            
-            "=== STEP 2: CROP IDENTIFICATION (CRITICAL - MUST BE ACCURATE) ===\n"
-            "If flora is detected, FIRST identify the crop/plant type ACCURATELY:\n\n"
-            "A. EXAMINE LEAF CHARACTERISTICS:\n"
-            "   - Leaf shape: long and narrow (wheat, rice, corn), broad and round (tomato, potato), oval (apple), heart-shaped (grape), etc.\n"
-            "   - Leaf texture: smooth, rough, waxy, hairy, glossy\n"
-            "   - Leaf color: green shades, yellow, brown, red\n"
-            "   - Leaf size: small, medium, large\n"
-            "   - Leaf arrangement: single, compound, alternate, opposite\n"
-            "   - Leaf margins: smooth, serrated, lobed, toothed\n\n"
-            
-            "B. EXAMINE PLANT CHARACTERISTICS:\n"
-            "   - Stem type: woody, herbaceous, climbing, upright\n"
-            "   - Plant structure: grass-like (wheat, rice, corn), bushy (tomato, pepper), tree-like (apple, mango), vine (grape, cucumber)\n"
-            "   - Overall appearance: cereal crop, vegetable, fruit tree, legume, etc.\n\n"
-            
-            "C. CROP IDENTIFICATION GUIDELINES:\n"
-            "   - WHEAT: Long, narrow, linear leaves with parallel veins, grass-like appearance, typically green to yellow-green\n"
-            "   - RICE: Similar to wheat but often in water, long narrow leaves, grass-like\n"
-            "   - CORN/MAIZE: Very long, broad leaves with prominent midrib, grass-like but larger\n"
-            "   - TOMATO: Broad, lobed leaves with serrated edges, compound leaves, distinctive tomato plant structure\n"
-            "   - POTATO: Compound leaves with multiple leaflets, distinctive potato plant appearance\n"
-            "   - APPLE: Oval to elliptical leaves, serrated margins, tree-like structure\n"
-            "   - MANGO: Lanceolate leaves, glossy, tree-like structure\n"
-            "   - GRAPE: Heart-shaped or lobed leaves, vine structure\n"
-            "   - PEPPER: Similar to tomato but smaller leaves, bushy structure\n"
-            "   - COTTON: Broad, lobed leaves, distinctive cotton plant appearance\n"
-            "   - SUGARCANE: Very long, narrow leaves, grass-like but very tall\n"
-            "   - BANANA: Very large, broad leaves, distinctive banana plant structure\n"
-            "   - COCONUT: Long, pinnate leaves, palm tree structure\n"
-            "   - ORANGE: Oval, glossy leaves, citrus tree structure\n"
-            "   - POMEGRANATE: Small, glossy, oval leaves, shrub-like structure\n\n"
-            
-            "D. ACCURACY REQUIREMENTS:\n"
-            "   - Look at the ACTUAL image content, not assumptions\n"
-            "   - If you see wheat leaves (long, narrow, grass-like), crop_name MUST be 'Wheat'\n"
-            "   - If you see tomato leaves (broad, lobed, compound), crop_name MUST be 'Tomato'\n"
-            "   - If you see potato leaves (compound with leaflets), crop_name MUST be 'Potato'\n"
-            "   - If uncertain about crop type, use 'Unknown' - DO NOT GUESS\n"
-            "   - Be SPECIFIC: 'Wheat' not 'Grain', 'Tomato' not 'Vegetable', 'Apple' not 'Fruit'\n\n"
-            
-            "=== STEP 3: DISEASE ANALYSIS (Only after accurate crop identification) ===\n"
-            "After identifying the crop correctly, perform DETAILED disease analysis:\n\n"
-            
-            "A. VISUAL SYMPTOM IDENTIFICATION:\n"
-            "   - Examine the image carefully for disease symptoms\n"
-            "   - Look for: black/brown spots, yellowing, wilting, fungal growth, white powder, holes, discoloration, lesions, blisters\n"
-            "   - Note the pattern: scattered spots, concentrated areas, edge damage, center damage, entire leaf affected\n"
-            "   - Check color changes: yellowing, browning, blackening, whitening\n"
-            "   - Observe texture: powdery, fuzzy, slimy, dry, wet\n\n"
-            
-            "B. DISEASE IDENTIFICATION:\n"
-            "   - Identify the SPECIFIC disease name if possible (e.g., 'Early Blight', 'Late Blight', 'Leaf Spot', 'Rust', 'Powdery Mildew', 'Downy Mildew', 'Anthracnose', 'Bacterial Spot')\n"
-            "   - Consider the CROP TYPE when identifying disease (wheat diseases are different from tomato diseases)\n"
-            "   - Wheat diseases: Rust, Powdery Mildew, Leaf Blight, Septoria, Fusarium\n"
-            "   - Tomato diseases: Early Blight, Late Blight, Leaf Spot, Bacterial Spot, Powdery Mildew\n"
-            "   - Potato diseases: Late Blight, Early Blight, Scab, Blackleg\n"
-            "   - If symptoms are unclear, use 'Unknown Disease' with Low confidence\n"
-            "   - If plant appears healthy (no symptoms), disease_name = 'Healthy'\n"
-            "   - Be SPECIFIC: 'Wheat Rust' or 'Tomato Early Blight' - include crop name in disease if helpful\n"
-            "   - DO NOT confuse diseases from different crops\n\n"
-            
-            "C. CONFIDENCE ASSESSMENT:\n"
-            "   - High: Clear, distinct symptoms matching known disease patterns\n"
-            "   - Medium: Symptoms visible but not perfectly matching known patterns\n"
-            "   - Low: Unclear symptoms or ambiguous signs\n"
-            "   - If healthy: Always High confidence\n\n"
-            
-            "D. SYMPTOM LISTING:\n"
-            "   - List ALL visible symptoms in detail\n"
-            "   - Be specific: 'Black circular spots with yellow halos' not just 'spots'\n"
-            "   - Include location: 'Yellowing on lower leaves', 'Brown spots on leaf edges'\n\n"
-            
-            "E. TREATMENT RECOMMENDATION:\n"
-            "   - Provide ACTIONABLE, PRACTICAL advice for farmers\n"
-            "   - Include: specific treatment methods, timing, frequency\n"
-            "   - Mention: organic/natural remedies if applicable\n"
-            "   - Consider: prevention measures for future\n"
-            "   - Use simple language farmers can understand\n\n"
-            
-            "F. DISEASE LOCATION:\n"
-            "   - Describe WHERE the disease appears: 'center of leaf', 'top-left', 'bottom-right', 'entire leaf', 'leaf edges', 'stem base', etc.\n"
-            "   - Be specific about location for accurate highlighting\n"
-            "   - If healthy: use 'none'\n\n"
-            
-            "=== CRITICAL RULES ===\n"
-            "1. CROP IDENTIFICATION MUST BE ACCURATE - Look at the actual image, not assumptions\n"
-            "2. If you see wheat leaves (long, narrow, grass-like), crop_name MUST be 'Wheat' - NOT 'Tomato'\n"
-            "3. If you see tomato leaves (broad, lobed), crop_name MUST be 'Tomato' - NOT 'Wheat'\n"
-            "4. If disease_name is NOT 'No Flora Detected' or 'Unknown', then flora_detected MUST be true\n"
-            "5. If disease_name is 'Healthy', flora_detected MUST be true\n"
-            "6. Only set flora_detected=false if image contains ZERO plants\n"
-            "7. If flora_detected=false, disease_name MUST be 'No Flora Detected'\n"
-            "8. Be ACCURATE: Don't guess crops or diseases - use 'Unknown' if uncertain\n"
-            "9. Confidence should reflect certainty: High only for clear cases\n"
-            "10. CROP IDENTIFICATION IS CRITICAL - Wrong crop = Wrong disease identification\n\n"
-            
-            f"{lang_instruction}\n\n"
-            
-            "=== OUTPUT FORMAT ===\n"
-            "Output ONLY valid JSON (no markdown, no explanations, just JSON):\n"
-            '{\n'
-            '  "flora_detected": true/false,\n'
-            '  "crop_name": "ACCURATE crop name based on actual image (e.g., Wheat, Rice, Corn, Tomato, Potato, Apple, Mango, Grape, Pepper, Cotton, Sugarcane, Banana, Coconut, Orange, Pomegranate) or unknown if uncertain",\n'
-            '  "disease_name": "specific disease name matching the identified crop (e.g., Wheat Rust, Tomato Early Blight, Potato Late Blight, Leaf Spot, Powdery Mildew) or healthy or unknown",\n'
-            '  "symptoms_detected": ["detailed symptom 1", "detailed symptom 2", "detailed symptom 3"],\n'
-            '  "confidence_level": "Low/Medium/High",\n'
-            '  "treatment_tip": "detailed, actionable treatment recommendation in 2-3 sentences specific to the identified crop and disease",\n'
-            '  "disease_location": "specific location description (e.g., center of leaf, top-left corner, entire leaf, leaf edges, stem base, or none if healthy)"\n'
-            '}\n\n'
-            
-            "REMEMBER:\n"
-            "- CROP IDENTIFICATION IS CRITICAL - Identify the crop FIRST by examining leaf shape, texture, and plant structure\n"
-            "- If you see wheat leaves, crop_name MUST be 'Wheat' - do NOT say 'Tomato'\n"
-            "- If you see tomato leaves, crop_name MUST be 'Tomato' - do NOT say 'Wheat'\n"
-            "- Accuracy is critical. If uncertain about crop, use 'Unknown' with Low confidence rather than guessing.\n"
-            "- Wrong crop identification leads to wrong disease identification."
-        )
+        # Shrink and encode image to base64
+        img_base64 = encode_image_for_ollama(img_bytes)
 
-        # Call Ollama local API
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": model_to_use,
-                "prompt": prompt,
-                "images": [img_base64],
-                "stream": False
-            },
-            timeout=120  # Increased timeout for image processing
-        )
+        # Call Ollama API
+        with stage('ollama_request'):
+            response = ollama_pool.generate(
+                prompt_registry.payload('disease', lang, model_to_use, images=[img_base64]),
+                task='disease'
+            )
 
         if response.status_code == 200:
             result_data = response.json()
+            prompt_registry.record('disease', lang, result_data)
+            token_usage.record('disease', lang, result_data, model=model_to_use)
             
             # Extract the response text
             response_text = result_data.get('response', '')
             
-            # Try to parse JSON from the response
-            try:
-                # Sometimes Ollama wraps JSON in markdown code blocks
-                if '```json' in response_text:
-                    json_start = response_text.find('```json') + 7
-                    json_end = response_text.find('```', json_start)
-                    response_text = response_text[json_start:json_end].strip()
-                elif '```' in response_text:
-                    json_start = response_text.find('```') + 3
-                    json_end = response_text.find('```', json_start)
-                    response_text = response_text[json_start:json_end].strip()
-                
-                result_json = json.loads(response_text)
-                
-                # Extract new format fields first
-                disease_name = result_json.get('disease_name', 'Unknown').strip()
-                symptoms = result_json.get('symptoms_detected', [])
-                confidence_level = result_json.get('confidence_level', 'Medium')
-                treatment_tip = result_json.get('treatment_tip', 'No treatment recommendation available.').strip()
-                disease_location = result_json.get('disease_location', 'center').strip()
-                crop_name = result_json.get('crop_name', 'Unknown').strip()
-                
-                # Validate and normalize crop_name - ensure it's accurate
-                valid_crops = [
-                    'Wheat', 'Rice', 'Corn', 'Maize', 'Tomato', 'Potato', 'Apple', 'Mango',
-                    'Grape', 'Pepper', 'Cherry', 'Banana', 'Coconut', 'Orange', 'Pomegranate',
-                    'Cotton', 'Sugarcane', 'Cucumber', 'Pumpkin', 'Watermelon', 'Muskmelon',
-                    'Chickpea', 'Kidneybeans', 'Pigeonpeas', 'Mothbeans', 'Mungbean', 'Blackgram', 'Lentil'
-                ]
-                
-                # Normalize crop name (capitalize first letter, handle variations)
-                if crop_name and crop_name.lower() != 'unknown':
-                    crop_name_normalized = crop_name.strip().capitalize()
-                    crop_lower = crop_name.lower().strip()
-                    
-                    # Check for exact match or close match in valid crops
-                    matched = False
-                    for valid_crop in valid_crops:
-                        if valid_crop.lower() == crop_lower:
-                            crop_name = valid_crop
-                            matched = True
-                            print(f"[CROP VALIDATION] Validated crop: {crop_name}")
-                            break
-                        # Check for partial matches (e.g., "wheat leaf" -> "Wheat")
-                        elif crop_lower in valid_crop.lower() or valid_crop.lower() in crop_lower:
-                            crop_name = valid_crop
-                            matched = True
-                            print(f"[CROP VALIDATION] Matched crop: {crop_name} (from '{crop_name_normalized}')")
-                            break
-                    
-                    if not matched:
-                        # If not found in valid crops but not 'unknown', keep it but log warning
-                        print(f"[CROP VALIDATION] Warning: Crop name '{crop_name}' not in standard list, keeping as is")
-                        crop_name = crop_name_normalized
-                    
-                    # Additional validation: Check if crop name makes sense with disease
-                    # Log if there's a mismatch (e.g., wheat disease but crop is tomato)
-                    if disease_name and disease_name.lower() not in ['healthy', 'unknown', 'no flora detected']:
-                        print(f"[CROP VALIDATION] Crop: {crop_name}, Disease: {disease_name}")
-                else:
-                    crop_name = 'Unknown'
-                    print(f"[CROP VALIDATION] Crop name not provided, using 'Unknown'")
-                
-                # Check if flora was detected - prioritize explicit flora_detected flag
-                flora_detected = result_json.get('flora_detected', True)  # Default to True for backward compatibility
-                
-                # Get disease name and check
-                disease_lower = disease_name.lower() if disease_name else ''
-                
-                # VALIDATION: Ensure logical consistency
-                # Rule 1: If disease is detected (not "No Flora Detected", "Unknown", or empty), flora MUST be present
-                if disease_lower not in ['no flora detected', 'unknown', '', 'healthy'] and disease_lower:
-                    flora_detected = True  # Force flora_detected to true if disease is detected
-                
-                # Rule 2: If disease_name explicitly says "No Flora Detected", override flora_detected
-                if disease_lower == 'no flora detected':
-                    flora_detected = False
-                
-                # Rule 3: If disease is "Healthy", flora MUST be present
-                if disease_lower == 'healthy':
-                    flora_detected = True
-                
-                # Rule 4: If flora_detected is false, disease_name should be "No Flora Detected"
-                if not flora_detected:
-                    disease_name = 'No Flora Detected'
-                    disease_lower = 'no flora detected'
-                
-                # Only show "no flora" if explicitly stated and validated
-                if not flora_detected or disease_lower == 'no flora detected':
-                    # No flora detected in the image
-                    return {
-                        'label': 'No Flora Detected',
-                        'score': 1.0,
-                        'crop_name': 'No Flora',
-                        'disease_name': 'No Flora Detected',
-                        'description': result_json.get('treatment_tip', 'No flora (plants, crops, or vegetation) detected in this image.'),
-                        'treatment_tip': result_json.get('treatment_tip', 'Please upload an image containing plants, crops, or vegetation for analysis.'),
-                        'disease_location': 'none',
-                        'symptoms_detected': [],
-                        'confidence_level': 'High',
-                        'no_flora': True
-                    }
-                
-                # Convert confidence level to numeric score for display
-                confidence_map = {'Low': 0.6, 'Medium': 0.75, 'High': 0.9}
-                confidence_score = confidence_map.get(confidence_level, 0.75)
-                
-                # Validate and clean symptoms list
-                if not symptoms or not isinstance(symptoms, list):
-                    symptoms = ['Symptoms detected' if disease_lower not in ['healthy', 'no flora detected'] else '']
-                else:
-                    # Filter out empty strings and ensure all are strings
-                    symptoms = [str(s).strip() for s in symptoms if s and str(s).strip()]
-                    if not symptoms and disease_lower not in ['healthy', 'no flora detected']:
-                        symptoms = ['Symptoms detected']
-                
-                # Format description with symptoms
-                if symptoms and disease_lower not in ['healthy', 'no flora detected']:
-                    description = f"Symptoms: {', '.join(symptoms)}"
-                elif disease_lower == 'healthy':
-                    description = "The plant appears healthy with no visible disease symptoms."
-                else:
-                    description = f"Analysis complete. {disease_name} detected."
-                
-                # Format the result to match template expectations
-                if crop_name and crop_name.lower() != 'unknown':
-                    disease_label = f"{crop_name} - {disease_name}"
-                else:
-                    disease_label = disease_name
-                
-                return {
-                    'label': disease_label,
-                    'score': confidence_score,
-                    'crop_name': crop_name if crop_name and crop_name.lower() != 'unknown' else 'Unknown Crop',
-                    'disease_name': disease_name,
-                    'description': description,
-                    'treatment_tip': treatment_tip if treatment_tip else 'Please consult with an agricultural expert for specific treatment recommendations.',
-                    'disease_location': disease_location if disease_location else 'center',
-                    'symptoms_detected': symptoms,
-                    'confidence_level': confidence_level,
-                    'no_flora': False
-                }
-            except json.JSONDecodeError:
-                # If JSON parsing fails, extract information from text
-                print("Failed to parse JSON, extracting from text...")
-                parsed_result = parse_text_response(response_text)
-                
-                # Enhanced validation: Double-check flora detection from text
-                response_lower = response_text.lower()
-                
-                # Check for explicit "no flora" statements
-                explicit_no_flora_phrases = [
-                    "no flora detected", "no plant detected", "no crop detected",
-                    "no vegetation detected", "does not contain flora", "does not contain plants",
-                    "no flora found", "no plants found", "no crops found"
-                ]
-                
-                has_explicit_no_flora = any(phrase in response_lower for phrase in explicit_no_flora_phrases)
-                
-                # Check for disease/plant indicators
-                has_plant_indicators = any(keyword in response_lower for keyword in [
-                    "disease", "blight", "rust", "spot", "mildew", "leaf", "plant", "crop",
-                    "symptom", "healthy", "tomato", "potato", "apple", "corn", "pepper"
-                ])
-                
-                # Only set no_flora if explicitly stated AND no plant indicators
-                if has_explicit_no_flora and not has_plant_indicators:
-                    parsed_result['no_flora'] = True
-                    parsed_result['disease_name'] = 'No Flora Detected'
-                    parsed_result['crop_name'] = 'No Flora'
-                # If disease/plant indicators are present, ensure no_flora is False
-                elif has_plant_indicators:
-                    parsed_result['no_flora'] = False
-                    # Ensure disease_name is not "No Flora Detected" if plants are present
-                    if parsed_result.get('disease_name', '').lower() == 'no flora detected':
-                        parsed_result['disease_name'] = 'Unknown'
-                        parsed_result['confidence_level'] = 'Low'
-                
-                # Validate and clean the parsed result
-                if not parsed_result.get('symptoms_detected') or not isinstance(parsed_result.get('symptoms_detected'), list):
-                    if parsed_result.get('disease_name', '').lower() not in ['healthy', 'no flora detected']:
-                        parsed_result['symptoms_detected'] = ['Symptoms detected']
-                    else:
-                        parsed_result['symptoms_detected'] = []
-                
-                return parsed_result
+            with stage('response_parse'):
+                return parse_disease_response(response_text)
         else:
             error_text = response.text[:200] if response.text else "Unknown error"
             print(f"Ollama Error: {response.status_code} - {error_text}")
@@ -850,6 +1058,16 @@ def ollama_predict_crop_disease(image_path):
                 'treatment_tip': 'Please ensure Ollama is running and the llava model is installed: ollama pull llava'
             }
 
+    except CircuitOpenError as e:
+        print(f"[CIRCUIT] Disease analysis skipped: {e}")
+        return {
+            'label': 'Error - Analysis temporarily unavailable',
+            'score': 0.0,
+            'crop_name': 'Error',
+            'disease_name': 'Analysis Temporarily Unavailable',
+            'description': 'The image analysis service is not responding right now, so your image was not sent.',
+            'treatment_tip': 'Please try again in a minute.'
+        }
     except requests.exceptions.ConnectionError:
         print("Connection Error: Could not connect to Ollama. Is it running?")
         return {
@@ -857,7 +1075,7 @@ def ollama_predict_crop_disease(image_path):
             'score': 0.0,
             'crop_name': 'Error',
             'disease_name': 'Ollama Connection Failed',
-            'description': 'Could not connect to Ollama. Please ensure Ollama is running on localhost:11434',
+            'description': f'Could not connect to Ollama. Please ensure Ollama is running on {OLLAMA_BASE_URL}',
             'treatment_tip': 'Start Ollama service and ensure the llava model is installed: ollama pull llava'
         }
     except Exception as e:
@@ -872,397 +1090,116 @@ def ollama_predict_crop_disease(image_path):
         }
 
 
+def predict_crop_disease_locally(image_path, lang):
+    """The local ResNet9 prediction, or None when it is unavailable, unsure or fails."""
+    if local_classifier is None or not local_classifier.available:
+        return None
+    try:
+        prediction = local_classifier.predict(image_path, lang=lang)
+    except Exception as e:
+        print(f"[CLASSIFIER] Local prediction failed, using Ollama: {e}")
+        return None
+    if prediction is not None:
+        prediction['tier'] = 'resnet9'
+    return prediction
+
+
+def predict_crop_disease_tiered(image_path, lang=None):
+    """Classify with the local ResNet9 first and fall through to Ollama when it is unsure."""
+    if lang is None:
+        lang = get_language()
+    prediction = predict_crop_disease_locally(image_path, lang)
+    if prediction is not None:
+        return prediction
+
+    prediction = ollama_predict_crop_disease(image_path, lang=lang)
+    prediction['tier'] = 'ollama'
+    return prediction
+
+
+# The result page shows the image at most 500px high, so highlighting is drawn
+# on a copy that fits HIGHLIGHT_MAX_SIDE rather than on the full-size upload
+HIGHLIGHT_MAX_SIDE = int(os.getenv('HIGHLIGHT_MAX_SIDE', '800'))
+
+
 def highlight_disease_area(image_path, disease_location, disease_name):
-    """Highlight the diseased area in red on the image based on location description."""
+    """Highlight the diseased area in red on a display-sized copy of the image."""
     try:
-        # Open the image
-        img = Image.open(image_path)
-        img = img.convert('RGB')
-        width, height = img.size
-        
-        # Determine highlight area based on location description
-        location_lower = disease_location.lower() if disease_location else 'none'
-        
-        # Skip highlighting if healthy or no disease
-        if 'healthy' in disease_name.lower() or location_lower == 'none' or 'no disease' in location_lower:
-            return img
-        
-        # Convert to RGBA for overlay
-        img_rgba = img.convert('RGBA')
-        
-        # Create a red overlay with transparency
-        overlay = Image.new('RGBA', (width, height), (255, 0, 0, 0))
-        overlay_draw = ImageDraw.Draw(overlay)
-        
-        # Define highlight regions based on location description
-        if 'center' in location_lower or 'middle' in location_lower:
-            # Highlight center area
-            x1, y1 = int(width * 0.2), int(height * 0.2)
-            x2, y2 = int(width * 0.8), int(height * 0.8)
-        elif 'top' in location_lower and 'left' in location_lower:
-            x1, y1 = 0, 0
-            x2, y2 = int(width * 0.5), int(height * 0.5)
-        elif 'top' in location_lower and 'right' in location_lower:
-            x1, y1 = int(width * 0.5), 0
-            x2, y2 = width, int(height * 0.5)
-        elif 'bottom' in location_lower and 'left' in location_lower:
-            x1, y1 = 0, int(height * 0.5)
-            x2, y2 = int(width * 0.5), height
-        elif 'bottom' in location_lower and 'right' in location_lower:
-            x1, y1 = int(width * 0.5), int(height * 0.5)
-            x2, y2 = width, height
-        elif 'top' in location_lower:
-            x1, y1 = 0, 0
-            x2, y2 = width, int(height * 0.5)
-        elif 'bottom' in location_lower:
-            x1, y1 = 0, int(height * 0.5)
-            x2, y2 = width, height
-        elif 'left' in location_lower:
-            x1, y1 = 0, 0
-            x2, y2 = int(width * 0.5), height
-        elif 'right' in location_lower:
-            x1, y1 = int(width * 0.5), 0
-            x2, y2 = width, height
-        elif 'entire' in location_lower or 'whole' in location_lower or 'all' in location_lower:
-            x1, y1 = 0, 0
-            x2, y2 = width, height
-        else:
-            # Default: highlight center area
-            x1, y1 = int(width * 0.25), int(height * 0.25)
-            x2, y2 = int(width * 0.75), int(height * 0.75)
-        
-        # Draw red rectangle with transparency
-        overlay_draw.rectangle([x1, y1, x2, y2], fill=(255, 0, 0, 100), outline=(255, 0, 0, 255), width=5)
-        
-        # Blend the overlay with the original image
-        highlighted_img = Image.alpha_composite(img_rgba, overlay)
-        
-        # Add disease name label
-        draw = ImageDraw.Draw(highlighted_img)
-        try:
-            # Try to use a default font, fallback to basic if not available
-            font_size = max(24, int(width / 25))
-            try:
-                font = ImageFont.truetype("arial.ttf", font_size)
-            except:
-                try:
-                    font = ImageFont.truetype("C:/Windows/Fonts/arial.ttf", font_size)
-                except:
-                    font = ImageFont.load_default()
-        except:
-            font = ImageFont.load_default()
-        
-        # Draw disease name label at the top
-        text = f"Disease: {disease_name}"
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Draw background for text (red background)
-        draw.rectangle([10, 10, 10 + text_width + 20, 10 + text_height + 20], fill=(255, 0, 0, 220), outline=(255, 0, 0, 255), width=2)
-        draw.text((20, 20), text, fill=(255, 255, 255), font=font)
-        
-        # Convert back to RGB for display
-        return highlighted_img.convert('RGB')
-        
+        return render_highlight(image_path, disease_location, disease_name, max_side=HIGHLIGHT_MAX_SIDE)
     except Exception as e:
         print(f"Error highlighting image: {e}")
         import traceback
         traceback.print_exc()
         # Return original image if highlighting fails
-        return Image.open(image_path).convert('RGB')
+        return open_display_copy(image_path, HIGHLIGHT_MAX_SIDE)
 
 
-def parse_text_response(text):
-    """Parse text response when JSON parsing fails - Enhanced for accuracy."""
-    text_lower = text.lower()
-    
-    # Enhanced disease/plant indicators - more comprehensive
-    has_disease_indicators = any(keyword in text_lower for keyword in [
-        "disease", "blight", "rust", "spot", "mildew", "fungal", "symptom", 
-        "healthy", "leaf", "plant", "crop", "vegetation", "tomato", "potato", 
-        "apple", "corn", "pepper", "grape", "cherry", "rice", "wheat", "maize",
-        "banana", "mango", "orange", "pomegranate", "coconut", "cotton", "sugarcane",
-        "anthracnose", "bacterial", "virus", "infection", "lesion", "discoloration",
-        "yellowing", "wilting", "rotting", "blister", "canker"
-    ])
-    
-    # More specific "no flora" detection - must be explicit
-    explicit_no_flora = any(phrase in text_lower for phrase in [
-        "no flora detected", "no plant detected", "no crop detected", 
-        "no vegetation detected", "does not contain flora", "does not contain plants",
-        "no flora found", "no plants found", "no crops found",
-        "image does not show", "no plants visible", "no crops visible"
-    ])
-    
-    # Only return "no flora" if explicitly stated AND no disease/plant indicators
-    # This prevents false positives when disease is mentioned
-    if explicit_no_flora and not has_disease_indicators:
-        return {
-            'label': 'No Flora Detected',
-            'score': 1.0,
-            'crop_name': 'No Flora',
-            'disease_name': 'No Flora Detected',
-            'description': 'No flora (plants, crops, or vegetation) detected in this image.',
-            'treatment_tip': 'Please upload an image containing plants, crops, or vegetation for analysis.',
-            'disease_location': 'none',
-            'symptoms_detected': [],
-            'confidence_level': 'High',
-            'no_flora': True
-        }
-    
-    # Enhanced extraction logic for better accuracy
-    crop_name = "Unknown"
-    disease_name = "Unknown"
-    confidence = 0.75
-    
-    # Extract disease name with more specificity
-    if "healthy" in text_lower and ("plant" in text_lower or "crop" in text_lower or "leaf" in text_lower):
-        disease_name = "Healthy"
-    elif "early blight" in text_lower:
-        disease_name = "Early Blight"
-    elif "late blight" in text_lower:
-        disease_name = "Late Blight"
-    elif "leaf spot" in text_lower or "bacterial spot" in text_lower:
-        disease_name = "Leaf Spot"
-    elif "powdery mildew" in text_lower:
-        disease_name = "Powdery Mildew"
-    elif "downy mildew" in text_lower:
-        disease_name = "Downy Mildew"
-    elif "rust" in text_lower:
-        disease_name = "Rust"
-    elif "anthracnose" in text_lower:
-        disease_name = "Anthracnose"
-    elif "blight" in text_lower:
-        disease_name = "Blight"
-    elif "spot" in text_lower:
-        disease_name = "Leaf Spot"
-    elif "mildew" in text_lower:
-        disease_name = "Mildew"
-    elif "disease" in text_lower:
-        disease_name = "Disease Detected"
-    
-    # Enhanced crop name extraction with priority and word boundary matching
-    import re
-    
-    # Priority order: Check distinctive crops first (cereals/grains have unique characteristics)
-    crops_priority = [
-        # Cereals/Grains (check first - they have distinctive long, narrow leaves)
-        ("wheat", "Wheat"),
-        ("rice", "Rice"),
-        ("corn", "Corn"),
-        ("maize", "Maize"),
-        ("sugarcane", "Sugarcane"),
-        # Vegetables with distinctive leaves
-        ("potato", "Potato"),
-        ("tomato", "Tomato"),
-        ("pepper", "Pepper"),
-        ("cucumber", "Cucumber"),
-        ("pumpkin", "Pumpkin"),
-        ("watermelon", "Watermelon"),
-        ("muskmelon", "Muskmelon"),
-        # Fruits
-        ("banana", "Banana"),
-        ("coconut", "Coconut"),
-        ("mango", "Mango"),
-        ("apple", "Apple"),
-        ("grape", "Grape"),
-        ("cherry", "Cherry"),
-        ("orange", "Orange"),
-        ("pomegranate", "Pomegranate"),
-        # Other crops
-        ("cotton", "Cotton"),
-        ("chickpea", "Chickpea"),
-        ("kidneybeans", "Kidneybeans"),
-        ("pigeonpeas", "Pigeonpeas"),
-        ("mothbeans", "Mothbeans"),
-        ("mungbean", "Mungbean"),
-        ("blackgram", "Blackgram"),
-        ("lentil", "Lentil")
-    ]
-    
-    # Use word boundaries to find exact crop matches (prevents partial matches)
-    for crop_key, crop_value in crops_priority:
-        # Check for word boundary match (exact word, not part of another word)
-        pattern = r'\b' + re.escape(crop_key) + r'\b'
-        if re.search(pattern, text_lower):
-            crop_name = crop_value
-            print(f"Extracted crop from text: {crop_name}")
-            break
-    
-    # Enhanced symptom extraction
-    symptoms = []
-    symptom_patterns = {
-        "black spots": "Black spots",
-        "brown spots": "Brown spots",
-        "yellow spots": "Yellow spots",
-        "circular spots": "Circular spots",
-        "yellowing": "Yellowing",
-        "wilting": "Wilting",
-        "powdery": "Powdery growth",
-        "fuzzy": "Fuzzy growth",
-        "holes": "Holes in leaves",
-        "discoloration": "Discoloration",
-        "lesions": "Lesions",
-        "blisters": "Blisters",
-        "rotting": "Rotting"
-    }
-    for pattern, symptom_name in symptom_patterns.items():
-        if pattern in text_lower:
-            symptoms.append(symptom_name)
-    
-    # If no specific symptoms found but disease mentioned, add generic
-    if not symptoms and disease_name.lower() != "healthy" and disease_name.lower() != "unknown":
-        symptoms.append("Disease symptoms detected")
-    
-    # Enhanced confidence level determination
-    confidence_level = 'Medium'
-    if "high confidence" in text_lower or ("high" in text_lower and "certain" in text_lower):
-        confidence_level = 'High'
-    elif "low confidence" in text_lower or ("uncertain" in text_lower or "unclear" in text_lower):
-        confidence_level = 'Low'
-    elif "healthy" in text_lower:
-        confidence_level = 'High'
-    elif disease_name.lower() == "unknown":
-        confidence_level = 'Low'
-    
-    # Extract disease location if mentioned
-    disease_location = 'center'
-    if "top" in text_lower and "left" in text_lower:
-        disease_location = "top-left"
-    elif "top" in text_lower and "right" in text_lower:
-        disease_location = "top-right"
-    elif "bottom" in text_lower and "left" in text_lower:
-        disease_location = "bottom-left"
-    elif "bottom" in text_lower and "right" in text_lower:
-        disease_location = "bottom-right"
-    elif "entire" in text_lower or "whole" in text_lower:
-        disease_location = "entire leaf"
-    elif "edge" in text_lower or "edges" in text_lower:
-        disease_location = "leaf edges"
-    elif "center" in text_lower or "middle" in text_lower:
-        disease_location = "center"
-    
-    # Format description
-    if symptoms:
-        description = f"Symptoms: {', '.join(symptoms)}"
-    elif disease_name.lower() == "healthy":
-        description = "The plant appears healthy with no visible disease symptoms."
-    else:
-        description = f"Disease detected: {disease_name}"
-    
-    disease_label = f"{crop_name} - {disease_name}" if crop_name != "Unknown" else disease_name
-    
-    return {
-        'label': disease_label,
-        'score': confidence,
-        'crop_name': crop_name,
-        'disease_name': disease_name,
-        'description': description,
-        'treatment_tip': 'Please consult with an agricultural expert for specific treatment recommendations. Consider organic treatments and proper crop management practices.',
-        'disease_location': disease_location,
-        'symptoms_detected': symptoms if symptoms else [],
-        'confidence_level': confidence_level,
-        'no_flora': False  # If we got here, flora is present
-    }
+# Result pages link to /results/<hash> instead of inlining the image, so the
+# browser downloads a WebP/JPEG once and caches it for good
+result_images = ResultImageStore(
+    os.getenv('RESULT_IMAGE_FOLDER', os.path.join(app.instance_path, 'results')),
+    quality=int(os.getenv('RESULT_IMAGE_QUALITY', '80')),
+    save_data_quality=int(os.getenv('RESULT_IMAGE_SAVE_DATA_QUALITY', '50')),
+    ttl_seconds=int(os.getenv('RESULT_IMAGE_TTL', str(7 * 24 * 3600)))
+)
+
 
+def result_image_url(img):
+    """Store a rendered result image and return the URL the page should load it from."""
+    with stage('result_image_store'):
+        digest = result_images.store(img)
+    return url_for('result_image', digest=digest)
 
-def ollama_get_fertilizer_recommendation(crop_name, soil_type, water_availability):
+
+def ollama_get_fertilizer_recommendation(crop_name, soil_type, water_availability, lang=None):
     """Get fertilizer recommendations from Ollama based on crop, soil type, and water availability."""
     try:
         # First check if llava model is available (or use any available model)
         model_available, model_info = check_ollama_model("llava")
         if not model_available:
             # Try to use any available model
-            try:
-                response = requests.get("http://localhost:11434/api/tags", timeout=5)
-                if response.status_code == 200:
-                    models_data = response.json()
-                    available_models = [model.get('name', '') for model in models_data.get('models', [])]
-                    if available_models:
-                        model_to_use = available_models[0]  # Use first available model
-                    else:
-                        return None, "No Ollama models available. Please install a model: ollama pull llama3"
-                else:
-                    return None, "Could not connect to Ollama"
-            except:
+            if not ollama_pool.state()['reachable']:
                 return None, "Could not connect to Ollama. Please ensure Ollama is running."
+            available_models = model_info if isinstance(model_info, list) else []
+            if available_models:
+                model_to_use = available_models[0]  # Use first available model
+            else:
+                return None, "No Ollama models available. Please install a model: ollama pull llama3"
         else:
             model_to_use = model_info if isinstance(model_info, str) else "llama3"
         
         # Get current language
-        lang = get_language()
-        lang_instruction = ""
-        if lang == 'kn':
-            lang_instruction = " IMPORTANT: Respond in Kannada (ಕನ್ನಡ) language. All text in the JSON response should be in Kannada script."
-        
-        # Create a detailed, condition-specific prompt for fertilizer recommendation
-        prompt = (
-            f"You are an expert agricultural advisor with deep knowledge of crop nutrition, soil science, and irrigation management. "
-            f"Provide SPECIFIC, DETAILED fertilizer recommendations based on the exact conditions provided.\n\n"
-            f"CROP TO GROW: {crop_name}\n"
-            f"SOIL TYPE: {soil_type}\n"
-            f"WATER AVAILABILITY: {water_availability}%\n\n"
-            f"ANALYSIS REQUIRED:\n"
-            f"1. Analyze the specific nutrient needs of {crop_name} at different growth stages.\n"
-            f"2. Consider how {soil_type} soil affects nutrient availability and what adjustments are needed.\n"
-            f"3. Factor in water availability ({water_availability}%) - low water may require different fertilizer types or application methods.\n"
-            f"4. Provide SPECIFIC fertilizer recommendations (exact NPK ratios, organic alternatives, micronutrients if needed).\n"
-            f"5. Give detailed application instructions tailored to these specific conditions.\n"
-            f"6. Explain timing based on {crop_name}'s growth cycle and {soil_type} soil characteristics.\n\n"
-            f"IMPORTANT: Make your recommendations SPECIFIC to these exact conditions. Different crops, soil types, and water levels require DIFFERENT approaches.\n"
-            f"DO NOT give generic advice. Be specific about:\n"
-            f"- Exact fertilizer type and NPK ratio (e.g., NPK 19:19:19, DAP, Urea, SSP, etc.)\n"
-            f"- Specific quantities per acre/hectare if possible\n"
-            f"- How {soil_type} soil affects the choice\n"
-            f"- How {water_availability}% water availability impacts fertilizer application\n"
-            f"- Crop-specific timing (e.g., for {crop_name}, apply at specific growth stages)\n\n"
-            f"{lang_instruction}\n\n"
-            f"Respond in JSON format:\n"
-            f'{{"recommendation": "detailed 3-4 sentence explanation specific to {crop_name} in {soil_type} soil with {water_availability}% water - explain WHY these specific fertilizers are recommended", '
-            f'"fertilizer_type": "specific fertilizer name and NPK ratio (e.g., NPK 19:19:19, DAP 18:46:0, Urea 46:0:0, or organic alternatives) - MUST be specific to {crop_name} and {soil_type}", '
-            f'"application_method": "detailed step-by-step instructions (3-4 steps) specific to {crop_name} and {soil_type} soil conditions, including quantities if possible", '
-            f'"timing": "specific timing based on {crop_name} growth stages (e.g., before planting, at 30 days, during flowering, etc.) - MUST be crop-specific", '
-            f'"soil_analysis": "detailed analysis of how {soil_type} soil affects {crop_name} growth and why specific fertilizers are needed, considering {water_availability}% water availability"}}\n\n'
-            f"Remember: Each crop-soil-water combination is UNIQUE. Provide recommendations that reflect these specific conditions, not generic advice."
-        )
-        
-        # Call Ollama API
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": model_to_use,
-                "prompt": prompt,
-                "stream": False
-            },
-            timeout=60
-        )
-        
+        if lang is None:
+            lang = get_language()
+
+        # Call Ollama API with the condition-specific fertilizer prompt
+        with stage('ollama_request'):
+            response = ollama_pool.generate(
+                prompt_registry.payload('fertilizer', lang, model_to_use, crop_name=crop_name,
+                                        soil_type=soil_type, water_availability=water_availability),
+                task='fertilizer'
+            )
+
         if response.status_code == 200:
             result_data = response.json()
+            prompt_registry.record('fertilizer', lang, result_data)
+            token_usage.record('fertilizer', lang, result_data, model=model_to_use)
             response_text = result_data.get('response', '')
             
-            # Try to parse JSON from the response
-            try:
-                # Clean up JSON if wrapped in markdown
-                if '```json' in response_text:
-                    json_start = response_text.find('```json') + 7
-                    json_end = response_text.find('```', json_start)
-                    response_text = response_text[json_start:json_end].strip()
-                elif '```' in response_text:
-                    json_start = response_text.find('```') + 3
-                    json_end = response_text.find('```', json_start)
-                    response_text = response_text[json_start:json_end].strip()
-                
-                result_json = json.loads(response_text)
-                return result_json, None
-            except json.JSONDecodeError:
+            with stage('response_parse'):
+                # Locate the JSON object (bare, fenced or surrounded by prose)
+                result_json = find_json_object(response_text)
+                if result_json is not None:
+                    return result_json, None
                 # If JSON parsing fails, format the text response
-                formatted_recommendation = format_fertilizer_text_response(response_text, crop_name, soil_type, water_availability)
+                formatted_recommendation = format_fertilizer_text_response(
+                    strip_code_fence(response_text), crop_name, soil_type, water_availability)
                 return formatted_recommendation, None
         else:
             return None, f"Ollama API error: {response.status_code}"
             
+    except CircuitOpenError:
+        return None, "The recommendation service is not responding right now. Please try again in a minute."
     except requests.exceptions.ConnectionError:
         return None, "Could not connect to Ollama. Please ensure Ollama is running."
     except Exception as e:
@@ -1370,6 +1307,134 @@ def generate_fertilizer_recommendation(disease_name, description, treatment_tip,
         }
 
 
+# ---------------------------------------------
+# 🔹 Background Analysis Jobs
+# ---------------------------------------------
+
+def run_disease_job(file_path, lang):
+    with metrics.route('job:disease'):
+        return predict_crop_disease_tiered(file_path, lang=lang)
+
+
+def run_soil_job(file_path, lang):
+    with metrics.route('job:soil'):
+        return ollama_analyze_soil_and_recommend_crops(file_path, lang=lang)
+
+
+def remove_job_upload(params):
+    try:
+        os.remove(params['file_path'])
+    except (KeyError, OSError):
+        pass
+
+
+# Submit-and-poll mode: uploads are analysed by a bounded pool of background
+# workers instead of holding a request worker for the whole Ollama call
+job_queue = JobQueue(
+    os.getenv('JOB_QUEUE_DB', os.path.join(app.instance_path, 'jobs.db')),
+    handlers={'disease': run_disease_job, 'soil': run_soil_job},
+    workers=int(os.getenv('JOB_WORKERS', '2')),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', '100')),
+    lease_seconds=int(os.getenv('JOB_LEASE_SECONDS', '600')),
+    retention_seconds=int(os.getenv('JOB_RETENTION_SECONDS', str(24 * 3600))),
+    cleanup=remove_job_upload
+)
+
+
+def wants_async():
+    """True when the client asked for submit-and-poll (?async=1 or Prefer: respond-async)."""
+    flag = request.values.get('async', '').lower()
+    return flag in ('1', 'true', 'yes') or 'respond-async' in request.headers.get('Prefer', '')
+
+
+def submit_analysis_job(kind, file):
+    """Save an upload under a unique name, queue it and return the 202 response."""
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"job_{uuid.uuid4().hex}.{ext}")
+    save_upload(file, file_path)
+    try:
+        job_id = job_queue.submit(kind, {'file_path': file_path, 'lang': get_language()})
+    except JobQueueFull:
+        os.remove(file_path)
+        return jsonify({"error": "Too many analyses in progress, please retry shortly"}), 503
+    status_url = url_for('job_status', job_id=job_id)
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": status_url}), 202, {'Location': status_url}
+
+# ---------------------------------------------
+# 🔹 Batch Analysis
+# ---------------------------------------------
+
+# One pool for every /predict/batch request, so a few large batches cannot
+# start more concurrent analyses than BATCH_WORKERS between them
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '4'))
+BATCH_MAX_IMAGES = int(os.getenv('BATCH_MAX_IMAGES', '100'))
+BATCH_MAX_IMAGE_BYTES = int(os.getenv('BATCH_MAX_IMAGE_BYTES', str(20 * 1024 * 1024)))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch-analysis')
+
+
+class BatchTooLarge(Exception):
+    """Raised when an upload holds more than BATCH_MAX_IMAGES images."""
+
+
+def save_batch_images(files):
+    """Save the images of a batch upload (plain files and/or zip archives).
+
+    Returns [(original_name, saved_path)]; other members and oversized
+    images are skipped.
+    """
+    batch_id = uuid.uuid4().hex
+    saved = []
+
+    def add(name, data):
+        if len(saved) >= BATCH_MAX_IMAGES:
+            raise BatchTooLarge(f"At most {BATCH_MAX_IMAGES} images per batch")
+        ext = name.rsplit('.', 1)[1].lower()
+        path = os.path.join(app.config['UPLOAD_FOLDER'], f"batch_{batch_id}_{len(saved)}.{ext}")
+        with stage('upload_save'), open(path, 'wb') as f:
+            f.write(data)
+        saved.append((name, path))
+
+    try:
+        for file in files:
+            if not file or file.filename == '':
+                continue
+            if file.filename.lower().endswith('.zip'):
+                with zipfile.ZipFile(file.stream) as archive:
+                    for info in archive.infolist():
+                        name = os.path.basename(info.filename)
+                        if (info.is_dir() or name.startswith('.') or '__MACOSX' in info.filename
+                                or not allowed_file(name) or info.file_size > BATCH_MAX_IMAGE_BYTES):
+                            continue
+                        with archive.open(info) as member:
+                            add(name, member.read(BATCH_MAX_IMAGE_BYTES))
+            elif allowed_file(file.filename):
+                data = file.read(BATCH_MAX_IMAGE_BYTES + 1)
+                if len(data) <= BATCH_MAX_IMAGE_BYTES:
+                    add(file.filename, data)
+    except Exception:
+        remove_batch_images(saved)
+        raise
+    return saved
+
+
+def remove_batch_images(saved):
+    for _, path in saved:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def analyze_batch_image(file_path, lang):
+    try:
+        with metrics.route('/predict/batch'):
+            return predict_crop_disease_tiered(file_path, lang=lang)
+    finally:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
 # ---------------------------------------------
 # 🔹 Flask Routes
 # ---------------------------------------------
@@ -1523,54 +1588,6 @@ def format_fertilizer_recommendation_html(recommendation_data, crop_name, soil_t
     return html
 
 
-def parse_soil_text_response(text):
-    """Parse text response when JSON parsing fails."""
-    text_lower = text.lower()
-    
-    # Check if no soil is detected
-    no_soil_keywords = ["no soil", "no dirt", "not soil", "not a soil", "does not contain soil", 
-                        "no soil detected", "not soil image", "doesn't contain soil"]
-    if any(keyword in text_lower for keyword in no_soil_keywords):
-        return {
-            'soil_type': 'No Soil Detected',
-            'recommended_crops': [],
-            'confidence': 1.0,
-            'description': 'No soil detected in this image. Please upload an image containing soil samples, dirt, or agricultural soil.',
-            'crop_recommendations': 'Please upload a clear image of soil for analysis.',
-            'no_soil': True
-        }
-    
-    # Try extract information from text
-    soil_type = "Unknown"
-    recommended_crops = []
-    
-    # Simple extraction logic
-    if "alluvial" in text_lower:
-        soil_type = "Alluvial"
-        recommended_crops = ["Rice", "Wheat", "Sugarcane", "Maize", "Cotton", "Soyabean", "Jute"]
-    elif "black" in text_lower:
-        soil_type = "Black"
-        recommended_crops = ["Virginia", "Wheat", "Jowar", "Millets", "Linseed", "Castor", "Sunflower"]
-    elif "clay" in text_lower:
-        soil_type = "Clay"
-        recommended_crops = ["Rice", "Lettuce", "Chard", "Broccoli", "Cabbage", "Snap Beans"]
-    elif "red" in text_lower:
-        soil_type = "Red"
-        recommended_crops = ["Cotton", "Wheat", "Pulses", "Millets", "Oil Seeds", "Potatoes"]
-    else:
-        soil_type = "Unknown"
-        recommended_crops = []
-    
-    return {
-        'soil_type': soil_type,
-        'recommended_crops': recommended_crops,
-        'confidence': 0.75,
-        'description': text[:200] if len(text) > 200 else text,
-        'crop_recommendations': f"Based on {soil_type} soil, recommended crops: {', '.join(recommended_crops) if recommended_crops else 'Please consult an agricultural expert.'}",
-        'no_soil': False
-    }
-
-
 # ---------------------------------------------
 # 🔹 Flask Routes (Additional Routes)
 # ---------------------------------------------
@@ -1590,11 +1607,14 @@ def soil_prediction():
         
         if not allowed_file(file.filename):
             return render_template('try_again.html', title=title, error_message="Allowed file types are png, jpg, jpeg")
-        
+
+        if wants_async():
+            return submit_analysis_job('soil', file)
+
         # Secure and save file
         filename = secure_filename(file.filename)
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        save_upload(file, file_path)
         
         # Get prediction from Ollama
         prediction = ollama_analyze_soil_and_recommend_crops(file_path)
@@ -1603,10 +1623,8 @@ def soil_prediction():
         # Get no_soil flag
         no_soil = prediction.get('no_soil', False)
         
-        # Convert image to base64 for display
-        with open(file_path, "rb") as f:
-            img_bytes = f.read()
-        img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+        # Display-sized copy, linked from the page rather than inlined
+        image_url = result_image_url(open_display_copy(file_path, HIGHLIGHT_MAX_SIDE))
         
         # Format prediction for template
         formatted_prediction = {
@@ -1616,7 +1634,7 @@ def soil_prediction():
         
         return render_template('crop-result.html', 
                              prediction=formatted_prediction, 
-                             image_base64=img_base64, 
+                             image_url=image_url, 
                              title=title,
                              soil_type=prediction.get('soil_type', 'Unknown'),
                              recommended_crops=prediction.get('recommended_crops', []),
@@ -1630,8 +1648,76 @@ def soil_prediction():
         return render_template('try_again.html', title=title, error_message=error)
 
 
-def ollama_analyze_soil_and_recommend_crops(image_path):
+def ollama_analyze_soil_and_recommend_crops(image_path, lang=None):
     """Use Ollama vision model to analyze soil and recommend crops."""
+    try:
+        if lang is None:
+            lang = get_language()
+
+        img_bytes = read_file_bytes(image_path)
+
+        # Same (or near-identical) photo, language and prompt -> reuse the earlier analysis
+        cached, cache_key, image_hash = find_cached_analysis('soil', img_bytes, lang, SOIL_PROMPT_VERSION)
+        if cached is not None:
+            return cached
+
+        def analyze():
+            result = _ollama_analyze_soil_and_recommend_crops(img_bytes, lang)
+            if result.get('soil_type') != 'Error':
+                store_analysis('soil', cache_key, image_hash, lang, SOIL_PROMPT_VERSION, result)
+            return result
+
+        return single_flight.do(cache_key, analyze, recheck=lambda: result_cache.get(cache_key))
+    except Exception as e:
+        print(f"Soil Analysis Error: {e}")
+        return {
+            'soil_type': 'Error',
+            'recommended_crops': [],
+            'confidence': 0.0,
+            'description': f'An error occurred: {str(e)}',
+            'crop_recommendations': 'Please try again with a different image.'
+        }
+
+
+def parse_soil_response(response_text):
+    """Turn llava's soil answer (JSON or prose) into the soil result dict."""
+    # Locate the JSON object (bare, fenced or surrounded by prose)
+    result_json = find_json_object(response_text)
+    if result_json is None:
+        # If JSON parsing fails, extract from text
+        print("Failed to parse JSON, extracting from text...")
+        return parse_soil_text_response(strip_code_fence(response_text))
+
+    # Check if soil was detected
+    soil_detected = result_json.get('soil_detected', True)  # Default to True for backward compatibility
+
+    if not soil_detected:
+        # No soil detected in the image
+        return {
+            'soil_type': 'No Soil Detected',
+            'recommended_crops': [],
+            'confidence': 1.0,
+            'description': 'No soil detected in this image. Please upload an image containing soil samples, dirt, or agricultural soil.',
+            'crop_recommendations': 'Please upload a clear image of soil for analysis.',
+            'no_soil': True
+        }
+
+    # Format result
+    soil_type = result_json.get('soil_type', 'Unknown')
+    recommended_crops = result_json.get('recommended_crops', [])
+
+    return {
+        'soil_type': soil_type,
+        'recommended_crops': recommended_crops,
+        'confidence': float(result_json.get('confidence', 0.85)),
+        'description': result_json.get('description', 'No description available.'),
+        'crop_recommendations': result_json.get('crop_recommendations', 'No recommendations available.'),
+        'no_soil': False
+    }
+
+
+def _ollama_analyze_soil_and_recommend_crops(img_bytes, lang):
+    """Run the llava soil analysis on raw image bytes."""
     try:
         # First check if llava model is available
         model_available, model_info = check_ollama_model("llava")
@@ -1655,95 +1741,26 @@ def ollama_analyze_soil_and_recommend_crops(image_path):
         # Use the available model
         model_to_use = model_info if isinstance(model_info, str) else "llava"
         
-        # Encode image to base64
-        with open(image_path, "rb") as f:
-            img_bytes = f.read()
-        img_base64 = base64.b64encode(img_bytes).decode("utf-8")
-        
-        # Get current language
-        lang = get_language()
-        lang_instruction = ""
-        if lang == 'kn':
-            lang_instruction = " IMPORTANT: Respond in Kannada (ಕನ್ನಡ) language. All text in the JSON response should be in Kannada script."
-        
-        # Prompt for Ollama
-        prompt = (
-            "You are an expert agricultural consultant. Analyze this image carefully.\n\n"
-            "FIRST, check if this image contains SOIL. Look for:\n"
-            "- Soil samples, dirt, earth, ground\n"
-            "- Soil texture, color, composition\n"
-            "- Agricultural soil, farmland soil\n\n"
-            "If NO SOIL is detected (e.g., the image shows plants, animals, objects, people, buildings, or anything else that is NOT soil), "
-            "respond with soil_detected: false.\n\n"
-            "If SOIL IS detected, identify the soil type (Alluvial, Black, Clay, Red, Sandy, Loamy, Silt) and recommend suitable crops.\n"
-            f"{lang_instruction}\n\n"
-            "Respond in JSON format with these exact fields: "
-            '{"soil_detected": true/false, "soil_type": "name of soil type or No Soil Detected", "recommended_crops": ["crop1", "crop2", ...], "confidence": 0.95, "description": "brief description", "crop_recommendations": "detailed crop recommendations"}\n\n'
-            'If soil_detected is false, set soil_type to "No Soil Detected" and recommended_crops to an empty array.'
-        )
-        
-        # Call Ollama local API
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": model_to_use,
-                "prompt": prompt,
-                "images": [img_base64],
-                "stream": False
-            },
-            timeout=120
-        )
-        
+        # Shrink and encode image to base64
+        img_base64 = encode_image_for_ollama(img_bytes)
+
+        # Call Ollama API
+        with stage('ollama_request'):
+            response = ollama_pool.generate(
+                prompt_registry.payload('soil', lang, model_to_use, images=[img_base64]),
+                task='soil'
+            )
+
         if response.status_code == 200:
             result_data = response.json()
-            
+            prompt_registry.record('soil', lang, result_data)
+            token_usage.record('soil', lang, result_data, model=model_to_use)
+
             # Extract response text
             response_text = result_data.get('response', '')
             
-            # Try parse JSON from response
-            try:
-                # Sometimes Ollama wraps JSON in markdown code blocks
-                if '```json' in response_text:
-                    json_start = response_text.find('```json') + 7
-                    json_end = response_text.find('```', json_start)
-                    response_text = response_text[json_start:json_end].strip()
-                elif '```' in response_text:
-                    json_start = response_text.find('```') + 3
-                    json_end = response_text.find('```', json_start)
-                    response_text = response_text[json_start:json_end].strip()
-                
-                result_json = json.loads(response_text)
-                
-                # Check if soil was detected
-                soil_detected = result_json.get('soil_detected', True)  # Default to True for backward compatibility
-                
-                if not soil_detected:
-                    # No soil detected in the image
-                    return {
-                        'soil_type': 'No Soil Detected',
-                        'recommended_crops': [],
-                        'confidence': 1.0,
-                        'description': 'No soil detected in this image. Please upload an image containing soil samples, dirt, or agricultural soil.',
-                        'crop_recommendations': 'Please upload a clear image of soil for analysis.',
-                        'no_soil': True
-                    }
-                
-                # Format result
-                soil_type = result_json.get('soil_type', 'Unknown')
-                recommended_crops = result_json.get('recommended_crops', [])
-                
-                return {
-                    'soil_type': soil_type,
-                    'recommended_crops': recommended_crops,
-                    'confidence': float(result_json.get('confidence', 0.85)),
-                    'description': result_json.get('description', 'No description available.'),
-                    'crop_recommendations': result_json.get('crop_recommendations', 'No recommendations available.'),
-                    'no_soil': False
-                }
-            except json.JSONDecodeError:
-                # If JSON parsing fails, extract from text
-                print("Failed to parse JSON, extracting from text...")
-                return parse_soil_text_response(response_text)
+            with stage('response_parse'):
+                return parse_soil_response(response_text)
         else:
             error_text = response.text[:200] if response.text else "Unknown error"
             print(f"Ollama Error: {response.status_code} - {error_text}")
@@ -1763,13 +1780,22 @@ def ollama_analyze_soil_and_recommend_crops(image_path):
                 'crop_recommendations': 'Please ensure Ollama is running and the llava model is installed.'
             }
             
+    except CircuitOpenError as e:
+        print(f"[CIRCUIT] Soil analysis skipped: {e}")
+        return {
+            'soil_type': 'Error',
+            'recommended_crops': [],
+            'confidence': 0.0,
+            'description': 'The image analysis service is not responding right now, so your image was not sent.',
+            'crop_recommendations': 'Please try again in a minute.'
+        }
     except requests.exceptions.ConnectionError:
         print("Connection Error: Could not connect to Ollama. Is it running?")
         return {
             'soil_type': 'Error',
             'recommended_crops': [],
             'confidence': 0.0,
-            'description': 'Could not connect to Ollama. Please ensure Ollama is running on localhost:11434',
+            'description': f'Could not connect to Ollama. Please ensure Ollama is running on {OLLAMA_BASE_URL}',
             'crop_recommendations': 'Start Ollama service and ensure the llava model is installed: ollama pull llava'
         }
     except Exception as e:
@@ -1816,6 +1842,34 @@ def register():
         return redirect(url_for('disease_prediction'))
 
 
+def build_disease_result_view(file_path, prediction):
+    """Return (image_url, fertilizer_info) for rendering a disease prediction."""
+    no_flora = prediction.get('no_flora', False)
+
+    # Get disease name and location for highlighting check
+    disease_name = prediction.get('disease_name', 'Unknown')
+    disease_location = prediction.get('disease_location', 'none')
+
+    # Highlight disease area if disease is detected (not healthy, not unknown, not no flora)
+    if not no_flora and disease_name and disease_name.lower() not in ['healthy', 'unknown', 'no flora detected']:
+        # Highlight the diseased area
+        with stage('highlight'):
+            highlighted_img = highlight_disease_area(file_path, disease_location, disease_name)
+        image_url = result_image_url(highlighted_img)
+    else:
+        # Use original image if healthy or no flora
+        image_url = result_image_url(open_display_copy(file_path, HIGHLIGHT_MAX_SIDE))
+
+    # Generate fertilizer recommendation
+    fertilizer_info = generate_fertilizer_recommendation(
+        prediction.get('disease_name', 'Unknown'),
+        prediction.get('description', ''),
+        prediction.get('treatment_tip', ''),
+        no_flora=no_flora
+    )
+    return image_url, fertilizer_info
+
+
 @app.route('/disease-predict', methods=['GET', 'POST'])
 def disease_prediction():
     title = 'Disease Detection'
@@ -1834,45 +1888,24 @@ def disease_prediction():
             error = 'Allowed file types are png, jpg, jpeg'
             return render_template('disease.html', title=title, error=error)
 
+        if wants_async():
+            return submit_analysis_job('disease', file)
+
         try:
             # Save the uploaded file
             filename = secure_filename(file.filename)
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            save_upload(file, file_path)
 
-            # Get prediction from Ollama
-            prediction = ollama_predict_crop_disease(file_path)
+            # Get prediction (local ResNet9 first, Ollama for uncertain images)
+            prediction = predict_crop_disease_tiered(file_path)
             print("Prediction:", prediction)
 
             # Get no_flora flag
             no_flora = prediction.get('no_flora', False)
-            
-            # Get disease name and location for highlighting check
-            disease_name = prediction.get('disease_name', 'Unknown')
-            disease_location = prediction.get('disease_location', 'none')
-            
-            # Highlight disease area if disease is detected (not healthy, not unknown, not no flora)
-            if not no_flora and disease_name and disease_name.lower() not in ['healthy', 'unknown', 'no flora detected']:
-                # Highlight the diseased area
-                highlighted_img = highlight_disease_area(file_path, disease_location, disease_name)
-                
-                # Convert highlighted image to base64
-                buffered = io.BytesIO()
-                highlighted_img.save(buffered, format="PNG")
-                img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-            else:
-                # Use original image if healthy or no flora
-                with open(file_path, "rb") as f:
-                    img_bytes = f.read()
-                img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-            
-            # Generate fertilizer recommendation
-            fertilizer_info = generate_fertilizer_recommendation(
-                prediction.get('disease_name', 'Unknown'),
-                prediction.get('description', ''),
-                prediction.get('treatment_tip', ''),
-                no_flora=no_flora
-            )
+
+            # Highlighted image and fertilizer recommendation for the result page
+            image_url, fertilizer_info = build_disease_result_view(file_path, prediction)
 
             # Format prediction for template (matching expected format)
             formatted_prediction = {
@@ -1883,7 +1916,7 @@ def disease_prediction():
             return render_template('disease-result.html', 
                                  prediction=formatted_prediction, 
                                  fertilizer=fertilizer_info, 
-                                 image_base64=img_base64, 
+                                 image_url=image_url, 
                                  title=title,
                                  crop_name=prediction.get('crop_name', 'Unknown'),
                                  disease_name=prediction.get('disease_name', 'Unknown'),
@@ -1891,6 +1924,7 @@ def disease_prediction():
                                  treatment_tip=prediction.get('treatment_tip', ''),
                                  symptoms_detected=prediction.get('symptoms_detected', []),
                                  confidence_level=prediction.get('confidence_level', 'Medium'),
+                                 tier=prediction.get('tier', 'ollama'),
                                  no_flora=no_flora)
         
         except Exception as e:
@@ -1901,6 +1935,431 @@ def disease_prediction():
     return render_template('disease.html', title=title)
 
 
+@app.route('/healthz')
+def healthz():
+    """Liveness probe - answers without touching Ollama."""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe backed by the cached Ollama model registry."""
+    state = ollama_pool.state()
+    llava_available, _ = ollama_pool.find('llava') if state['reachable'] else (False, None)
+    ready = state['reachable'] and llava_available
+    body = {
+        'status': 'ready' if ready else 'not ready',
+        'ollama_reachable': state['reachable'],
+        'llava_available': llava_available,
+        'models': state['models'],
+        'registry_age_seconds': state['age_seconds'],
+        'last_error': state['last_error'],
+        'backends': state['backends'],
+    }
+    return jsonify(body), 200 if ready else 503
+
+
+@app.route('/ollama/stats')
+def ollama_stats():
+    """Per-backend health, in-flight requests and connect/response timings."""
+    stats = ollama_pool.stats()
+    if ollama_cassette is not None:
+        stats['cassette'] = ollama_cassette.stats()
+    return jsonify(stats)
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters for the image analysis result cache."""
+    stats = result_cache.stats()
+    if phash_index is not None:
+        stats['near_duplicate'] = phash_index.stats()
+    return jsonify(stats)
+
+
+@app.route('/single-flight/stats')
+def single_flight_stats():
+    """How many analyses ran vs. were coalesced onto an identical in-flight one."""
+    return jsonify(single_flight.stats())
+
+
+@app.route('/prompts/stats')
+def prompt_stats():
+    """Average prompt-eval tokens and time per prompt template."""
+    return jsonify(prompt_registry.stats())
+
+
+@app.route('/tokens/stats')
+def token_stats():
+    """Prompt/generated tokens per second and cold loads per task, model and language."""
+    return jsonify(token_usage.stats())
+
+
+@app.route('/preprocess/stats')
+def preprocess_stats():
+    """Bytes saved by shrinking uploads before they are sent to Ollama."""
+    return jsonify(image_preprocessor.stats())
+
+
+@app.route('/classifier/stats')
+def classifier_stats():
+    """Runtime plus batch fill and queue wait counters for the local ResNet9 classifier."""
+    if local_classifier is None or not local_classifier.available:
+        return jsonify({'available': False})
+    return jsonify({'available': True, 'backend': local_classifier.backend, 'batching': local_classifier.stats()})
+
+
+@app.route('/jobs/stats')
+def job_stats():
+    """Background job counts by status."""
+    return jsonify(job_queue.stats())
+
+
+def collect_component_metrics():
+    """Export the counters the helper classes already keep, read at scrape time."""
+    cache = result_cache.stats()
+    families = [
+        ('axiom_result_cache_lookups_total', 'counter', 'Result cache lookups by outcome',
+         [({'outcome': outcome}, cache[outcome]) for outcome in ('memory_hits', 'db_hits', 'misses')]),
+        ('axiom_result_cache_entries', 'gauge', 'Entries held in each result cache tier',
+         [({'tier': 'memory'}, cache['memory_size']), ({'tier': 'db'}, cache['db_size'])]),
+    ]
+
+    in_flight, routed, circuit, transitions = [], [], [], []
+    for backend in ollama_pool.stats()['backends']:
+        labels = {'backend': backend['base_url']}
+        in_flight.append((labels, backend['in_flight']))
+        routed.append((labels, backend['routed']))
+        circuit += [(dict(labels, state=state), backend['circuit']['state'] == state)
+                    for state in ('closed', 'open', 'half_open')]
+        for transition, count in sorted(backend['circuit']['transitions'].items()):
+            source, _, target = transition.partition('->')
+            transitions.append((dict(labels, **{'from': source, 'to': target}), count))
+    families += [
+        ('axiom_ollama_in_flight', 'gauge', 'Ollama calls in progress per backend', in_flight),
+        ('axiom_ollama_routed_total', 'counter', 'Ollama calls routed to each backend', routed),
+        ('axiom_ollama_circuit_state', 'gauge', 'Circuit breaker state per backend (1 = current)', circuit),
+        ('axiom_ollama_circuit_transitions_total', 'counter', 'Circuit breaker state changes per backend',
+         transitions),
+    ]
+
+    jobs = job_queue.stats()
+    families.append(('axiom_jobs', 'gauge', 'Background jobs by status',
+                     [({'status': status}, count) for status, count in sorted(jobs['by_status'].items())]))
+
+    flights = single_flight.stats()
+    families += [
+        ('axiom_single_flight_total', 'counter', 'Analyses run vs. coalesced onto an identical one',
+         [({'outcome': outcome}, flights[outcome]) for outcome in ('leaders', 'coalesced', 'remote_hits')]),
+        ('axiom_single_flight_in_flight', 'gauge', 'Distinct analyses in progress',
+         [({}, flights['in_flight'])]),
+    ]
+
+    if local_classifier is not None and local_classifier.available:
+        batching = local_classifier.stats()
+        if batching:
+            families += [
+                ('axiom_classifier_batches_total', 'counter', 'Classifier batches run', [({}, batching['batches'])]),
+                ('axiom_classifier_items_total', 'counter', 'Images classified in batches', [({}, batching['items'])]),
+                ('axiom_classifier_queue_depth', 'gauge', 'Images waiting for a classifier batch',
+                 [({}, batching['queue_depth'])]),
+            ]
+    return families
+
+
+metrics.add_collector(collect_component_metrics)
+
+
+def collect_token_metrics():
+    """Ollama token and time totals per task, model and language; rate() them for tokens/s."""
+    totals = token_usage.totals()
+
+    def samples(field, scale=None):
+        return [({'task': task, 'model': model, 'lang': lang}, values[field] * scale if scale else values[field])
+                for (task, model, lang), values in totals]
+
+    return [
+        ('axiom_ollama_generations_total', 'counter', 'Ollama generations with token metadata', samples('calls')),
+        ('axiom_ollama_cold_loads_total', 'counter', 'Generations that had to load the model first',
+         samples('cold_loads')),
+        ('axiom_ollama_prompt_tokens_total', 'counter', 'Prompt tokens evaluated', samples('prompt_tokens')),
+        ('axiom_ollama_prompt_eval_seconds_total', 'counter', 'Time spent evaluating prompts',
+         samples('prompt_ms', 0.001)),
+        ('axiom_ollama_eval_tokens_total', 'counter', 'Tokens generated', samples('eval_tokens')),
+        ('axiom_ollama_eval_seconds_total', 'counter', 'Time spent generating tokens', samples('eval_ms', 0.001)),
+        ('axiom_ollama_load_seconds_total', 'counter', 'Time spent loading the model', samples('load_ms', 0.001)),
+    ]
+
+
+metrics.add_collector(collect_token_metrics)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint: per-route/stage latency histograms plus component counters."""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Sample every thread of this worker for ?seconds=N and return collapsed stacks for a flame graph."""
+    if not profile_authorized():
+        return jsonify({"error": "Profiling is disabled or the X-Profile-Token is wrong"}), 403
+    try:
+        seconds = float(request.args.get('seconds', '10'))
+    except ValueError:
+        return jsonify({"error": "seconds must be a number"}), 400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        return jsonify({"error": f"seconds must be between 0 and {PROFILE_MAX_SECONDS:g}"}), 400
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({"error": "A profile is already running"}), 409
+    try:
+        profiler = SamplingProfiler(PROFILE_INTERVAL).run(seconds)
+    finally:
+        profile_lock.release()
+    print(f"[PROFILE] pid {os.getpid()}: {profiler.samples} samples over {profiler.elapsed:.2f}s")
+    return Response(profiler.collapsed(), mimetype='text/plain',
+                    headers={'X-Profile-Samples': str(profiler.samples), 'X-Profile-Pid': str(os.getpid())})
+
+
+@app.route('/debug/profile/<profile_id>')
+def saved_profile(profile_id):
+    """Collapsed stacks saved by a request sent with the X-Profile header."""
+    if not profile_authorized():
+        return jsonify({"error": "Profiling is disabled or the X-Profile-Token is wrong"}), 403
+    path = os.path.join(PROFILE_FOLDER, f"{profile_id}.folded")
+    if not profile_id.isalnum() or not os.path.exists(path):
+        return jsonify({"error": "Unknown profile"}), 404
+    with open(path) as f:
+        return Response(f.read(), mimetype='text/plain')
+
+
+@app.route('/results/<digest>')
+@app.route('/results/<digest>.<ext>')
+def result_image(digest, ext=None):
+    """A stored result image; without an extension the format follows the Accept header."""
+    fmt = ext or choose_format(request.headers.get('Accept'))
+    save_data = request.headers.get('Save-Data', '').lower() == 'on'
+    variant = result_images.variant(digest, fmt, save_data=save_data)
+    if variant is None:
+        return jsonify({"error": "Unknown result image"}), 404
+    path, mimetype, quality = variant
+    # The URL names the pixels, so every variant can be cached for a year
+    response = send_file(path, mimetype=mimetype, etag=f"{digest}-q{quality}.{fmt}",
+                         max_age=365 * 24 * 3600, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Save-Data')
+    if ext is None:
+        response.vary.add('Accept')
+    return response
+
+
+@app.route('/result-images/stats')
+def result_image_stats():
+    """Result images stored, reused and encoded per format."""
+    return jsonify(result_images.stats())
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status of a submitted analysis; includes the result once it is done."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+
+# Fields forwarded to the browser as soon as llava has finished generating them
+STREAMED_DISEASE_FIELDS = ['flora_detected', 'crop_name', 'disease_name', 'confidence_level',
+                           'symptoms_detected', 'treatment_tip', 'disease_location']
+
+
+# Uploads whose stream page is never opened are removed after this long. Claimed uploads
+# are removed by their stream, so the sweep only clears ones whose stream never ran.
+STREAM_UPLOAD_TTL = int(os.getenv('STREAM_UPLOAD_TTL', '900'))
+STREAM_CLAIMED_TTL = 24 * 3600
+
+
+def claim_stream_upload(token):
+    """Take a streaming upload for analysis and return its new path, or None.
+
+    The file is renamed so a reopened or duplicated stream URL cannot
+    analyse the same upload twice.
+    """
+    if not token.isalnum():
+        return None
+    for ext in ALLOWED_EXTENSIONS:
+        path = os.path.join(app.config['UPLOAD_FOLDER'], f"stream_{token}.{ext}")
+        claimed = f"{path}.claimed"
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            continue
+        # The sweep ages claimed uploads from here, not from the upload
+        os.utime(claimed)
+        return claimed
+    return None
+
+
+def remove_stale_stream_uploads():
+    now = time.time()
+    folder = app.config['UPLOAD_FOLDER']
+    for name in os.listdir(folder):
+        if not name.startswith('stream_'):
+            continue
+        path = os.path.join(folder, name)
+        ttl = STREAM_CLAIMED_TTL if name.endswith('.claimed') else STREAM_UPLOAD_TTL
+        try:
+            if os.path.getmtime(path) < now - ttl:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+@app.route('/disease-predict/stream', methods=['POST'])
+def disease_prediction_stream_upload():
+    """Save an upload and render the result page, which then streams the analysis over SSE."""
+    title = 'Disease Detection'
+
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return render_template('disease.html', title=title, error='No file selected for uploading')
+    if not allowed_file(file.filename):
+        return render_template('disease.html', title=title, error='Allowed file types are png, jpg, jpeg')
+
+    remove_stale_stream_uploads()
+    token = secrets.token_hex(8)
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"stream_{token}.{ext}")
+    save_upload(file, file_path)
+
+    image_url = result_image_url(open_display_copy(file_path, HIGHLIGHT_MAX_SIDE))
+
+    return render_template('disease-result.html',
+                           prediction={'label': '', 'score': 0.0},
+                           fertilizer={'fertilizer': '', 'details': '', 'application_method': ''},
+                           image_url=image_url,
+                           title=title,
+                           crop_name='...',
+                           disease_name='...',
+                           description='',
+                           treatment_tip='',
+                           symptoms_detected=[],
+                           confidence_level='',
+                           tier=None,
+                           no_flora=False,
+                           streaming=True,
+                           stream_url=url_for('disease_prediction_stream', token=token))
+
+
+@app.route('/disease-predict/stream/<token>')
+def disease_prediction_stream(token):
+    """Server-sent events: progress, each parsed field as it arrives, then the final result."""
+    file_path = claim_stream_upload(token)
+    if file_path is None:
+        return jsonify({"error": "Unknown upload"}), 404
+    lang = get_language()
+
+    def final_event(prediction):
+        image_url, fertilizer_info = build_disease_result_view(file_path, prediction)
+        return sse_event('result', {
+            'prediction': prediction,
+            'fertilizer': fertilizer_info,
+            'image_url': image_url,
+        })
+
+    def stream_analysis(img_bytes, cache_key, image_hash, flight):
+        """Yield progress and field events while llava answers; the parsed result goes in flight.result."""
+        model_available, model_info = check_ollama_model("llava")
+        if not model_available:
+            flight.result = _ollama_predict_crop_disease(img_bytes, lang)
+            return
+
+        yield sse_event('progress', {'stage': 'analyzing'})
+        img_base64 = encode_image_for_ollama(img_bytes)
+        # Times the wait for the response headers; the tokens are timed by the request as a whole
+        with stage('ollama_request'):
+            response = ollama_pool.generate_stream(
+                prompt_registry.payload('disease', lang, model_info, images=[img_base64]),
+                task='disease'
+            )
+        if response.status_code != 200:
+            response.close()
+            # Let the non-streaming path produce the usual error result
+            flight.result = _ollama_predict_crop_disease(img_bytes, lang)
+            return
+
+        scanner = PartialFieldScanner(STREAMED_DISEASE_FIELDS)
+        tokens = 0
+        finished = False
+        for chunk in ollama_pool.iter_stream(response):
+            if chunk.get('error'):
+                print(f"[STREAM] Ollama stopped with an error: {chunk['error']}")
+                break
+            piece = chunk.get('response', '')
+            tokens += 1
+            for name, value in scanner.feed(piece):
+                yield sse_event('field', {'name': name, 'value': value})
+            if tokens % 20 == 0:
+                yield sse_event('progress', {'stage': 'analyzing', 'tokens': tokens})
+            if chunk.get('done'):
+                prompt_registry.record('disease', lang, chunk)
+                token_usage.record('disease', lang, chunk, model=model_info)
+                finished = True
+                break
+        if not finished:
+            return
+
+        with stage('response_parse'):
+            prediction = parse_disease_response(scanner.text)
+        if prediction.get('crop_name') != 'Error':
+            store_analysis('disease', cache_key, image_hash, lang, DISEASE_PROMPT_VERSION, prediction)
+        flight.result = prediction
+
+    def generate():
+        yield sse_event('progress', {'stage': 'started'})
+        try:
+            # Local ResNet9 and cached answers need no streaming
+            prediction = predict_crop_disease_locally(file_path, lang)
+            if prediction is not None:
+                yield final_event(prediction)
+                return
+
+            img_bytes = read_file_bytes(file_path)
+            cached, cache_key, image_hash = find_cached_analysis('disease', img_bytes, lang, DISEASE_PROMPT_VERSION)
+            if cached is not None:
+                cached['tier'] = 'ollama'
+                yield final_event(cached)
+                return
+
+            # One generation per cache key: identical requests, streamed or not, wait for this one
+            with single_flight.claim(cache_key, recheck=lambda: result_cache.get(cache_key)) as flight:
+                if not flight.shared:
+                    yield from stream_analysis(img_bytes, cache_key, image_hash, flight)
+            if flight.result is None:
+                # A cut-off answer must not be cached or shown as a result
+                yield sse_event('error', {'message': 'The analysis was interrupted. Please try again.'})
+                return
+            yield final_event(dict(flight.result, tier='ollama'))
+        except CircuitOpenError:
+            yield sse_event('error', {'message': 'The image analysis service is not responding right now. Please try again in a minute.'})
+        except requests.exceptions.ConnectionError:
+            yield sse_event('error', {'message': f'Could not connect to Ollama. Please ensure Ollama is running on {OLLAMA_BASE_URL}'})
+        except Exception as e:
+            print(f"Streaming prediction error: {e}")
+            yield sse_event('error', {'message': f'An error occurred during prediction: {str(e)}'})
+        finally:
+            # The result image is already stored, so the upload is no longer needed
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/predict', methods=['POST'])
 def predict_crop_disease():
     """API endpoint for JSON responses."""
@@ -1912,12 +2371,15 @@ def predict_crop_disease():
         return jsonify({"error": "No file selected"}), 400
 
     if file and allowed_file(file.filename):
+        if wants_async():
+            return submit_analysis_job('disease', file)
+
         filename = secure_filename(file.filename)
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        save_upload(file, file_path)
 
-        # Get prediction from Ollama
-        prediction = ollama_predict_crop_disease(file_path)
+        # Get prediction (local ResNet9 first, Ollama for uncertain images)
+        prediction = predict_crop_disease_tiered(file_path)
         print("Prediction:", prediction)
 
         return jsonify(prediction)
@@ -1925,6 +2387,64 @@ def predict_crop_disease():
     return jsonify({"error": "Something went wrong"}), 500
 
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_crop_disease_batch():
+    """Analyse many images (several files and/or zip archives) and stream NDJSON results.
+
+    One line per image is sent as soon as its analysis finishes, so lines
+    arrive in completion order; ``index`` is the image's position in the
+    upload. A final ``summary`` line closes the stream.
+    """
+    files = request.files.getlist('files') + request.files.getlist('file')
+    try:
+        saved = save_batch_images(files)
+    except BatchTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Could not read the zip archive"}), 400
+    if not saved:
+        return jsonify({"error": "No png, jpg or jpeg images in request"}), 400
+
+    lang = get_language()
+    print(f"[BATCH] {len(saved)} image(s) queued on {BATCH_WORKERS} worker(s)")
+
+    def generate():
+        started = time.perf_counter()
+        futures = {batch_executor.submit(analyze_batch_image, path, lang): (index, name)
+                   for index, (name, path) in enumerate(saved)}
+        failed = 0
+        try:
+            for future in as_completed(futures):
+                index, name = futures[future]
+                line = {'index': index, 'filename': name}
+                try:
+                    line['prediction'] = future.result()
+                except Exception as e:
+                    failed += 1
+                    line['error'] = str(e)
+                yield json.dumps(line) + '\n'
+            yield json.dumps({'summary': {
+                'images': len(saved),
+                'failed': failed,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000.0, 1),
+            }}) + '\n'
+        finally:
+            # Client went away: drop the images that have not started yet
+            for future, (index, _) in futures.items():
+                if future.cancel():
+                    remove_batch_images([saved[index]])
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Workers start once every handler above is defined. With JOB_WORKERS=0 (bulk_scan.py,
+# or a web worker that leaves jobs to other processes) the queue is not started at
+# all, so it neither recovers nor renews leases on jobs in the shared database.
+if job_queue.workers > 0:
+    job_queue.start()
+
+
 # ---------------------------------------------
 # 🔹 Run Flask App
 # ---------------------------------------------
@@ -1935,9 +2455,8 @@ if __name__ == '__main__':
     
     # Check Ollama connection and model availability
     try:
-        ollama_check = requests.get("http://localhost:11434/api/tags", timeout=3)
-        if ollama_check.status_code == 200:
-            print("[OK] Ollama is running on http://localhost:11434")
+        if ollama_pool.refresh():
+            print(f"[OK] Ollama is running on {OLLAMA_BASE_URL}")
             model_available, model_info = check_ollama_model("llava")
             if model_available:
                 print(f"[OK] llava model is available: {model_info}")
@@ -1946,10 +2465,8 @@ if __name__ == '__main__':
                 print("   To install, run: ollama pull llava")
                 print(f"   Available models: {', '.join(model_info) if isinstance(model_info, list) else 'None'}")
         else:
-            print("[WARNING] Ollama responded with an error")
-    except requests.exceptions.ConnectionError:
-        print("[ERROR] Could not connect to Ollama!")
-        print("   Please start Ollama: ollama serve")
+            print(f"[ERROR] Could not connect to Ollama: {ollama_pool.state()['last_error']}")
+            print("   Please start Ollama: ollama serve")
     except Exception as e:
         print(f"[WARNING] Could not check Ollama status: {e}")
     
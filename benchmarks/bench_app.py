@@ -0,0 +1,166 @@
+"""Micro-benchmarks for the hot pure functions in app.py.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_app --output bench-1.4.json
+    python -m benchmarks.bench_app --compare bench-1.3.json
+
+Every benchmark runs on the fixed inputs in benchmarks/fixtures.py. The
+results are written as JSON, one entry per benchmark with nanoseconds per
+call, so two runs can be diffed; ``--compare`` prints the ratio against an
+earlier file. Ollama is never called.
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from benchmarks.fixtures import (
+    DISEASE_TEXT, FERTILIZER_JSON, FERTILIZER_TEXT, IMAGE_SIZES, NO_FLORA_TEXT, SOIL_TEXT, jpeg_bytes, leaf_image
+)
+
+SCHEMA_VERSION = 1
+
+
+def load_app():
+    """Import app.py quietly and without starting its background job workers."""
+    os.environ.setdefault('JOB_WORKERS', '0')
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    return app
+
+
+def build_benchmarks(app, image_dir):
+    """Return [(name, params, callable)] for every benchmark."""
+    benchmarks = [
+        ('parse_text_response', {'fixture': 'disease_text'}, lambda: app.parse_text_response(DISEASE_TEXT)),
+        ('parse_text_response', {'fixture': 'no_flora_text'}, lambda: app.parse_text_response(NO_FLORA_TEXT)),
+        ('parse_soil_text_response', {'fixture': 'soil_text'}, lambda: app.parse_soil_text_response(SOIL_TEXT)),
+        ('format_fertilizer_recommendation_html', {'fixture': 'json'},
+         lambda: app.format_fertilizer_recommendation_html(FERTILIZER_JSON, 'rice', 'clay', 40)),
+        ('format_fertilizer_recommendation_html', {'fixture': 'text'},
+         lambda: app.format_fertilizer_recommendation_html(FERTILIZER_TEXT, 'rice', 'clay', 40)),
+        ('format_fertilizer_text_response', {'fixture': 'text'},
+         lambda: app.format_fertilizer_text_response(FERTILIZER_TEXT, 'rice', 'clay', 40)),
+        ('generate_fertilizer_recommendation', {'case': 'treatment_tip'},
+         lambda: app.generate_fertilizer_recommendation('Early Blight', DISEASE_TEXT, 'Apply copper fungicide.')),
+        ('generate_fertilizer_recommendation', {'case': 'fallback'},
+         lambda: app.generate_fertilizer_recommendation('Leaf Rust', DISEASE_TEXT, None)),
+    ]
+
+    for size, width, height in IMAGE_SIZES:
+        data = jpeg_bytes(leaf_image(width, height))
+        path = os.path.join(image_dir, f'{size}.jpg')
+        with open(path, 'wb') as f:
+            f.write(data)
+        params = {'size': size, 'width': width, 'height': height, 'jpeg_bytes': len(data)}
+        benchmarks += [
+            ('highlight_disease_area', dict(params, location='center'),
+             lambda path=path: app.highlight_disease_area(path, 'center', 'Early Blight')),
+            ('highlight_disease_area', dict(params, location='entire leaf'),
+             lambda path=path: app.highlight_disease_area(path, 'entire leaf', 'Early Blight')),
+            ('base64_encode_upload', params, lambda data=data: base64.b64encode(data).decode('utf-8')),
+            ('encode_image_for_ollama', params, lambda data=data: app.encode_image_for_ollama(data)),
+        ]
+    return benchmarks
+
+
+def run_benchmark(fn, repeat, min_time):
+    """Time ``fn``; returns (number, [seconds per call for each repeat])."""
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    return number, [total / number for total in timer.repeat(repeat=repeat, number=number)]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat=5, min_time=0.2, only=None):
+    app = load_app()
+    results = []
+    with tempfile.TemporaryDirectory() as image_dir:
+        for name, params, fn in build_benchmarks(app, image_dir):
+            if only and not any(pattern in name for pattern in only):
+                continue
+            # The functions under test log with print; keep that out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                number, per_call = run_benchmark(fn, repeat, min_time)
+            results.append({
+                'name': name,
+                'params': params,
+                'number': number,
+                'repeat': repeat,
+                'min_ns': round(min(per_call) * 1e9),
+                'median_ns': round(statistics.median(per_call) * 1e9),
+            })
+            print(f"{name} {params}: {min(per_call) * 1e6:.1f} us", file=sys.stderr)
+    return {
+        'schema': SCHEMA_VERSION,
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def result_key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(baseline, current):
+    """Print min-time ratios of ``current`` over ``baseline`` for benchmarks present in both."""
+    before = {result_key(result): result for result in baseline['results']}
+    print(f"{'benchmark':<70}{'before us':>12}{'after us':>12}{'ratio':>8}")
+    for result in current['results']:
+        old = before.get(result_key(result))
+        label = f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+        if old is None:
+            print(f"{label:<70}{'-':>12}{result['min_ns'] / 1000:>12.1f}{'new':>8}")
+            continue
+        print(f"{label:<70}{old['min_ns'] / 1000:>12.1f}{result['min_ns'] / 1000:>12.1f}"
+              f"{result['min_ns'] / old['min_ns']:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the hot pure functions in app.py.')
+    parser.add_argument('--output', help='Write the JSON report here (default: stdout)')
+    parser.add_argument('--compare', help='Earlier JSON report to compare against')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per repeat')
+    parser.add_argument('--only', nargs='*', help='Run only benchmarks whose name contains one of these')
+    args = parser.parse_args(argv)
+
+    report = run(repeat=args.repeat, min_time=args.min_time, only=args.only)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Compare utils.response_parser with the parsers it replaced.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_response_parser
+
+First checks that the new functions return the same results as the frozen
+legacy copies on a fixed corpus, then times both on each fixture.
+"""
+import contextlib
+import io
+import sys
+import timeit
+
+from benchmarks.fixtures import DISEASE_TEXT, FENCED_JSON, NO_FLORA_TEXT, SOIL_TEXT
+from benchmarks.legacy_parsers import legacy_extract_json, parse_soil_text_response as legacy_soil
+from benchmarks.legacy_parsers import parse_text_response as legacy_disease
+from utils.response_parser import find_json_object, parse_soil_text_response, parse_text_response
+
+FIXTURES = {
+    'disease_text': (legacy_disease, parse_text_response, DISEASE_TEXT),
+    'no_flora_text': (legacy_disease, parse_text_response, NO_FLORA_TEXT),
+    'soil_text': (legacy_soil, parse_soil_text_response, SOIL_TEXT),
+    'fenced_json': (legacy_extract_json, find_json_object, FENCED_JSON),
+}
+
+
+def check_equivalence():
+    mismatches = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, (legacy, current, text) in FIXTURES.items():
+            if legacy(text) != current(text):
+                mismatches.append(name)
+    return mismatches
+
+
+def time_call(fn, text, number=2000, repeat=5):
+    with contextlib.redirect_stdout(io.StringIO()):
+        best = min(timeit.repeat(lambda: fn(text), number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+def main():
+    mismatches = check_equivalence()
+    if mismatches:
+        print(f"Results differ from the legacy parsers on: {', '.join(mismatches)}")
+        return 1
+
+    print(f"{'fixture':<16}{'legacy (us)':>14}{'current (us)':>14}{'speedup':>10}")
+    for name, (legacy, current, text) in FIXTURES.items():
+        before = time_call(legacy, text)
+        after = time_call(current, text)
+        print(f"{name:<16}{before:>14.1f}{after:>14.1f}{before / after:>9.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""A stand-in Ollama server for load tests.
+
+Answers /api/tags and /api/generate (plain and streaming) with canned llava
+answers after a latency drawn from a configurable distribution, and fails a
+configurable share of calls with HTTP 500. The task of each call (disease,
+soil or fertilizer) is recognised from its prompt, so every task can have
+its own latency and answers.
+
+    python -m benchmarks.fake_ollama --port 11434 --latency lognormal:3000:0.4 \\
+        --latency fertilizer=normal:1500:300 --failure-rate 0.02
+
+Latency specs (milliseconds):
+  constant:MS  uniform:LOW:HIGH  normal:MEAN:SD  lognormal:MEDIAN:SIGMA  exponential:MEAN
+
+``--responses file.json`` replaces the canned answers; the file maps a task
+name to a list of response strings, one of which is picked per call.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TASKS = ('disease', 'soil', 'fertilizer')
+
+CANNED_RESPONSES = {
+    'disease': [
+        json.dumps({"flora_detected": True, "crop_name": "Tomato", "disease_name": "Early Blight",
+                    "symptoms_detected": ["Brown concentric spots", "Yellowing around lesions"],
+                    "confidence_level": "High", "disease_location": "center",
+                    "treatment_tip": "Remove infected leaves and apply a copper-based fungicide every 7-10 days."}),
+        json.dumps({"flora_detected": True, "crop_name": "Wheat", "disease_name": "Leaf Rust",
+                    "symptoms_detected": ["Orange pustules on leaves"], "confidence_level": "Medium",
+                    "disease_location": "top left",
+                    "treatment_tip": "Spray a triazole fungicide at first sign of pustules."}),
+        json.dumps({"flora_detected": True, "crop_name": "Potato", "disease_name": "Healthy",
+                    "symptoms_detected": [], "confidence_level": "High", "disease_location": "none",
+                    "treatment_tip": "No treatment needed. Keep monitoring your crop regularly."}),
+        # llava sometimes ignores the JSON instruction; exercise the text fallback too
+        "```\nThe image shows a rice leaf with brown spots and yellow halos, which suggests Brown Spot. "
+        "Confidence is moderate. Apply a fungicide such as mancozeb and improve field drainage.\n```",
+        json.dumps({"flora_detected": False, "crop_name": "Unknown", "disease_name": "No Flora Detected",
+                    "symptoms_detected": [], "confidence_level": "High", "disease_location": "none",
+                    "treatment_tip": "Please upload an image containing plants, crops, or vegetation."}),
+    ],
+    'soil': [
+        json.dumps({"soil_detected": True, "soil_type": "Black", "recommended_crops": ["Cotton", "Wheat", "Sugarcane"],
+                    "confidence": 0.88, "description": "Dark clay-rich soil with good moisture retention.",
+                    "crop_recommendations": "Cotton and sugarcane do well; ensure drainage in the monsoon."}),
+        json.dumps({"soil_detected": True, "soil_type": "Red", "recommended_crops": ["Groundnut", "Millets"],
+                    "confidence": 0.81, "description": "Red laterite soil, low in nitrogen.",
+                    "crop_recommendations": "Groundnut and millets with added organic matter."}),
+        "The soil appears sandy and light brown. Suitable crops include watermelon and groundnut.",
+    ],
+    'fertilizer': [
+        json.dumps({"fertilizer_type": "NPK 19:19:19 or DAP + Urea",
+                    "recommendation": "Apply DAP at sowing and top-dress with urea at tillering.",
+                    "application_method": "Apply in 2-3 split doses and water thoroughly.",
+                    "timing": "Before planting, at 30-45 days and at flowering.",
+                    "soil_analysis": "Clay soil retains nutrients well but may need better drainage."}),
+        "Use a balanced NPK fertilizer in split doses and irrigate after each application.",
+    ],
+}
+
+
+def parse_latency(spec):
+    """Turn a latency spec into a function returning one sample in milliseconds."""
+    kind, _, args = spec.partition(':')
+    values = [float(value) for value in args.split(':')] if args else []
+    try:
+        if kind == 'constant':
+            (ms,) = values
+            return lambda rng: ms
+        if kind == 'uniform':
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if kind == 'normal':
+            mean, sd = values
+            return lambda rng: max(0.0, rng.gauss(mean, sd))
+        if kind == 'lognormal':
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(math.log(median), sigma)
+        if kind == 'exponential':
+            (mean,) = values
+            return lambda rng: rng.expovariate(1.0 / mean)
+    except ValueError:
+        raise ValueError(f"Wrong number of parameters in latency spec '{spec}'") from None
+    raise ValueError(f"Unknown latency distribution '{kind}'")
+
+
+def detect_task(payload):
+    if 'soil_detected' in payload.get('system', ''):
+        return 'soil'
+    return 'disease' if payload.get('images') else 'fertilizer'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json(200, {'models': [{'name': name} for name in self.server.fake.models]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path != '/api/generate':
+            return self._send_json(404, {'error': 'not found'})
+        fake = self.server.fake
+        task = detect_task(payload)
+        latency_ms, fail, text = fake.plan(task)
+        if fail:
+            time.sleep(latency_ms / 1000.0)
+            return self._send_json(500, {'error': 'simulated failure'})
+
+        final = {
+            'model': payload.get('model'), 'done': True,
+            'total_duration': int(latency_ms * 1e6), 'load_duration': int(1e6),
+            'prompt_eval_count': 600 + 576 * len(payload.get('images') or []),
+            'prompt_eval_duration': int(latency_ms * 0.2 * 1e6),
+            'eval_count': max(1, len(text) // 4), 'eval_duration': int(latency_ms * 0.8 * 1e6),
+        }
+        if not payload.get('stream'):
+            time.sleep(latency_ms / 1000.0)
+            return self._send_json(200, dict(final, response=text))
+
+        # Stream ~20 chunks spread over the latency; no Content-Length, so close when done
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        step = max(1, len(text) // 20)
+        chunks = [text[i:i + step] for i in range(0, len(text), step)]
+        for chunk in chunks:
+            time.sleep(latency_ms / 1000.0 / len(chunks))
+            self.wfile.write((json.dumps({'response': chunk, 'done': False}) + '\n').encode())
+            self.wfile.flush()
+        self.wfile.write((json.dumps(dict(final, response='')) + '\n').encode())
+
+
+class FakeOllama:
+    """Threaded fake Ollama server; ``start`` serves it in the background."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency='lognormal:3000:0.4', task_latency=None,
+                 failure_rate=0.0, responses=None, models=('llava:latest',), seed=None):
+        self.latency = {task: parse_latency(latency) for task in TASKS}
+        for task, spec in (task_latency or {}).items():
+            self.latency[task] = parse_latency(spec)
+        self.failure_rate = failure_rate
+        self.responses = dict(CANNED_RESPONSES)
+        self.responses.update(responses or {})
+        self.models = list(models)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {task: {'calls': 0, 'failures': 0} for task in TASKS}
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def plan(self, task):
+        """Draw (latency_ms, fail, response_text) for one call."""
+        with self._lock:
+            latency_ms = self.latency[task](self._rng)
+            fail = self._rng.random() < self.failure_rate
+            text = self._rng.choice(self.responses[task])
+            self.counts[task]['calls'] += 1
+            self.counts[task]['failures'] += int(fail)
+        return latency_ms, fail, text
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='fake-ollama', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def add_arguments(parser):
+    """Fake-server options, shared with the load-test CLI."""
+    parser.add_argument('--latency', action='append', default=[],
+                        help="Latency spec for every task, or TASK=SPEC for one task (repeatable)")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of calls answered with HTTP 500')
+    parser.add_argument('--responses', help='JSON file mapping task -> list of canned response strings')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def from_arguments(args, host='127.0.0.1', port=0):
+    latency = 'lognormal:3000:0.4'
+    task_latency = {}
+    for spec in args.latency:
+        task, sep, rest = spec.partition('=')
+        if sep:
+            if task not in TASKS:
+                raise ValueError(f"Unknown task '{task}' in --latency")
+            task_latency[task] = rest
+        else:
+            latency = spec
+    responses = None
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+    return FakeOllama(host, port, latency=latency, task_latency=task_latency,
+                      failure_rate=args.failure_rate, responses=responses, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fake Ollama server for load tests.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    fake = from_arguments(args, args.host, args.port)
+    print(f"Fake Ollama listening on {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
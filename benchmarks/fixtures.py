@@ -0,0 +1,71 @@
+"""Fixed inputs shared by the benchmarks.
+
+Everything here is deterministic so results can be compared between
+releases: the texts are literal and the images are drawn from a seeded
+generator.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+DISEASE_TEXT = (
+    "The image shows a tomato plant with leaves exhibiting brown spots with yellow halos, concentrated "
+    "toward the leaf edges. This is consistent with Early Blight caused by Alternaria solani. Confidence "
+    "is high and I am fairly certain. Treatment: remove infected leaves, apply copper-based fungicide "
+    "every 7-10 days, avoid overhead irrigation. "
+) * 3
+
+NO_FLORA_TEXT = "The image does not contain plants. It shows a concrete wall and a parked car; no crops visible."
+
+SOIL_TEXT = (
+    "This looks like black soil with a high clay content and good moisture retention. It is well suited "
+    "to cotton, wheat and sugarcane. Keep drainage in mind during the monsoon. "
+) * 2
+
+FENCED_JSON = (
+    "```json\n"
+    '{"disease_name": "Leaf Rust", "crop_name": "Wheat", "confidence_level": "High", '
+    '"symptoms_detected": ["orange pustules", "yellowing"], "disease_location": "upper", '
+    '"treatment_tip": "Apply a triazole fungicide.", "flora_detected": true}\n'
+    "```"
+)
+
+FERTILIZER_TEXT = (
+    "For rice grown in clay soil, apply DAP at sowing and top-dress with urea at tillering and panicle "
+    "initiation. Keep fields flooded 5 cm during the vegetative stage and drain a week before harvest. "
+) * 4
+
+FERTILIZER_JSON = {
+    'fertilizer_type': 'NPK 19:19:19 or DAP + Urea',
+    'recommendation': 'Apply NPK 19:19:19 at planting and urea at tillering for rice in clay soil.',
+    'application_method': 'Apply in 2-3 split doses and water thoroughly.',
+    'timing': 'Before planting, at 30-45 days and at flowering.',
+    'soil_analysis': 'Clay soil retains nutrients well but may need better drainage.',
+}
+
+# (name, width, height): a small upload, a typical resized photo and a full phone-camera frame
+IMAGE_SIZES = [
+    ('small', 640, 480),
+    ('medium', 1600, 1200),
+    ('large', 4032, 3024),
+]
+
+
+def leaf_image(width, height, seed=0):
+    """A leaf-coloured image with noise, so JPEG sizes resemble real photos."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        60 + 40 * np.sin(x / 37.0),
+        120 + 50 * np.cos(y / 53.0),
+        40 + 20 * np.sin((x + y) / 71.0),
+    ], axis=-1)
+    noise = rng.normal(0, 18, size=(height, width, 3))
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), 'RGB')
+
+
+def jpeg_bytes(image, quality=90):
+    buf = io.BytesIO()
+    image.save(buf, 'JPEG', quality=quality)
+    return buf.getvalue()
@@ -0,0 +1,265 @@
+"""Frozen copies of the response parsers as they were before utils.response_parser.
+
+Kept only so benchmarks/bench_response_parser.py can check the new module
+against them and time both; nothing in the app imports this file.
+"""
+import json
+import re
+
+
+def legacy_extract_json(response_text):
+    """Fence stripping + json.loads, as previously repeated in each analyzer."""
+    if '```json' in response_text:
+        json_start = response_text.find('```json') + 7
+        json_end = response_text.find('```', json_start)
+        response_text = response_text[json_start:json_end].strip()
+    elif '```' in response_text:
+        json_start = response_text.find('```') + 3
+        json_end = response_text.find('```', json_start)
+        response_text = response_text[json_start:json_end].strip()
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        return None
+
+
+def parse_text_response(text):
+    """Parse text response when JSON parsing fails - Enhanced for accuracy."""
+    text_lower = text.lower()
+    
+    # Enhanced disease/plant indicators - more comprehensive
+    has_disease_indicators = any(keyword in text_lower for keyword in [
+        "disease", "blight", "rust", "spot", "mildew", "fungal", "symptom", 
+        "healthy", "leaf", "plant", "crop", "vegetation", "tomato", "potato", 
+        "apple", "corn", "pepper", "grape", "cherry", "rice", "wheat", "maize",
+        "banana", "mango", "orange", "pomegranate", "coconut", "cotton", "sugarcane",
+        "anthracnose", "bacterial", "virus", "infection", "lesion", "discoloration",
+        "yellowing", "wilting", "rotting", "blister", "canker"
+    ])
+    
+    # More specific "no flora" detection - must be explicit
+    explicit_no_flora = any(phrase in text_lower for phrase in [
+        "no flora detected", "no plant detected", "no crop detected", 
+        "no vegetation detected", "does not contain flora", "does not contain plants",
+        "no flora found", "no plants found", "no crops found",
+        "image does not show", "no plants visible", "no crops visible"
+    ])
+    
+    # Only return "no flora" if explicitly stated AND no disease/plant indicators
+    # This prevents false positives when disease is mentioned
+    if explicit_no_flora and not has_disease_indicators:
+        return {
+            'label': 'No Flora Detected',
+            'score': 1.0,
+            'crop_name': 'No Flora',
+            'disease_name': 'No Flora Detected',
+            'description': 'No flora (plants, crops, or vegetation) detected in this image.',
+            'treatment_tip': 'Please upload an image containing plants, crops, or vegetation for analysis.',
+            'disease_location': 'none',
+            'symptoms_detected': [],
+            'confidence_level': 'High',
+            'no_flora': True
+        }
+    
+    # Enhanced extraction logic for better accuracy
+    crop_name = "Unknown"
+    disease_name = "Unknown"
+    confidence = 0.75
+    
+    # Extract disease name with more specificity
+    if "healthy" in text_lower and ("plant" in text_lower or "crop" in text_lower or "leaf" in text_lower):
+        disease_name = "Healthy"
+    elif "early blight" in text_lower:
+        disease_name = "Early Blight"
+    elif "late blight" in text_lower:
+        disease_name = "Late Blight"
+    elif "leaf spot" in text_lower or "bacterial spot" in text_lower:
+        disease_name = "Leaf Spot"
+    elif "powdery mildew" in text_lower:
+        disease_name = "Powdery Mildew"
+    elif "downy mildew" in text_lower:
+        disease_name = "Downy Mildew"
+    elif "rust" in text_lower:
+        disease_name = "Rust"
+    elif "anthracnose" in text_lower:
+        disease_name = "Anthracnose"
+    elif "blight" in text_lower:
+        disease_name = "Blight"
+    elif "spot" in text_lower:
+        disease_name = "Leaf Spot"
+    elif "mildew" in text_lower:
+        disease_name = "Mildew"
+    elif "disease" in text_lower:
+        disease_name = "Disease Detected"
+    
+    # Enhanced crop name extraction with priority and word boundary matching
+    import re
+    
+    # Priority order: Check distinctive crops first (cereals/grains have unique characteristics)
+    crops_priority = [
+        # Cereals/Grains (check first - they have distinctive long, narrow leaves)
+        ("wheat", "Wheat"),
+        ("rice", "Rice"),
+        ("corn", "Corn"),
+        ("maize", "Maize"),
+        ("sugarcane", "Sugarcane"),
+        # Vegetables with distinctive leaves
+        ("potato", "Potato"),
+        ("tomato", "Tomato"),
+        ("pepper", "Pepper"),
+        ("cucumber", "Cucumber"),
+        ("pumpkin", "Pumpkin"),
+        ("watermelon", "Watermelon"),
+        ("muskmelon", "Muskmelon"),
+        # Fruits
+        ("banana", "Banana"),
+        ("coconut", "Coconut"),
+        ("mango", "Mango"),
+        ("apple", "Apple"),
+        ("grape", "Grape"),
+        ("cherry", "Cherry"),
+        ("orange", "Orange"),
+        ("pomegranate", "Pomegranate"),
+        # Other crops
+        ("cotton", "Cotton"),
+        ("chickpea", "Chickpea"),
+        ("kidneybeans", "Kidneybeans"),
+        ("pigeonpeas", "Pigeonpeas"),
+        ("mothbeans", "Mothbeans"),
+        ("mungbean", "Mungbean"),
+        ("blackgram", "Blackgram"),
+        ("lentil", "Lentil")
+    ]
+    
+    # Use word boundaries to find exact crop matches (prevents partial matches)
+    for crop_key, crop_value in crops_priority:
+        # Check for word boundary match (exact word, not part of another word)
+        pattern = r'\b' + re.escape(crop_key) + r'\b'
+        if re.search(pattern, text_lower):
+            crop_name = crop_value
+            print(f"Extracted crop from text: {crop_name}")
+            break
+    
+    # Enhanced symptom extraction
+    symptoms = []
+    symptom_patterns = {
+        "black spots": "Black spots",
+        "brown spots": "Brown spots",
+        "yellow spots": "Yellow spots",
+        "circular spots": "Circular spots",
+        "yellowing": "Yellowing",
+        "wilting": "Wilting",
+        "powdery": "Powdery growth",
+        "fuzzy": "Fuzzy growth",
+        "holes": "Holes in leaves",
+        "discoloration": "Discoloration",
+        "lesions": "Lesions",
+        "blisters": "Blisters",
+        "rotting": "Rotting"
+    }
+    for pattern, symptom_name in symptom_patterns.items():
+        if pattern in text_lower:
+            symptoms.append(symptom_name)
+    
+    # If no specific symptoms found but disease mentioned, add generic
+    if not symptoms and disease_name.lower() != "healthy" and disease_name.lower() != "unknown":
+        symptoms.append("Disease symptoms detected")
+    
+    # Enhanced confidence level determination
+    confidence_level = 'Medium'
+    if "high confidence" in text_lower or ("high" in text_lower and "certain" in text_lower):
+        confidence_level = 'High'
+    elif "low confidence" in text_lower or ("uncertain" in text_lower or "unclear" in text_lower):
+        confidence_level = 'Low'
+    elif "healthy" in text_lower:
+        confidence_level = 'High'
+    elif disease_name.lower() == "unknown":
+        confidence_level = 'Low'
+    
+    # Extract disease location if mentioned
+    disease_location = 'center'
+    if "top" in text_lower and "left" in text_lower:
+        disease_location = "top-left"
+    elif "top" in text_lower and "right" in text_lower:
+        disease_location = "top-right"
+    elif "bottom" in text_lower and "left" in text_lower:
+        disease_location = "bottom-left"
+    elif "bottom" in text_lower and "right" in text_lower:
+        disease_location = "bottom-right"
+    elif "entire" in text_lower or "whole" in text_lower:
+        disease_location = "entire leaf"
+    elif "edge" in text_lower or "edges" in text_lower:
+        disease_location = "leaf edges"
+    elif "center" in text_lower or "middle" in text_lower:
+        disease_location = "center"
+    
+    # Format description
+    if symptoms:
+        description = f"Symptoms: {', '.join(symptoms)}"
+    elif disease_name.lower() == "healthy":
+        description = "The plant appears healthy with no visible disease symptoms."
+    else:
+        description = f"Disease detected: {disease_name}"
+    
+    disease_label = f"{crop_name} - {disease_name}" if crop_name != "Unknown" else disease_name
+    
+    return {
+        'label': disease_label,
+        'score': confidence,
+        'crop_name': crop_name,
+        'disease_name': disease_name,
+        'description': description,
+        'treatment_tip': 'Please consult with an agricultural expert for specific treatment recommendations. Consider organic treatments and proper crop management practices.',
+        'disease_location': disease_location,
+        'symptoms_detected': symptoms if symptoms else [],
+        'confidence_level': confidence_level,
+        'no_flora': False  # If we got here, flora is present
+    }
+
+
+def parse_soil_text_response(text):
+    """Parse text response when JSON parsing fails."""
+    text_lower = text.lower()
+    
+    # Check if no soil is detected
+    no_soil_keywords = ["no soil", "no dirt", "not soil", "not a soil", "does not contain soil", 
+                        "no soil detected", "not soil image", "doesn't contain soil"]
+    if any(keyword in text_lower for keyword in no_soil_keywords):
+        return {
+            'soil_type': 'No Soil Detected',
+            'recommended_crops': [],
+            'confidence': 1.0,
+            'description': 'No soil detected in this image. Please upload an image containing soil samples, dirt, or agricultural soil.',
+            'crop_recommendations': 'Please upload a clear image of soil for analysis.',
+            'no_soil': True
+        }
+    
+    # Try extract information from text
+    soil_type = "Unknown"
+    recommended_crops = []
+    
+    # Simple extraction logic
+    if "alluvial" in text_lower:
+        soil_type = "Alluvial"
+        recommended_crops = ["Rice", "Wheat", "Sugarcane", "Maize", "Cotton", "Soyabean", "Jute"]
+    elif "black" in text_lower:
+        soil_type = "Black"
+        recommended_crops = ["Virginia", "Wheat", "Jowar", "Millets", "Linseed", "Castor", "Sunflower"]
+    elif "clay" in text_lower:
+        soil_type = "Clay"
+        recommended_crops = ["Rice", "Lettuce", "Chard", "Broccoli", "Cabbage", "Snap Beans"]
+    elif "red" in text_lower:
+        soil_type = "Red"
+        recommended_crops = ["Cotton", "Wheat", "Pulses", "Millets", "Oil Seeds", "Potatoes"]
+    else:
+        soil_type = "Unknown"
+        recommended_crops = []
+    
+    return {
+        'soil_type': soil_type,
+        'recommended_crops': recommended_crops,
+        'confidence': 0.75,
+        'description': text[:200] if len(text) > 200 else text,
+        'crop_recommendations': f"Based on {soil_type} soil, recommended crops: {', '.join(recommended_crops) if recommended_crops else 'Please consult an agricultural expert.'}",
+        'no_soil': False
+    }
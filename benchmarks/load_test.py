@@ -0,0 +1,308 @@
+"""End-to-end load test of the Flask app against a fake Ollama server.
+
+Starts benchmarks.fake_ollama and the app (``python app.py`` by default, or
+any ``--server-cmd`` such as gunicorn), replays a traffic mix across the
+analysis routes and reports throughput, latency percentiles and error rate
+per route:
+
+    python -m benchmarks.load_test --duration 60 --rate 3 --burst 20:40 --burst 45:40 \\
+        --mix disease=4,predict=3,soil=2,fertilizer=1 --latency lognormal:2500:0.5 --failure-rate 0.02
+
+Arrivals are open-loop: requests are sent on a Poisson schedule at
+``--rate`` per second plus each ``--burst AT:COUNT`` (COUNT requests at
+second AT), whether or not earlier ones have finished. Latency is measured
+from each request's scheduled time, so time spent waiting for a free client
+thread counts. A request is an error when it fails, returns HTTP 4xx/5xx,
+or the page reports a failed analysis.
+
+Use ``--app-url`` to load an app that is already running (it must then be
+configured with OLLAMA_API_URL pointing at a fake or real Ollama).
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import ImageDraw
+
+from benchmarks import fake_ollama
+from benchmarks.fixtures import leaf_image
+
+# route name -> (path, upload field or None for the fertilizer form)
+ROUTES = {
+    'disease': ('/disease-predict', 'file'),
+    'predict': ('/predict', 'file'),
+    'soil': ('/soil-predict', 'soil_image'),
+    'fertilizer': ('/fertilizer-predict', None),
+}
+
+# Text the result pages show when an analysis failed even though the status is 200
+FAILURE_MARKERS = ('Error - ', 'Error Soil', 'An error occurred', 'Analysis Temporarily Unavailable',
+                   'Ollama Connection Failed', 'Analysis Failed', 'Ollama API returned error',
+                   'Error getting recommendation', 'Could not generate recommendation')
+
+CROPS = ['rice', 'wheat', 'cotton', 'maize', 'tomato', 'potato', 'sugarcane', 'onion']
+SOILS = ['Black', 'Red', 'Clay', 'Sandy', 'Loamy', 'Alluvial']
+
+
+def make_images(count, seed=0, size=(800, 600)):
+    """Distinct JPEGs (different layouts, not just noise) so caches only hit on real repeats."""
+    rng = random.Random(seed)
+    base = leaf_image(*size, seed=seed)
+    images = []
+    for _ in range(count):
+        image = base.copy()
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            r = rng.randrange(20, 160)
+            color = (rng.randrange(40, 200), rng.randrange(60, 220), rng.randrange(0, 90))
+            draw.ellipse([x - r, y - r, x + r, y + r], fill=color)
+        buf = io.BytesIO()
+        image.save(buf, 'JPEG', quality=85)
+        images.append(buf.getvalue())
+    return images
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        route, _, weight = part.partition('=')
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route '{route}' in --mix (choose from {', '.join(ROUTES)})")
+        mix[route] = float(weight or 1)
+    return mix
+
+
+def build_schedule(duration, rate, bursts, mix, seed=0):
+    """Sorted [(seconds_from_start, route)] for the whole run."""
+    rng = random.Random(seed)
+    routes, weights = list(mix), list(mix.values())
+    times = []
+    t = rng.expovariate(rate) if rate > 0 else duration
+    while t < duration:
+        times.append(t)
+        t += rng.expovariate(rate)
+    for at, count in bursts:
+        times.extend([at] * count)
+    return sorted((t, rng.choices(routes, weights)[0]) for t in times)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class LoadRunner:
+    def __init__(self, app_url, images, concurrency, timeout, seed=0):
+        self.app_url = app_url.rstrip('/')
+        self.images = images
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load')
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.samples = []
+
+    def session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def request_args(self, route):
+        path, field = ROUTES[route]
+        with self.lock:
+            if field is None:
+                return path, {'data': {'cropname': self.rng.choice(CROPS), 'soil_type': self.rng.choice(SOILS),
+                                       'water_availability': str(self.rng.randrange(10, 95))}}
+            index = self.rng.randrange(len(self.images))
+        return path, {'files': {field: (f'load_{index}.jpg', self.images[index], 'image/jpeg')}}
+
+    def send(self, route, scheduled):
+        path, kwargs = self.request_args(route)
+        status, error = None, None
+        try:
+            # The fertilizer form redirects back to itself with a flashed message when it fails
+            response = self.session().post(self.app_url + path, timeout=self.timeout, allow_redirects=False,
+                                           **kwargs)
+            status = response.status_code
+            if status >= 400:
+                error = f'HTTP {status}'
+            elif 300 <= status < 400:
+                error = 'redirected'
+            elif route == 'predict':
+                if response.json().get('crop_name') == 'Error':
+                    error = 'analysis failed'
+            elif any(marker in response.text for marker in FAILURE_MARKERS):
+                error = 'analysis failed'
+        except requests.exceptions.RequestException as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+        with self.lock:
+            self.samples.append({'route': route, 'latency_ms': (finished - scheduled) * 1000.0,
+                                 'finished': finished, 'status': status, 'error': error})
+
+    def run(self, schedule):
+        started = time.perf_counter()
+        futures = []
+        for at, route in schedule:
+            delay = started + at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(self.executor.submit(self.send, route, started + at))
+        for future in futures:
+            future.result()
+        self.executor.shutdown()
+        return started
+
+
+def summarize(samples, started):
+    """Per-route (and overall) throughput, latency percentiles and error rate."""
+    report = {}
+    groups = {'all': samples}
+    for sample in samples:
+        groups.setdefault(sample['route'], []).append(sample)
+    for route, group in groups.items():
+        ok = [sample['latency_ms'] for sample in group if not sample['error']]
+        latencies = [sample['latency_ms'] for sample in group]
+        elapsed = max(sample['finished'] for sample in group) - started
+        errors = {}
+        for sample in group:
+            if sample['error']:
+                errors[sample['error']] = errors.get(sample['error'], 0) + 1
+        report[route] = {
+            'requests': len(group),
+            'errors': len(group) - len(ok),
+            'error_rate': round((len(group) - len(ok)) / len(group), 4),
+            'throughput_rps': round(len(ok) / elapsed, 3) if elapsed > 0 else None,
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'max_ms': round(max(latencies), 1),
+            'error_kinds': errors,
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{'route':<12}{'reqs':>7}{'err %':>8}{'ok/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for route, row in sorted(report.items(), key=lambda item: item[0] == 'all'):
+        print(f"{route:<12}{row['requests']:>7}{row['error_rate'] * 100:>7.1f}%{row['throughput_rps'] or 0:>8.2f}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(server_cmd, port, ollama_url, workdir, log_path):
+    """Launch the app with its state files in ``workdir``; returns the process."""
+    env = dict(os.environ)
+    env.update({
+        'OLLAMA_API_URL': ollama_url,
+        'OLLAMA_API_URLS': ollama_url,
+        'PORT': str(port),
+        'FLASK_HOST': '127.0.0.1',
+        'FLASK_DEBUG': 'False',
+        'RESULT_CACHE_DB': os.path.join(workdir, 'result_cache.db'),
+        'PHASH_DB': os.path.join(workdir, 'phash_index.db'),
+        'JOB_QUEUE_DB': os.path.join(workdir, 'jobs.db'),
+        'SINGLE_FLIGHT_DB': os.path.join(workdir, 'single_flight.db'),
+    })
+    command = shlex.split(server_cmd.format(port=port, python=sys.executable))
+    log = open(log_path, 'w')
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(app_url, process=None, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode} before becoming ready")
+        try:
+            if requests.get(app_url + '/healthz', timeout=2).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"App at {app_url} did not become ready within {timeout}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the app against a fake Ollama server.')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds of steady traffic')
+    parser.add_argument('--rate', type=float, default=2.0, help='Average requests per second (Poisson)')
+    parser.add_argument('--burst', action='append', default=[], metavar='AT:COUNT',
+                        help='Send COUNT extra requests at once, AT seconds in (repeatable)')
+    parser.add_argument('--mix', default='disease=4,predict=3,soil=2,fertilizer=1',
+                        help='Route weights, e.g. disease=4,predict=3,soil=2,fertilizer=1')
+    parser.add_argument('--images', type=int, default=200, help='Distinct images to upload (fewer = more cache hits)')
+    parser.add_argument('--concurrency', type=int, default=64, help='Client threads')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Per-request client timeout in seconds')
+    parser.add_argument('--app-url', help='Load an already running app instead of starting one')
+    parser.add_argument('--server-cmd', default='{python} app.py',
+                        help="Command that starts the app; {port} and {python} are filled in, "
+                             "e.g. 'gunicorn -w 4 --threads 8 -b 127.0.0.1:{port} app:app'")
+    parser.add_argument('--output', help='Write the JSON report here')
+    fake_ollama.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    bursts = [tuple(int(float(value)) if i else float(value) for i, value in enumerate(spec.split(':')))
+              for spec in args.burst]
+    schedule = build_schedule(args.duration, args.rate, bursts, mix, seed=args.seed or 0)
+    images = make_images(args.images, seed=args.seed or 0)
+
+    fake = process = None
+    workdir = tempfile.mkdtemp(prefix='agrolens-load-')
+    try:
+        app_url = args.app_url
+        if not app_url:
+            fake = fake_ollama.from_arguments(args).start()
+            port = free_port()
+            app_url = f"http://127.0.0.1:{port}"
+            log_path = os.path.join(workdir, 'app.log')
+            process = start_app(args.server_cmd, port, fake.url, workdir, log_path)
+            print(f"Fake Ollama on {fake.url}; app on {app_url} (log: {log_path})")
+        wait_ready(app_url, process)
+
+        print(f"Sending {len(schedule)} requests over {args.duration:.0f}s "
+              f"({args.rate}/s{', bursts ' + ', '.join(args.burst) if args.burst else ''})")
+        runner = LoadRunner(app_url, images, args.concurrency, args.timeout, seed=args.seed or 0)
+        started = runner.run(schedule)
+        report = summarize(runner.samples, started)
+        print_report(report)
+        if fake is not None:
+            print('Fake Ollama calls:', json.dumps(fake.counts))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'config': vars(args), 'routes': report,
+                           'ollama_calls': fake.counts if fake else None}, f, indent=2)
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if fake is not None:
+            fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""Classify a directory of field images offline, without going through Flask.
+
+    python bulk_scan.py /data/field-images --task disease --output scans/visit.csv
+    python bulk_scan.py /data/soil --task soil --output scans/soil.parquet --workers 8
+
+Images are analysed by a pool of worker processes, each running the same
+analyzers as the web app (local ResNet9 first for disease, then Ollama, with
+the shared result cache). Rows are written to the report as they finish:
+CSV rows are appended, Parquet rows are written as numbered part files in a
+directory that pandas/pyarrow read as one table.
+
+Every image whose row has been flushed is listed in a checkpoint file
+(``<output>.checkpoint`` by default). Rerunning the same command skips
+those images, so an interrupted scan resumes where it stopped. Images whose
+analysis failed are reported but not checkpointed, so a rerun retries them;
+after a hard crash a handful of rows may appear twice in the report.
+"""
+import argparse
+import concurrent.futures
+import csv
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+COLUMNS = {
+    'disease': ['path', 'crop_name', 'disease_name', 'confidence_level', 'score', 'disease_location',
+                'no_flora', 'tier', 'error', 'elapsed_ms'],
+    'soil': ['path', 'soil_type', 'recommended_crops', 'confidence', 'no_soil', 'error', 'elapsed_ms'],
+}
+
+# Set in each worker process by init_worker
+_app = None
+_quiet = True
+
+
+def init_worker(quiet):
+    """Import the app once per worker process."""
+    global _app, _quiet
+    # The CLI must not run the web app's background job workers
+    os.environ['JOB_WORKERS'] = '0'
+    _quiet = quiet
+    with redirect_stdout(io.StringIO() if quiet else sys.stdout):
+        import app
+    _app = app
+
+
+def scan_image(root, relative_path, task, lang):
+    """Analyse one image and return its report row."""
+    path = os.path.join(root, relative_path)
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO() if _quiet else sys.stdout):
+        try:
+            if task == 'disease':
+                result = _app.predict_crop_disease_tiered(path, lang=lang)
+            else:
+                result = _app.ollama_analyze_soil_and_recommend_crops(path, lang=lang)
+            error = None
+        except Exception as e:
+            result, error = {}, str(e)
+
+    row = {'path': relative_path, 'elapsed_ms': round((time.perf_counter() - started) * 1000.0, 1)}
+    if task == 'disease':
+        if result.get('crop_name') == 'Error':
+            error = result.get('description') or result.get('disease_name')
+        for key in ('crop_name', 'disease_name', 'confidence_level', 'score', 'disease_location', 'tier'):
+            row[key] = result.get(key)
+        row['no_flora'] = bool(result.get('no_flora', False))
+    else:
+        if result.get('soil_type') == 'Error':
+            error = result.get('description')
+        row['soil_type'] = result.get('soil_type')
+        row['recommended_crops'] = '; '.join(result.get('recommended_crops') or [])
+        row['confidence'] = result.get('confidence')
+        row['no_soil'] = bool(result.get('no_soil', False))
+    row['error'] = error
+    return row
+
+
+def find_images(root):
+    """Relative paths of every image under ``root``, sorted for a stable order."""
+    images = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(os.path.relpath(os.path.join(directory, name), root))
+    images.sort()
+    return images
+
+
+class Checkpoint:
+    """Append-only list of images already written to the report."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.done = {line.rstrip('\n') for line in f if line.strip()}
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def add(self, paths):
+        for path in paths:
+            self._file.write(path + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.update(paths)
+
+    def close(self):
+        self._file.close()
+
+
+class CsvReport:
+    def __init__(self, path, columns):
+        self.columns = columns
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction='ignore')
+        if new:
+            self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetReport:
+    """Each flush becomes one part file in the ``path`` directory."""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        os.makedirs(path, exist_ok=True)
+        self._part = len([name for name in os.listdir(path) if name.endswith('.parquet')])
+
+    def write(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist([{column: row.get(column) for column in self.columns} for row in rows])
+        part_path = os.path.join(self.path, f"part-{self._part:05d}.parquet")
+        pq.write_table(table, part_path + '.tmp')
+        os.replace(part_path + '.tmp', part_path)
+        self._part += 1
+
+    def close(self):
+        pass
+
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def run(args):
+    images = find_images(args.directory)
+    checkpoint = Checkpoint(args.checkpoint or args.output + '.checkpoint')
+    pending = [path for path in images if path not in checkpoint.done]
+    print(f"[SCAN] {len(images)} image(s) found, {len(images) - len(pending)} already done, "
+          f"{len(pending)} to scan with {args.workers} worker(s)")
+    if not pending:
+        checkpoint.close()
+        return 0
+
+    report_cls = ParquetReport if args.output.endswith('.parquet') else CsvReport
+    report = report_cls(args.output, COLUMNS[args.task])
+    buffer = []
+    scanned = failed = 0
+    started = last_progress = last_flush = time.monotonic()
+
+    def flush():
+        nonlocal last_flush
+        last_flush = time.monotonic()
+        if not buffer:
+            return
+        report.write(buffer)
+        checkpoint.add([row['path'] for row in buffer if not row['error']])
+        buffer.clear()
+
+    queue = iter(pending)
+    # Keep a bounded number of images in flight instead of submitting every path at once
+    window = args.workers * 4
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                                initargs=(not args.verbose,)) as executor:
+        in_flight = set()
+        try:
+            while True:
+                while len(in_flight) < window:
+                    path = next(queue, None)
+                    if path is None:
+                        break
+                    in_flight.add(executor.submit(scan_image, args.directory, path, args.task, args.lang))
+                if not in_flight:
+                    break
+                finished, in_flight = concurrent.futures.wait(in_flight, timeout=args.progress_interval,
+                                                             return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    row = future.result()
+                    scanned += 1
+                    failed += bool(row['error'])
+                    buffer.append(row)
+                now = time.monotonic()
+                if len(buffer) >= args.flush_every or now - last_flush >= args.flush_seconds:
+                    flush()
+
+                if now - last_progress >= args.progress_interval:
+                    last_progress = now
+                    rate = scanned / (now - started)
+                    eta = format_eta((len(pending) - scanned) / rate) if rate else 'unknown'
+                    print(f"[SCAN] {scanned}/{len(pending)} ({scanned / len(pending):.1%}) "
+                          f"{rate:.2f} img/s, {failed} failed, ETA {eta}")
+        finally:
+            # Keep whatever finished before an interrupt
+            flush()
+            for future in in_flight:
+                future.cancel()
+            report.close()
+            checkpoint.close()
+
+    elapsed = time.monotonic() - started
+    print(f"[SCAN] Done: {scanned} image(s) in {format_eta(elapsed)} "
+          f"({scanned / elapsed:.2f} img/s), {failed} failed -> {args.output}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Classify a directory of field images offline.')
+    parser.add_argument('directory', help='Folder to scan (recursively) for png/jpg/jpeg images')
+    parser.add_argument('--task', choices=('disease', 'soil'), default='disease')
+    parser.add_argument('--output', required=True, help='Report path; .csv or .parquet')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: <output>.checkpoint)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Worker processes')
+    parser.add_argument('--lang', choices=('en', 'kn'), default='en')
+    parser.add_argument('--flush-every', type=int, default=50, help='Rows per report write and checkpoint')
+    parser.add_argument('--flush-seconds', type=float, default=30.0, help='Write buffered rows at least this often')
+    parser.add_argument('--progress-interval', type=float, default=10.0, help='Seconds between progress lines')
+    parser.add_argument('--verbose', action='store_true', help="Show the analyzers' own log output")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+    if args.output.endswith('.parquet'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error('Parquet output needs pyarrow; install it or write a .csv report')
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
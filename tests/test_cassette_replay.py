@@ -0,0 +1,154 @@
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from utils.cassette import Cassette, CassetteMiss
+from utils.circuit_breaker import CLOSED
+from utils.ollama_pool import OllamaPool
+
+ANSWER = json.dumps({"flora_detected": True, "crop_name": "Tomato", "disease_name": "Early Blight",
+                     "symptoms_detected": ["Brown concentric spots"], "confidence_level": "High",
+                     "disease_location": "center", "treatment_tip": "Apply a copper-based fungicide."})
+FINAL_FIELDS = {'done': True, 'model': 'llava:latest', 'prompt_eval_count': 1176, 'eval_count': 60,
+                'prompt_eval_duration': 200000000, 'eval_duration': 1500000000, 'load_duration': 1000000}
+
+app = None
+workdir = None
+
+
+def entry(method, path, task, **fields):
+    return dict({'key': f"{method} {path} {task}", 'method': method, 'path': path, 'task': task, 'request': {},
+                 'status': 200, 'headers': {'Content-Type': 'application/json'},
+                 'timing': {'response_ms': 5.0, 'total_ms': 50.0}, 'recorded_at': 0}, **fields)
+
+
+def streamed_answer():
+    step = len(ANSWER) // 8 + 1
+    lines = [json.dumps({'model': 'llava:latest', 'response': ANSWER[i:i + step], 'done': False})
+             for i in range(0, len(ANSWER), step)]
+    lines.append(json.dumps(dict(FINAL_FIELDS, response='')))
+    return [[10.0 * i, line] for i, line in enumerate(lines)]
+
+
+def write_cassette(path):
+    entries = [
+        entry('GET', '/api/tags', 'tags', body=json.dumps({'models': [{'name': 'llava:latest'}]})),
+        # Recorded from the streaming page, so /predict has to be answered from the chunks
+        entry('POST', '/api/generate', 'disease', headers={'Content-Type': 'application/x-ndjson'},
+              chunks=streamed_answer()),
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in entries:
+            f.write(json.dumps(item) + '\n')
+
+
+def noise_image(seed):
+    buf = io.BytesIO()
+    pixels = np.random.RandomState(seed).randint(0, 255, (64, 64, 3), dtype=np.uint8)
+    Image.fromarray(pixels).resize((320, 240)).save(buf, 'JPEG')
+    return buf.getvalue()
+
+
+def setUpModule():
+    global app, workdir
+    workdir = tempfile.mkdtemp()
+    cassette_path = os.path.join(workdir, 'ollama.cassette.jsonl')
+    write_cassette(cassette_path)
+    os.environ.update({
+        'OLLAMA_CASSETTE': cassette_path,
+        'OLLAMA_CASSETTE_MODE': 'replay',
+        'OLLAMA_CASSETTE_LATENCY_SCALE': '0',
+        'LOCAL_CLASSIFIER_ENABLED': 'False',
+        'OLLAMA_TOKEN_LOG': '',
+        'RESULT_CACHE_DB': os.path.join(workdir, 'result_cache.db'),
+        'PHASH_DB': os.path.join(workdir, 'phash_index.db'),
+        'JOB_QUEUE_DB': os.path.join(workdir, 'jobs.db'),
+        'RESULT_IMAGE_FOLDER': os.path.join(workdir, 'results'),
+        'PROFILE_FOLDER': os.path.join(workdir, 'profiles'),
+    })
+    app = importlib.import_module('app')
+    app.app.config['UPLOAD_FOLDER'] = workdir
+
+
+class CassetteTest(unittest.TestCase):
+
+    def test_streamed_recording_replayed_as_one_body(self):
+        cassette = Cassette(app.OLLAMA_CASSETTE, latency_scale=0)
+        response = cassette.replay('POST', '/api/generate', 'disease', {'prompt': 'unseen', 'stream': False})
+        body = response.json()
+        self.assertEqual(body['response'], ANSWER)
+        self.assertEqual(body['eval_count'], FINAL_FIELDS['eval_count'])
+        self.assertTrue(body['done'])
+        self.assertEqual(cassette.stats()['fallbacks'], 1)
+
+    def test_fallback_prefers_same_mode(self):
+        cassette = Cassette(app.OLLAMA_CASSETTE, latency_scale=0)
+        plain_body = json.dumps(dict(FINAL_FIELDS, response='plain'))
+        cassette._index(entry('POST', '/api/generate', 'disease', body=plain_body))
+        plain = cassette.replay('POST', '/api/generate', 'disease', {'prompt': 'unseen', 'stream': False})
+        self.assertEqual(plain.json()['response'], 'plain')
+        streamed = cassette.replay('POST', '/api/generate', 'disease', {'prompt': 'unseen', 'stream': True},
+                                   stream=True)
+        self.assertEqual(len(list(streamed.iter_lines())), len(streamed_answer()))
+
+    def test_misses_do_not_trip_the_breaker(self):
+        cassette = Cassette(app.OLLAMA_CASSETTE, latency_scale=0)
+        pool = OllamaPool(['http://ollama.test:11434'], cassette=cassette)
+        backend = pool.backends[0]
+        self.assertTrue(pool.refresh())
+
+        for _ in range(backend.breaker.min_calls * 2):
+            with self.assertRaises(CassetteMiss):
+                pool.generate({'model': 'llava:latest', 'prompt': 'soil'}, task='soil')
+        self.assertEqual(backend.breaker.state, CLOSED)
+        self.assertTrue(backend.healthy())
+        self.assertEqual(backend.in_flight, 0)
+
+        response = pool.generate({'model': 'llava:latest', 'prompt': 'leaf'}, task='disease')
+        self.assertEqual(response.json()['response'], ANSWER)
+        self.assertEqual(cassette.stats()['misses'], backend.breaker.min_calls * 2)
+
+
+class ReplayThroughAppTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def predict(self, image):
+        return self.client.post('/predict', data={'file': (io.BytesIO(image), 'leaf.jpg')},
+                                content_type='multipart/form-data')
+
+    def test_predict_parses_caches_and_reuses_replayed_answer(self):
+        image = noise_image(1)
+        response = self.predict(image)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['crop_name'], 'Tomato')
+        self.assertEqual(response.json['disease_name'], 'Early Blight')
+        self.assertEqual(response.json['tier'], 'ollama')
+
+        replayed = app.ollama_cassette.stats()['replayed']
+        again = self.predict(image)
+        self.assertEqual(again.json['disease_name'], 'Early Blight')
+        self.assertEqual(app.ollama_cassette.stats()['replayed'], replayed, "second call should come from the cache")
+
+    def test_stream_route_replays_chunks(self):
+        page = self.client.post('/disease-predict/stream', data={'file': (io.BytesIO(noise_image(2)), 'leaf.jpg')},
+                                content_type='multipart/form-data')
+        url = re.search(r'new EventSource\("([^"]+)"\)', page.get_data(as_text=True)).group(1)
+        body = self.client.get(url).get_data(as_text=True)
+        events = re.findall(r'^event: (\w+)$', body, re.M)
+        self.assertIn('field', events)
+        self.assertEqual(events[-1], 'result')
+        result = json.loads(re.findall(r'^data: (.*)$', body, re.M)[-1])
+        self.assertEqual(result['prediction']['disease_name'], 'Early Blight')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import time
+import unittest
+
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def make_breaker(self, **options):
+        settings = {'failure_rate_threshold': 0.5, 'window': 4, 'min_calls': 4, 'open_seconds': 0.05}
+        settings.update(options)
+        return CircuitBreaker('http://ollama.test', **settings)
+
+    def record_failures(self, breaker, times):
+        for _ in range(times):
+            self.assertTrue(breaker.allow())
+            breaker.record(False)
+
+    def test_closed_open_half_open_closed(self):
+        breaker = self.make_breaker()
+        self.assertEqual(breaker.state, CLOSED)
+
+        breaker.record(True)
+        self.record_failures(breaker, 1)
+        self.assertEqual(breaker.state, CLOSED, "opened before min_calls outcomes were recorded")
+        self.record_failures(breaker, 2)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow(), "let more than half_open_calls trials through")
+        breaker.record(True)
+        self.assertEqual(breaker.state, CLOSED)
+
+        stats = breaker.stats()
+        self.assertEqual(stats['transitions'], {'closed->open': 1, 'open->half_open': 1, 'half_open->closed': 1})
+        self.assertEqual(stats['state_changes'], 3)
+        self.assertEqual(stats['rejected'], 2)
+        self.assertEqual(stats['window_calls'], 0, "closing should start a fresh window")
+
+    def test_failed_trial_reopens(self):
+        breaker = self.make_breaker()
+        self.record_failures(breaker, 4)
+        time.sleep(0.06)
+        self.record_failures(breaker, 1)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.stats()['transitions']['half_open->open'], 1)
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = self.make_breaker(slow_call_ms=100)
+        for _ in range(4):
+            self.assertTrue(breaker.allow())
+            breaker.record(True, elapsed_ms=250)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_stays_closed_below_threshold(self):
+        breaker = self.make_breaker(window=10, min_calls=4)
+        for success in (True, False, True, True, False, True, True, True):
+            breaker.record(success)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.stats()['failure_rate'], 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import socket
+import threading
+import time
+import unittest
+
+import requests
+
+from benchmarks.fake_ollama import FakeOllama
+from utils.ollama_pool import OllamaPool
+
+PAYLOAD = {'model': 'llava:latest', 'prompt': 'Identify the crop and any disease.', 'stream': False}
+
+
+def unused_url():
+    """URL of a local port nothing listens on, so connections are refused."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def calls(fake):
+    return sum(counts['calls'] for counts in fake.counts.values())
+
+
+class OllamaPoolTest(unittest.TestCase):
+
+    def start_fake(self, **options):
+        fake = FakeOllama(latency='constant:0', **options).start()
+        self.addCleanup(fake.stop)
+        return fake
+
+    def test_routes_to_backend_with_model(self):
+        without = self.start_fake(models=('moondream:latest',))
+        with_model = self.start_fake()
+        pool = OllamaPool([without.url, with_model.url])
+        self.assertTrue(pool.refresh())
+        for _ in range(4):
+            self.assertEqual(pool.generate(PAYLOAD, task='disease').status_code, 200)
+        self.assertEqual(calls(with_model), 4)
+        self.assertEqual(calls(without), 0)
+
+    def test_spreads_calls_across_equal_backends(self):
+        first, second = self.start_fake(), self.start_fake()
+        pool = OllamaPool([first.url, second.url])
+        pool.refresh()
+        for _ in range(6):
+            pool.generate(PAYLOAD, task='disease')
+        self.assertEqual((calls(first), calls(second)), (3, 3))
+
+    def test_fails_over_from_refused_backend(self):
+        fake = self.start_fake()
+        dead = unused_url()
+        pool = OllamaPool([dead, fake.url])
+        # Both look healthy until the dead one refuses a call
+        for backend in pool.backends:
+            backend.registry._reachable = True
+            backend.registry._models = ['llava:latest']
+            backend.registry._last_refresh = time.time()
+        pool.backends[0].routed = -1
+
+        response = pool.generate(PAYLOAD, task='disease')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls(fake), 1)
+        self.assertFalse(pool.backends[0].healthy())
+        self.assertEqual(pool.backends[0].in_flight, 0)
+        self.assertEqual(pool.last_timing()['backend'], fake.url)
+
+    def test_raises_when_every_backend_is_down(self):
+        pool = OllamaPool([unused_url()])
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            pool.generate(PAYLOAD, task='disease')
+
+    def test_streams_from_routed_backend(self):
+        fake = self.start_fake()
+        pool = OllamaPool([fake.url])
+        response = pool.generate_stream(PAYLOAD, task='disease')
+        self.assertEqual(pool.backends[0].in_flight, 1)
+        chunks = list(pool.iter_stream(response))
+        self.assertTrue(chunks[-1]['done'])
+        self.assertEqual(pool.backends[0].in_flight, 0)
+
+    def test_health_checks_do_not_hold_pool_lock(self):
+        fake = self.start_fake()
+        pool = OllamaPool([fake.url])
+        backend = pool.backends[0]
+        checking = threading.Event()
+
+        def slow_healthy():
+            # Stands in for a registry read that has to wait on /api/tags
+            checking.set()
+            time.sleep(0.5)
+            return True
+        backend.healthy = slow_healthy
+
+        thread = threading.Thread(target=pool._candidates, args=('llava:latest',))
+        thread.start()
+        self.assertTrue(checking.wait(2))
+        self.assertTrue(pool._lock.acquire(timeout=0.1), "pool lock held while checking backend health")
+        pool._lock.release()
+        thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
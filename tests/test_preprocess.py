@@ -0,0 +1,60 @@
+import io
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from utils.preprocess import ORIENTATION_TAG, ImagePreprocessor
+
+
+def small_jpeg(orientation=None, size=(320, 160)):
+    """A small, heavily compressed JPEG, so re-encoding it never makes it smaller."""
+    pixels = np.random.RandomState(0).randint(0, 120, (size[1], size[0], 3), dtype=np.uint8)
+    img = Image.fromarray(pixels)
+    img.paste((230, 20, 20), (0, 0, size[0] // 4, size[1]))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[ORIENTATION_TAG] = orientation
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=20, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class ImagePreprocessorTest(unittest.TestCase):
+
+    def test_rotated_upload_is_sent_upright(self):
+        raw = small_jpeg(orientation=6)
+        payload, info = ImagePreprocessor(quality=85).prepare(raw)
+
+        self.assertNotEqual(payload, raw)
+        self.assertTrue(info['rotated'])
+        self.assertFalse(info['resized'])
+        with Image.open(io.BytesIO(payload)) as img:
+            self.assertEqual(img.size, (160, 320))
+            self.assertIn(img.getexif().get(ORIENTATION_TAG, 1), (None, 1))
+            # Orientation 6 turns the red strip on the left edge into one along the top
+            self.assertGreater(img.convert('RGB').getpixel((80, 20))[0], 150)
+
+    def test_upright_small_upload_passes_through(self):
+        raw = small_jpeg()
+        preprocessor = ImagePreprocessor(quality=85)
+        payload, info = preprocessor.prepare(raw)
+        self.assertIs(payload, raw)
+        self.assertFalse(info['rotated'])
+        self.assertEqual(preprocessor.stats()['passthrough'], 1)
+
+    def test_orientation_one_passes_through(self):
+        raw = small_jpeg(orientation=1)
+        payload, _ = ImagePreprocessor(quality=85).prepare(raw)
+        self.assertIs(payload, raw)
+
+    def test_large_upload_is_resized(self):
+        raw = small_jpeg(size=(1600, 1200))
+        payload, info = ImagePreprocessor(max_side=672).prepare(raw)
+        self.assertTrue(info['resized'])
+        with Image.open(io.BytesIO(payload)) as img:
+            self.assertEqual(max(img.size), 672)
+
+
+if __name__ == '__main__':
+    unittest.main()
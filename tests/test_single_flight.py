@@ -0,0 +1,111 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from utils.single_flight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def test_do_waits_for_claimed_run(self):
+        flights = SingleFlight()
+        claimed = threading.Event()
+        calls = []
+        results = []
+
+        def leader():
+            with flights.claim('key') as flight:
+                self.assertFalse(flight.shared)
+                claimed.set()
+                time.sleep(0.2)
+                flight.result = {'crop_name': 'Tomato'}
+
+        def follower():
+            results.append(flights.do('key', lambda: calls.append(1) or {'crop_name': 'Wheat'}))
+
+        threads = [threading.Thread(target=leader)]
+        threads[0].start()
+        self.assertTrue(claimed.wait(2))
+        threads += [threading.Thread(target=follower) for _ in range(3)]
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [])
+        self.assertEqual(results, [{'crop_name': 'Tomato'}] * 3)
+        self.assertIsNot(results[0], results[1])
+        self.assertEqual(flights.stats()['coalesced'], 3)
+
+    def test_claim_shares_errors(self):
+        flights = SingleFlight()
+        claimed = threading.Event()
+        errors = []
+
+        def leader():
+            with self.assertRaises(RuntimeError):
+                with flights.claim('key'):
+                    claimed.set()
+                    time.sleep(0.1)
+                    raise RuntimeError('Ollama went away')
+
+        def follower():
+            try:
+                with flights.claim('key'):
+                    pass
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        first = threading.Thread(target=leader)
+        first.start()
+        self.assertTrue(claimed.wait(2))
+        second = threading.Thread(target=follower)
+        second.start()
+        first.join()
+        second.join()
+        self.assertEqual(errors, ['Ollama went away'])
+
+    def test_do_runs_again_when_claimed_run_left_no_result(self):
+        flights = SingleFlight()
+        claimed = threading.Event()
+        results = []
+
+        def leader():
+            with flights.claim('key'):
+                claimed.set()
+                time.sleep(0.1)
+
+        first = threading.Thread(target=leader)
+        first.start()
+        self.assertTrue(claimed.wait(2))
+        second = threading.Thread(target=lambda: results.append(flights.do('key', lambda: 'fresh')))
+        second.start()
+        first.join()
+        second.join()
+        self.assertEqual(results, ['fresh'])
+
+    def test_shared_lock_table(self):
+        db_path = os.path.join(tempfile.mkdtemp(), 'flights.db')
+        first, second = SingleFlight(db_path, poll_interval=0.02), SingleFlight(db_path, poll_interval=0.02)
+        second.owner = 'other-worker'
+        stored = {}
+        claimed = threading.Event()
+
+        def leader():
+            with first.claim('key') as flight:
+                claimed.set()
+                time.sleep(0.2)
+                flight.result = stored['key'] = 'from first'
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        self.assertTrue(claimed.wait(2))
+        self.assertEqual(second.do('key', lambda: 'from second', recheck=lambda: stored.get('key')), 'from first')
+        thread.join()
+        self.assertEqual(second.stats()['remote_hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
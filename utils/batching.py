@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Collect concurrent submissions into batches for a single worker thread.
+
+    Items are flushed when ``max_batch_size`` items are waiting or the oldest
+    item has waited ``max_wait_ms``, whichever comes first. ``run_batch`` is
+    called with a list of items and must return a list of results in the
+    same order; each caller gets its own result through a Future.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=10, name='micro-batcher'):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._full_batches = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._batch_time_total = 0.0
+
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue an item and return a Future resolved with its result."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('MicroBatcher is closed')
+            self._queue.append((item, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit an item and block until its result is ready."""
+        return self.submit(item).result(timeout=timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            # Wait for more items until the batch fills or the oldest item's deadline passes
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _worker(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            items = [entry[0] for entry in batch]
+            try:
+                results = self.run_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f'run_batch returned {len(results)} results for {len(items)} items')
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self._record(batch, started, time.perf_counter())
+
+    def _record(self, batch, started, finished):
+        waits = [started - enqueued for _, _, enqueued in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            if len(batch) >= self.max_batch_size:
+                self._full_batches += 1
+            self._queue_wait_total += sum(waits)
+            self._queue_wait_max = max(self._queue_wait_max, max(waits))
+            self._batch_time_total += finished - started
+
+    def stats(self):
+        """Return batch fill and queue wait counters."""
+        with self._stats_lock:
+            batches = self._batches or 1
+            items = self._items or 1
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': self._batches,
+                'items': self._items,
+                'full_batches': self._full_batches,
+                'avg_batch_fill': self._items / batches / self.max_batch_size if self._batches else 0.0,
+                'avg_queue_wait_ms': self._queue_wait_total / items * 1000.0 if self._items else 0.0,
+                'max_queue_wait_ms': self._queue_wait_max * 1000.0,
+                'avg_batch_time_ms': self._batch_time_total / batches * 1000.0 if self._batches else 0.0,
+                'queue_depth': len(self._queue),
+            }
@@ -0,0 +1,242 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when nothing was recorded for a request.
+
+    Deliberately not a ConnectionError: a gap in the recording says nothing
+    about the backend, so it must not trip circuit breakers or health checks.
+    """
+
+
+def _digest(data):
+    return hashlib.sha256(data.encode('utf-8') if isinstance(data, str) else data).hexdigest()
+
+
+def request_signature(payload):
+    """The JSON body with images replaced by their digests, so entries stay small."""
+    if not isinstance(payload, dict):
+        return payload
+    signature = dict(payload)
+    if signature.get('images'):
+        signature['images'] = [f"sha256:{_digest(image)}" for image in signature['images']]
+    return signature
+
+
+def request_key(method, path, payload):
+    return _digest(json.dumps([method, path, request_signature(payload)], sort_keys=True))
+
+
+def join_stream(lines):
+    """One /api/generate body from a streamed answer: the final chunk's fields with the whole text."""
+    parts = []
+    final = {}
+    for line in lines:
+        final = json.loads(line)
+        parts.append(final.get('response', ''))
+    return json.dumps(dict(final, response=''.join(parts)))
+
+
+class _ReplayStream:
+    """Stands in for urllib3's raw response, yielding recorded lines at their recorded offsets."""
+
+    def __init__(self, chunks, scale):
+        self.chunks = chunks
+        self.scale = scale
+        self.closed = False
+
+    def stream(self, chunk_size=None, decode_content=True):
+        started = time.perf_counter()
+        for offset_ms, line in self.chunks:
+            if self.closed:
+                return
+            delay = offset_ms * self.scale / 1000.0 - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            yield line.encode('utf-8') + b'\n'
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        pass
+
+
+class StreamRecorder:
+    """Collects the lines of a streaming response as ``OllamaClient.iter_stream`` reads them."""
+
+    def __init__(self, cassette, entry, started):
+        self.cassette = cassette
+        self.entry = entry
+        self.started = started
+        self.chunks = []
+
+    def add(self, line):
+        self.chunks.append([round((time.perf_counter() - self.started) * 1000.0, 3), line])
+
+    def finish(self):
+        self.entry['chunks'] = self.chunks
+        self.entry['timing']['total_ms'] = round((time.perf_counter() - self.started) * 1000.0, 3)
+        self.cassette._append(self.entry)
+
+
+class Cassette:
+    """Record Ollama calls to a JSON-lines file, or serve them back without Ollama.
+
+    In ``record`` mode every request the client sends is stored after it
+    completes, with its status, body (or, for streams, each line and when
+    it arrived) and timings. Images in the request are stored as digests.
+
+    In ``replay`` mode no connection is made: each request is answered with
+    a recorded response after the recorded latency multiplied by
+    ``latency_scale`` (0 answers at once). Requests are matched on method,
+    path and body; with ``fallback`` a request that was never recorded gets
+    the next recording for the same method, path and task instead (made with
+    streaming on or off like the request, if there is one), so other images
+    can be replayed against one cassette. Several recordings of the same
+    request are served in turn. A streamed recording asked for in one piece
+    is answered with a single body built from its chunks, as Ollama would.
+    """
+
+    def __init__(self, path, mode=REPLAY, latency_scale=1.0, fallback=True):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._by_route = {}
+        self._turns = {}
+        self._seen = set()
+        self._counts = {'recorded': 0, 'replayed': 0, 'fallbacks': 0, 'misses': 0}
+
+        if mode == REPLAY:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def _index(self, entry):
+        self._by_key.setdefault(entry['key'], []).append(entry)
+        route = (entry['method'], entry['path'], entry['task'], 'chunks' in entry)
+        self._by_route.setdefault(route, []).append(entry)
+
+    def _next(self, name, entries):
+        turn = self._turns.get(name, 0)
+        self._turns[name] = turn + 1
+        return entries[turn % len(entries)]
+
+    # --- record ------------------------------------------------------------
+
+    def _append(self, entry):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self._counts['recorded'] += 1
+
+    def record(self, method, path, task, payload, response, timing):
+        """Store a completed call; for streams, returns a StreamRecorder to feed the lines to."""
+        entry = {
+            'key': request_key(method, path, payload),
+            'method': method,
+            'path': path,
+            'task': task,
+            'request': request_signature(payload),
+            'status': response.status_code,
+            'headers': {name: value for name, value in response.headers.items()
+                        if name.lower() in ('content-type',)},
+            'timing': {'response_ms': round(timing['response_ms'] or 0.0, 3),
+                       'total_ms': round(timing['total_ms'], 3)},
+            'recorded_at': time.time(),
+        }
+        if timing.get('streaming'):
+            return StreamRecorder(self, entry, timing['started'])
+        entry['body'] = response.text
+        # Model-list probes repeat every few seconds; keep one copy of each distinct answer
+        fingerprint = (entry['key'], entry['status'], _digest(entry['body']))
+        with self._lock:
+            if fingerprint in self._seen:
+                return None
+            self._seen.add(fingerprint)
+        self._append(entry)
+        return None
+
+    # --- replay ------------------------------------------------------------
+
+    def replay(self, method, path, task, payload, stream=False):
+        """Return a requests.Response rebuilt from a recording, after the (scaled) recorded latency."""
+        key = request_key(method, path, payload)
+        with self._lock:
+            entries = self._by_key.get(key)
+            entry = self._next(key, entries) if entries else None
+            if entry is None and self.fallback:
+                # Prefer a recording made the same way; the other kind is converted below
+                for route in ((method, path, task, bool(stream)), (method, path, task, not stream)):
+                    if self._by_route.get(route):
+                        entry = self._next(route, self._by_route[route])
+                        self._counts['fallbacks'] += 1
+                        break
+            if entry is None:
+                self._counts['misses'] += 1
+                raise CassetteMiss(f"No recording for {method} {path} ({task}) in {self.path}")
+            self._counts['replayed'] += 1
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry.get('headers') or {})
+        response.encoding = 'utf-8'
+        response.url = path
+        response.elapsed = datetime.timedelta(milliseconds=entry['timing']['response_ms'] * self.latency_scale)
+
+        if 'chunks' in entry:
+            time.sleep(entry['timing']['response_ms'] * self.latency_scale / 1000.0)
+            if stream:
+                response.raw = _ReplayStream(entry['chunks'], self.latency_scale)
+                return response
+            # Recorded as a stream but asked for in one piece
+            time.sleep(max(0.0, entry['timing']['total_ms'] - entry['timing']['response_ms'])
+                       * self.latency_scale / 1000.0)
+            lines = [line for _, line in entry['chunks']]
+            try:
+                response._content = join_stream(lines).encode('utf-8')
+                response.headers['Content-Type'] = 'application/json; charset=utf-8'
+            except ValueError:
+                response._content = ''.join(line + '\n' for line in lines).encode('utf-8')
+            return response
+
+        time.sleep(entry['timing']['total_ms'] * self.latency_scale / 1000.0)
+        response._content = entry['body'].encode('utf-8')
+        if stream:
+            lines = [[0.0, line] for line in entry['body'].splitlines() if line]
+            response._content = False
+            response.raw = _ReplayStream(lines, self.latency_scale)
+        return response
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts.update({'mode': self.mode, 'path': self.path, 'latency_scale': self.latency_scale})
+        if self.replaying:
+            counts['recordings'] = sum(len(entries) for entries in self._by_key.values())
+        return counts
@@ -0,0 +1,115 @@
+import collections
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Fail fast while a backend keeps failing or answering too slowly.
+
+    Closed: calls go through and their outcomes fill a sliding window of the
+    last ``window`` calls. A call counts as failed when it raised, returned a
+    server error or took longer than ``slow_call_ms``. Once at least
+    ``min_calls`` are recorded and the failed share reaches
+    ``failure_rate_threshold`` the circuit opens.
+
+    Open: ``allow`` refuses every call for ``open_seconds``, after which the
+    circuit goes half-open.
+
+    Half-open: up to ``half_open_calls`` trial calls are let through. A
+    successful trial closes the circuit with a fresh window; a failed one
+    opens it again.
+    """
+
+    def __init__(self, name, failure_rate_threshold=0.5, slow_call_ms=90000, window=20, min_calls=5,
+                 open_seconds=30.0, half_open_calls=1):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_ms = slow_call_ms
+        self.window = window
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._outcomes = collections.deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = None
+        self._trials = 0
+        self._last_change = None
+        self._transitions = collections.Counter()
+        self._rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _set_state(self, state, reason):
+        previous = self._state
+        self._state = state
+        self._last_change = time.time()
+        self._transitions[f"{previous}->{state}"] += 1
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state in (CLOSED, HALF_OPEN):
+            self._trials = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        print(f"[CIRCUIT] {self.name}: {previous} -> {state} ({reason})")
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._set_state(HALF_OPEN, f"{self.open_seconds:.0f}s cool-down elapsed")
+
+    def allow(self):
+        """Return True if a call may proceed now; counts a rejection otherwise."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, success, elapsed_ms=None):
+        """Record the outcome of a call that ``allow`` let through."""
+        slow = elapsed_ms is not None and elapsed_ms > self.slow_call_ms
+        failed = not success or slow
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed:
+                    self._set_state(OPEN, 'trial call failed' if not success else 'trial call too slow')
+                else:
+                    self._set_state(CLOSED, 'trial call succeeded')
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) >= self.min_calls:
+                rate = sum(self._outcomes) / len(self._outcomes)
+                if rate >= self.failure_rate_threshold:
+                    self._set_state(OPEN, f"{rate:.0%} of the last {len(self._outcomes)} calls failed or were slow")
+
+    def stats(self):
+        with self._lock:
+            self._maybe_half_open()
+            outcomes = list(self._outcomes)
+            return {
+                'state': self._state,
+                'failure_rate': sum(outcomes) / len(outcomes) if outcomes else 0.0,
+                'window_calls': len(outcomes),
+                'rejected': self._rejected,
+                'state_changes': sum(self._transitions.values()),
+                'transitions': dict(self._transitions),
+                'last_change': self._last_change,
+            }
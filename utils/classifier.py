@@ -0,0 +1,252 @@
+import os
+import re
+import zipfile
+
+try:
+    import torch
+    import torch.nn.functional as F
+    from PIL import Image
+    import numpy as np
+    from utils.model import ResNet9
+except ImportError:  # torch is optional - without it the local tier is disabled
+    torch = None
+
+try:
+    import onnxruntime
+except ImportError:  # only needed to serve .onnx exports
+    onnxruntime = None
+
+from utils.batching import MicroBatcher
+from utils.disease import disease_dic
+
+
+# PlantVillage class order used when training ResNet9 (index -> label)
+disease_classes = ['Apple___Apple_scab',
+                   'Apple___Black_rot',
+                   'Apple___Cedar_apple_rust',
+                   'Apple___healthy',
+                   'Blueberry___healthy',
+                   'Cherry_(including_sour)___Powdery_mildew',
+                   'Cherry_(including_sour)___healthy',
+                   'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot',
+                   'Corn_(maize)___Common_rust_',
+                   'Corn_(maize)___Northern_Leaf_Blight',
+                   'Corn_(maize)___healthy',
+                   'Grape___Black_rot',
+                   'Grape___Esca_(Black_Measles)',
+                   'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)',
+                   'Grape___healthy',
+                   'Orange___Haunglongbing_(Citrus_greening)',
+                   'Peach___Bacterial_spot',
+                   'Peach___healthy',
+                   'Pepper,_bell___Bacterial_spot',
+                   'Pepper,_bell___healthy',
+                   'Potato___Early_blight',
+                   'Potato___Late_blight',
+                   'Potato___healthy',
+                   'Raspberry___healthy',
+                   'Soybean___healthy',
+                   'Squash___Powdery_mildew',
+                   'Strawberry___Leaf_scorch',
+                   'Strawberry___healthy',
+                   'Tomato___Bacterial_spot',
+                   'Tomato___Early_blight',
+                   'Tomato___Late_blight',
+                   'Tomato___Leaf_Mold',
+                   'Tomato___Septoria_leaf_spot',
+                   'Tomato___Spider_mites Two-spotted_spider_mite',
+                   'Tomato___Target_Spot',
+                   'Tomato___Tomato_Yellow_Leaf_Curl_Virus',
+                   'Tomato___Tomato_mosaic_virus',
+                   'Tomato___healthy']
+
+INPUT_SIZE = 256
+
+
+def split_label(label):
+    """Split a PlantVillage label like 'Tomato___Early_blight' into display names."""
+    crop, _, disease = label.partition('___')
+    crop = crop.split('_(')[0].replace(',_bell', '').replace('_', ' ').strip()
+    disease = disease.replace('_', ' ').strip().title()
+    return crop.title(), disease
+
+
+def load_image_tensor(image_path):
+    """Load an image file into a normalised 3xHxW float tensor."""
+    img = Image.open(image_path).convert('RGB').resize((INPUT_SIZE, INPUT_SIZE))
+    arr = np.asarray(img, dtype=np.float32) / 255.0
+    return torch.from_numpy(arr).permute(2, 0, 1).contiguous()
+
+
+def is_torchscript(path):
+    """True for a TorchScript archive (as opposed to a pickled state dict)."""
+    if not zipfile.is_zipfile(path):
+        return False
+    with zipfile.ZipFile(path) as archive:
+        return any(name.endswith('/constants.pkl') for name in archive.namelist())
+
+
+def normalized_entropy(probs):
+    """Entropy of each row of softmax probabilities, scaled to 0 (one class) .. 1 (uniform)."""
+    entropy = -(probs * torch.log(probs.clamp_min(1e-12))).sum(dim=1)
+    return entropy / float(np.log(probs.shape[1]))
+
+
+def confidence_level_for(score):
+    """Map a softmax probability onto the Low/Medium/High levels used by the templates."""
+    if score >= 0.9:
+        return 'High'
+    if score >= 0.75:
+        return 'Medium'
+    return 'Low'
+
+
+class LocalDiseaseClassifier:
+    """CPU ResNet9 classifier answering common PlantVillage diseases without Ollama.
+
+    ``weights_path`` may be the training state dict (served by the eager
+    model), a TorchScript archive or an ONNX file written by
+    ``utils.model_export``; ``backend`` reports which one was loaded.
+    ``num_threads`` sets the intra-op thread count for whichever runtime
+    serves the model.
+
+    ``predict`` only answers when the top class scores at least
+    ``threshold`` and the normalised entropy of the whole distribution is
+    at most ``max_entropy``; photos unlike the PlantVillage leaves it was
+    trained on (no plant, several plants, odd backgrounds) tend to spread
+    probability over many classes even when one of them is high. Requests
+    in a language outside ``languages`` are left to Ollama, since the
+    local descriptions are English only.
+    """
+
+    def __init__(self, weights_path, threshold=0.85, num_threads=None, max_batch_size=1, max_wait_ms=10,
+                 max_entropy=0.25, languages=('en',)):
+        self.weights_path = weights_path
+        self.threshold = threshold
+        self.max_entropy = max_entropy
+        self.languages = tuple(languages)
+        self.num_threads = num_threads
+        self.model = None
+        self.session = None
+        self.backend = None
+        self.load_error = None
+        self.batcher = None
+        self._load()
+        # Concurrent requests share one forward pass when batching is enabled
+        if self.available and max_batch_size > 1:
+            self.batcher = MicroBatcher(self._classify_batch, max_batch_size=max_batch_size,
+                                        max_wait_ms=max_wait_ms, name='resnet9-batcher')
+
+    def _load(self):
+        if torch is None:
+            self.load_error = 'torch is not installed'
+            return
+        if not os.path.exists(self.weights_path):
+            self.load_error = f'weights not found at {self.weights_path}'
+            return
+        try:
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            if self.weights_path.lower().endswith('.onnx'):
+                self._load_onnx()
+            elif is_torchscript(self.weights_path):
+                model = torch.jit.load(self.weights_path, map_location='cpu')
+                model.eval()
+                self.model = model
+                self.backend = 'torchscript'
+            else:
+                model = ResNet9(3, len(disease_classes))
+                model.load_state_dict(torch.load(self.weights_path, map_location=torch.device('cpu')))
+                model.eval()
+                self.model = model
+                self.backend = 'eager'
+        except Exception as e:
+            self.load_error = str(e)
+            self.model = None
+            self.session = None
+
+    def _load_onnx(self):
+        if onnxruntime is None:
+            raise RuntimeError('onnxruntime is not installed')
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        # Batches are run one at a time, so all threads go to the ops themselves
+        options.intra_op_num_threads = self.num_threads or 0
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(self.weights_path, options,
+                                                    providers=['CPUExecutionProvider'])
+        self.backend = 'onnx'
+
+    @property
+    def available(self):
+        return self.model is not None or self.session is not None
+
+    def preprocess(self, image_path):
+        """Load an image file into a normalised 3xHxW float tensor."""
+        return load_image_tensor(image_path)
+
+    def forward(self, batch):
+        """Run the model on a NxCxHxW batch and return softmax probabilities."""
+        if self.session is not None:
+            input_name = self.session.get_inputs()[0].name
+            logits = self.session.run(None, {input_name: batch.numpy()})[0]
+            return F.softmax(torch.from_numpy(logits), dim=1)
+        with torch.inference_mode():
+            return F.softmax(self.model(batch), dim=1)
+
+    def _classify_batch(self, tensors):
+        probs = self.forward(torch.stack(tensors))
+        scores, indices = torch.max(probs, dim=1)
+        entropies = normalized_entropy(probs)
+        return [(disease_classes[int(i)], float(s), float(h)) for s, i, h in zip(scores, indices, entropies)]
+
+    def classify(self, image_path):
+        """Return (label, probability, normalised entropy) for the top class of a single image."""
+        tensor = self.preprocess(image_path)
+        if self.batcher is not None:
+            return self.batcher(tensor)
+        return self._classify_batch([tensor])[0]
+
+    def stats(self):
+        """Return micro-batching counters, or an empty dict when batching is off."""
+        return self.batcher.stats() if self.batcher is not None else {}
+
+    def predict(self, image_path, lang='en'):
+        """Classify an image and return a result dict, or None when Ollama should answer instead."""
+        if not self.available:
+            return None
+        if lang not in self.languages:
+            print(f"[CLASSIFIER] Skipped: no local descriptions in '{lang}'")
+            return None
+        label, score, entropy = self.classify(image_path)
+        print(f"[CLASSIFIER] {label} ({score:.3f}, threshold {self.threshold}; "
+              f"entropy {entropy:.3f}, max {self.max_entropy})")
+        if score < self.threshold or entropy > self.max_entropy:
+            return None
+        return build_result(label, score)
+
+
+def build_result(label, score):
+    """Build a prediction dict in the same shape as ollama_predict_crop_disease."""
+    crop_name, disease_name = split_label(label)
+    healthy = disease_name == 'Healthy'
+    description = disease_dic.get(label)
+    if description:
+        description = re.sub(r'\s+', ' ', re.sub(r'<[^>]+>', ' ', description)).strip()
+    else:
+        description = ("The plant appears healthy with no visible disease symptoms." if healthy
+                       else f"Analysis complete. {disease_name} detected.")
+    return {
+        'label': f"{crop_name} - {disease_name}",
+        'score': round(score, 4),
+        'crop_name': crop_name,
+        'disease_name': disease_name,
+        'description': description,
+        'treatment_tip': ('No treatment needed. Keep monitoring your crop regularly.' if healthy
+                          else 'Please consult with an agricultural expert for specific treatment recommendations.'),
+        'disease_location': 'none' if healthy else 'entire leaf',
+        'symptoms_detected': [],
+        'confidence_level': confidence_level_for(score),
+        'no_flora': False,
+    }
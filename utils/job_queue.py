@@ -0,0 +1,278 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """Raised by ``submit`` when ``max_pending`` jobs are already waiting."""
+
+
+class JobQueue:
+    """Submit-and-poll queue for slow image analyses, stored in SQLite.
+
+    ``submit`` writes a row and returns its id immediately; a fixed pool of
+    ``workers`` threads claims queued rows and runs the handler registered
+    for the job's kind. Because the queue lives in the database, jobs left
+    behind by a restart are picked up again: queued rows simply wait for a
+    worker, and rows stuck in ``running`` whose process has exited (or, for
+    other hosts, whose lease has not been renewed for ``lease_seconds``) are
+    put back in the queue. A heartbeat thread renews the lease of every job
+    this process is running, so slow jobs are not run a second time.
+    Several app workers can share one database; claiming a row is a
+    conditional UPDATE, so each job runs once.
+
+    ``cleanup``, if given, is called with a job's params once the job has
+    finished and again when its row is pruned (e.g. to delete its upload);
+    it must tolerate being called twice.
+    """
+
+    def __init__(self, db_path, handlers, workers=2, max_pending=100, lease_seconds=600,
+                 retention_seconds=24 * 3600, poll_interval=1.0, cleanup=None):
+        self.db_path = db_path
+        self.handlers = dict(handlers)
+        self.workers = workers
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+        self.cleanup = cleanup
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counts = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'recovered': 0}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+                "result TEXT, error TEXT, owner TEXT, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'heartbeat_at' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        if self._threads:
+            return
+        self._stop.clear()
+        self.recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def submit(self, kind, params):
+        """Queue a job and return its id; raises JobQueueFull when the backlog is full."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        conn = self._connect()
+        pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+        if pending >= self.max_pending:
+            with self._lock:
+                self._counts['rejected'] += 1
+            raise JobQueueFull(f"{pending} jobs already waiting")
+
+        job_id = uuid.uuid4().hex
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), time.time())
+            )
+        with self._lock:
+            self._counts['submitted'] += 1
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        row = self._connect().execute(
+            "SELECT id, kind, status, result, error, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = {
+            'id': row[0], 'kind': row[1], 'status': row[2],
+            'result': json.loads(row[3]) if row[3] else None,
+            'error': row[4],
+            'created_at': row[5], 'started_at': row[6], 'finished_at': row[7],
+        }
+        if job['status'] == QUEUED:
+            job['position'] = self._connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, row[5])
+            ).fetchone()[0]
+        return job
+
+    def _owner_gone(self, owner):
+        # Only processes on this host can be checked directly; others rely on the lease
+        host, _, pid = (owner or '').rpartition(':')
+        if host != socket.gethostname() or not pid.isdigit():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    def _is_stale(self, owner, renewed_at, expired):
+        if owner == self.owner:
+            # Live while our workers run; before start() they belong to an earlier process with the same pid
+            return not self._threads
+        return (renewed_at or 0) < expired or self._owner_gone(owner)
+
+    def recover(self):
+        """Requeue jobs whose worker stopped without finishing them; returns the count."""
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT id, owner, COALESCE(heartbeat_at, started_at) FROM jobs WHERE status = ?", (RUNNING,)
+        ).fetchall()
+        expired = time.time() - self.lease_seconds
+        stale = [job_id for job_id, owner, renewed_at in rows if self._is_stale(owner, renewed_at, expired)]
+        recovered = 0
+        with conn:
+            for job_id in stale:
+                recovered += conn.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL, started_at = NULL, heartbeat_at = NULL "
+                    "WHERE id = ? AND status = ?",
+                    (QUEUED, job_id, RUNNING)
+                ).rowcount
+        if recovered:
+            print(f"[JOBS] Requeued {recovered} interrupted job(s)")
+            with self._lock:
+                self._counts['recovered'] += recovered
+        return recovered
+
+    def prune(self):
+        """Delete finished jobs older than retention_seconds."""
+        cutoff = time.time() - self.retention_seconds
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, params FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (DONE, FAILED, cutoff)
+            ).fetchall()
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id, _ in rows])
+        for _, params in rows:
+            self._cleanup(json.loads(params))
+
+    def _cleanup(self, params):
+        if self.cleanup is None:
+            return
+        try:
+            self.cleanup(params)
+        except Exception as e:
+            print(f"[JOBS] Cleanup failed: {e}")
+
+    def _heartbeat(self):
+        # Renew well inside the lease so a busy database cannot make it lapse
+        while not self._stop.wait(max(self.lease_seconds / 3, 1)):
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?",
+                        (time.time(), RUNNING, self.owner)
+                    )
+            except sqlite3.Error as e:
+                print(f"[JOBS] Could not renew job leases: {e}")
+
+    def _claim(self):
+        conn = self._connect()
+        while True:
+            row = conn.execute(
+                "SELECT id, kind, params FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, started_at = ?, heartbeat_at = NULL "
+                    "WHERE id = ? AND status = ?",
+                    (RUNNING, self.owner, time.time(), row[0], QUEUED)
+                )
+            if cursor.rowcount == 1:
+                return row[0], row[1], json.loads(row[2])
+            # Another worker claimed it first; try the next one
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+
+    def _run(self):
+        last_maintenance = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_maintenance > 60:
+                last_maintenance = time.monotonic()
+                try:
+                    self.recover()
+                    self.prune()
+                except sqlite3.Error as e:
+                    print(f"[JOBS] Maintenance failed: {e}")
+
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                print(f"[JOBS] Could not claim a job: {e}")
+                claimed = None
+            if claimed is None:
+                # Wait for a local submit, or poll for jobs queued by other workers
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, kind, params = claimed
+            try:
+                result = self.handlers[kind](**params)
+                self._finish(job_id, DONE, result=result)
+                with self._lock:
+                    self._counts['completed'] += 1
+            except Exception as e:
+                print(f"[JOBS] {kind} job {job_id} failed: {e}")
+                self._finish(job_id, FAILED, error=str(e))
+                with self._lock:
+                    self._counts['failed'] += 1
+            self._cleanup(params)
+
+    def stats(self):
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        with self._lock:
+            counts = dict(self._counts)
+        counts['by_status'] = {status: count for status, count in rows}
+        counts['workers'] = self.workers
+        counts['max_pending'] = self.max_pending
+        return counts
@@ -0,0 +1,282 @@
+"""Export the ResNet9 disease classifier for CPU serving.
+
+Writes a TorchScript archive or an ONNX file, optionally quantized to int8,
+and compares it with the eager FP32 model:
+
+    python -m utils.model_export --weights model/plant_disease_model.pth \\
+        --format torchscript --quantize static --images data/plantvillage/val \\
+        --output model/plant_disease_model.int8.pt --report model/export_report.json
+
+Point DISEASE_MODEL_PATH at the output to serve it; LocalDiseaseClassifier
+picks the runtime from the file.
+
+Quantization modes:
+  dynamic  int8 weights for the Linear head only (PyTorch) or every
+           Conv/MatMul (ONNX Runtime); needs no calibration data.
+  static   int8 weights and activations for the whole network, calibrated
+           on ``--calibration-images`` images (defaults to ``--images``).
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import torch
+import torch.nn.functional as F
+
+from utils.classifier import INPUT_SIZE, LocalDiseaseClassifier, disease_classes, load_image_tensor
+from utils.model import ResNet9
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_eager_model(weights_path):
+    model = ResNet9(3, len(disease_classes))
+    model.load_state_dict(torch.load(weights_path, map_location=torch.device('cpu')))
+    model.eval()
+    return model
+
+
+def find_images(directory, limit=None, seed=0):
+    """Return [(path, class_index or None)] under ``directory``.
+
+    Images in a folder named after a PlantVillage class (the dataset's own
+    layout) are labelled with that class; others are unlabelled.
+    """
+    class_index = {label: i for i, label in enumerate(disease_classes)}
+    images = []
+    for root, _, files in os.walk(directory):
+        label = class_index.get(os.path.basename(root))
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((os.path.join(root, name), label))
+    images.sort()
+    if limit and len(images) > limit:
+        images = random.Random(seed).sample(images, limit)
+    return images
+
+
+def calibration_batches(images, batch_size=8):
+    for start in range(0, len(images), batch_size):
+        yield torch.stack([load_image_tensor(path) for path, _ in images[start:start + batch_size]])
+
+
+def example_input(batch_size=1):
+    return torch.rand(batch_size, 3, INPUT_SIZE, INPUT_SIZE)
+
+
+# --- TorchScript -----------------------------------------------------------
+
+def quantize_torch(model, mode, calibration_images=None):
+    """Return an int8 copy of ``model`` using PyTorch's CPU quantization."""
+    if mode == 'dynamic':
+        # Dynamic quantization only covers Linear layers, i.e. the classifier head
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if mode == 'static':
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        if not calibration_images:
+            raise ValueError('Static quantization needs calibration images')
+        # FX mode fuses Conv+BN+ReLU and handles the residual adds without model changes
+        qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+        prepared = prepare_fx(model, qconfig_mapping, (example_input(),))
+        with torch.inference_mode():
+            for batch in calibration_batches(calibration_images):
+                prepared(batch)
+        return convert_fx(prepared)
+    raise ValueError(f'Unknown quantization mode: {mode}')
+
+
+def export_torchscript(model, output_path):
+    """Trace, freeze and save ``model`` as a TorchScript archive."""
+    with torch.inference_mode():
+        traced = torch.jit.trace(model, example_input())
+    frozen = torch.jit.freeze(traced.eval())
+    frozen.save(output_path)
+    return output_path
+
+
+# --- ONNX ------------------------------------------------------------------
+
+class _CalibrationReader:
+    """Feeds calibration batches to onnxruntime.quantization.quantize_static."""
+
+    def __init__(self, images, input_name):
+        self.input_name = input_name
+        self._batches = calibration_batches(images)
+
+    def get_next(self):
+        batch = next(self._batches, None)
+        return None if batch is None else {self.input_name: batch.numpy()}
+
+    def rewind(self):
+        pass
+
+
+def export_onnx(model, output_path, quantize=None, calibration_images=None, opset=17):
+    """Export ``model`` to ONNX with a dynamic batch axis, quantizing with ONNX Runtime if asked."""
+    fp32_path = output_path if not quantize else output_path + '.fp32.onnx'
+    torch.onnx.export(model, example_input(), fp32_path, input_names=['input'], output_names=['logits'],
+                      dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}}, opset_version=opset)
+    if not quantize:
+        return output_path
+
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared_path = output_path + '.prep.onnx'
+    quant_pre_process(fp32_path, prepared_path)
+    try:
+        if quantize == 'dynamic':
+            quantize_dynamic(prepared_path, output_path, weight_type=QuantType.QInt8)
+        elif quantize == 'static':
+            if not calibration_images:
+                raise ValueError('Static quantization needs calibration images')
+            quantize_static(prepared_path, output_path, _CalibrationReader(calibration_images, 'input'),
+                            quant_format=QuantFormat.QDQ, weight_type=QuantType.QInt8,
+                            activation_type=QuantType.QUInt8)
+        else:
+            raise ValueError(f'Unknown quantization mode: {quantize}')
+    finally:
+        for path in (fp32_path, prepared_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return output_path
+
+
+# --- comparison ------------------------------------------------------------
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def measure_latency(forward, batch_size=1, runs=50, warmup=5):
+    """Milliseconds per forward pass on random input of ``batch_size`` images."""
+    batch = example_input(batch_size)
+    for _ in range(warmup):
+        forward(batch)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        forward(batch)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return {
+        'batch_size': batch_size,
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p95_ms': round(_percentile(timings, 95), 3),
+        'images_per_second': round(batch_size * 1000.0 / (sum(timings) / len(timings)), 1),
+    }
+
+
+def compare(reference, candidate, images, batch_sizes=(1, 8), runs=50):
+    """Accuracy and latency of ``candidate`` against ``reference``.
+
+    Both are callables mapping an NxCxHxW batch to softmax probabilities.
+    ``agreement`` is the share of images where both pick the same class;
+    ``accuracy`` is only reported for images with a known label.
+    """
+    agree = 0
+    correct = {'reference': 0, 'candidate': 0}
+    labelled = 0
+    max_prob_diff = 0.0
+    for path, label in images:
+        batch = load_image_tensor(path).unsqueeze(0)
+        ref_probs = reference(batch)[0]
+        cand_probs = candidate(batch)[0]
+        ref_top = int(torch.argmax(ref_probs))
+        cand_top = int(torch.argmax(cand_probs))
+        agree += ref_top == cand_top
+        max_prob_diff = max(max_prob_diff, float(torch.max(torch.abs(ref_probs - cand_probs))))
+        if label is not None:
+            labelled += 1
+            correct['reference'] += ref_top == label
+            correct['candidate'] += cand_top == label
+
+    report = {
+        'images': len(images),
+        'labelled_images': labelled,
+        'top1_agreement': round(agree / len(images), 4) if images else None,
+        'max_probability_diff': round(max_prob_diff, 4),
+        'accuracy': {name: round(count / labelled, 4) for name, count in correct.items()} if labelled else None,
+        'latency': {},
+    }
+    for batch_size in batch_sizes:
+        report['latency'][str(batch_size)] = {
+            'reference': measure_latency(reference, batch_size, runs),
+            'candidate': measure_latency(candidate, batch_size, runs),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"Images: {report['images']} ({report['labelled_images']} labelled)")
+    print(f"Top-1 agreement with eager FP32: {report['top1_agreement']}")
+    print(f"Max probability difference: {report['max_probability_diff']}")
+    if report['accuracy']:
+        print(f"Accuracy: eager FP32 {report['accuracy']['reference']}, export {report['accuracy']['candidate']}")
+    print(f"{'batch':>6}{'fp32 p50 ms':>14}{'export p50 ms':>16}{'fp32 img/s':>12}{'export img/s':>14}")
+    for batch_size, result in report['latency'].items():
+        ref, cand = result['reference'], result['candidate']
+        print(f"{batch_size:>6}{ref['p50_ms']:>14}{cand['p50_ms']:>16}"
+              f"{ref['images_per_second']:>12}{cand['images_per_second']:>14}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--weights', default='model/plant_disease_model.pth', help='ResNet9 state dict')
+    parser.add_argument('--format', choices=('torchscript', 'onnx'), default='torchscript')
+    parser.add_argument('--quantize', choices=('none', 'dynamic', 'static'), default='none')
+    parser.add_argument('--output', help='Artifact path (default: next to the weights)')
+    parser.add_argument('--images', help='Image folder for the accuracy comparison (PlantVillage layout)')
+    parser.add_argument('--calibration-images', help='Image folder for static calibration (default: --images)')
+    parser.add_argument('--calibration-count', type=int, default=200)
+    parser.add_argument('--compare-count', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=0, help='Intra-op threads for the comparison (0 = default)')
+    parser.add_argument('--runs', type=int, default=50, help='Timed runs per batch size')
+    parser.add_argument('--report', help='Write the comparison report as JSON to this path')
+    args = parser.parse_args(argv)
+
+    quantize = None if args.quantize == 'none' else args.quantize
+    output = args.output
+    if not output:
+        suffix = '.onnx' if args.format == 'onnx' else '.pt'
+        output = os.path.splitext(args.weights)[0] + (f'.{quantize}-int8' if quantize else '') + suffix
+
+    calibration_dir = args.calibration_images or args.images
+    calibration_images = find_images(calibration_dir, args.calibration_count) if calibration_dir else None
+    if quantize == 'static' and not calibration_images:
+        parser.error('static quantization needs --images or --calibration-images')
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model = load_eager_model(args.weights)
+    if args.format == 'onnx':
+        export_onnx(model, output, quantize, calibration_images)
+    else:
+        export_torchscript(quantize_torch(model, quantize, calibration_images) if quantize else model, output)
+    print(f"Wrote {output} ({os.path.getsize(output) / 1e6:.1f} MB, "
+          f"state dict {os.path.getsize(args.weights) / 1e6:.1f} MB)")
+
+    exported = LocalDiseaseClassifier(output, num_threads=args.threads or None)
+    if not exported.available:
+        raise SystemExit(f"Could not load the export: {exported.load_error}")
+
+    def reference(batch):
+        with torch.inference_mode():
+            return F.softmax(model(batch), dim=1)
+
+    images = find_images(args.images, args.compare_count, seed=1) if args.images else []
+    report = compare(reference, exported.forward, images, runs=args.runs)
+    report.update({'artifact': output, 'format': args.format, 'quantize': quantize or 'none',
+                   'threads': torch.get_num_threads()})
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
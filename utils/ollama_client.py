@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Seconds to wait for the first byte of a response, per kind of call
+DEFAULT_TIMEOUTS = {
+    'disease': 120,
+    'soil': 120,
+    'fertilizer': 60,
+    'tags': 5,
+}
+
+_timing = threading.local()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _timing.connect = time.perf_counter() - started
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _timing.connect = time.perf_counter() - started
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled connections record how long TCP connect took."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class OllamaClient:
+    """Shared keep-alive HTTP client for the Ollama API.
+
+    One ``requests.Session`` with a bounded connection pool is reused by the
+    disease, soil and fertilizer analyzers, so calls reuse warm TCP
+    connections instead of opening a new one per request. Each call records
+    connect time (zero when a pooled connection was reused), time to
+    response headers and total time.
+
+    With a ``cassette`` (see utils.cassette) calls are also written to disk
+    in record mode, or answered from disk without contacting Ollama in
+    replay mode.
+    """
+
+    def __init__(self, base_url='http://localhost:11434', pool_size=10, connect_timeout=3.0, timeouts=None,
+                 cassette=None):
+        self.base_url = base_url.rstrip('/')
+        self.cassette = cassette
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+
+        self.session = requests.Session()
+        adapter = _TimedAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._last_call = threading.local()
+
+    def timeout_for(self, task):
+        return (self.connect_timeout, self.timeouts.get(task, self.timeouts['disease']))
+
+    def request(self, method, path, task, **kwargs):
+        """Send a request through the pool and record its timings under ``task``."""
+        kwargs.setdefault('timeout', self.timeout_for(task))
+        _timing.connect = None
+        started = time.perf_counter()
+        try:
+            if self.cassette is not None and self.cassette.replaying:
+                response = self.cassette.replay(method, path, task, kwargs.get('json'),
+                                                stream=kwargs.get('stream', False))
+            else:
+                response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+                if not kwargs.get('stream'):
+                    response.content  # read the body inside the timed window
+        except requests.exceptions.RequestException:
+            self._record(task, started, None, error=True)
+            raise
+        self._record(task, started, response, error=response.status_code >= 400)
+        if self.cassette is not None and not self.cassette.replaying:
+            timing = dict(self.last_timing(), streaming=bool(kwargs.get('stream')), started=started)
+            # Streams are stored once iter_stream has read them to the end
+            response._cassette_recorder = self.cassette.record(method, path, task, kwargs.get('json'),
+                                                               response, timing)
+        return response
+
+    def generate(self, payload, task):
+        """POST /api/generate."""
+        return self.request('POST', '/api/generate', task, json=payload)
+
+    def generate_stream(self, payload, task):
+        """POST /api/generate with streaming on; returns the open response.
+
+        Iterate it with ``iter_stream``. Recorded timings cover the time to
+        response headers, i.e. time to first byte.
+        """
+        payload = dict(payload, stream=True)
+        return self.request('POST', '/api/generate', task, json=payload, stream=True)
+
+    @staticmethod
+    def iter_stream(response):
+        """Yield the JSON chunks of a streaming /api/generate response."""
+        recorder = getattr(response, '_cassette_recorder', None)
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    chunk = json.loads(line)
+                    if recorder is not None:
+                        recorder.add(line.decode('utf-8'))
+                        # Callers may stop reading at the final chunk
+                        if chunk.get('done'):
+                            recorder.finish()
+                            recorder = None
+                    yield chunk
+
+    def list_models(self):
+        """Return the names of installed models from /api/tags."""
+        response = self.request('GET', '/api/tags', 'tags')
+        response.raise_for_status()
+        return [model.get('name', '') for model in response.json().get('models', [])]
+
+    def _record(self, task, started, response, error):
+        total = time.perf_counter() - started
+        connect = _timing.connect
+        timing = {
+            'task': task,
+            'connect_ms': connect * 1000.0 if connect is not None else 0.0,
+            'reused_connection': connect is None and response is not None,
+            'response_ms': response.elapsed.total_seconds() * 1000.0 if response is not None else None,
+            'total_ms': total * 1000.0,
+            'status': response.status_code if response is not None else None,
+        }
+        self._last_call.timing = timing
+        with self._lock:
+            stats = self._stats.setdefault(task, {
+                'calls': 0, 'errors': 0, 'new_connections': 0,
+                'connect_ms_total': 0.0, 'connect_ms_max': 0.0,
+                'response_ms_total': 0.0, 'total_ms_total': 0.0, 'total_ms_max': 0.0,
+            })
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            if connect is not None:
+                stats['new_connections'] += 1
+                stats['connect_ms_total'] += timing['connect_ms']
+                stats['connect_ms_max'] = max(stats['connect_ms_max'], timing['connect_ms'])
+            stats['response_ms_total'] += timing['response_ms'] or 0.0
+            stats['total_ms_total'] += timing['total_ms']
+            stats['total_ms_max'] = max(stats['total_ms_max'], timing['total_ms'])
+        if task != 'tags':
+            print(f"[OLLAMA] {task}: connect {timing['connect_ms']:.1f} ms, "
+                  f"total {timing['total_ms']:.1f} ms (status {timing['status']})")
+
+    def last_timing(self):
+        """Timings of the most recent call made from this thread."""
+        return getattr(self._last_call, 'timing', None)
+
+    def stats(self):
+        """Per-task call counts and average/max timings."""
+        with self._lock:
+            result = {}
+            for task, stats in self._stats.items():
+                calls = stats['calls'] or 1
+                new_connections = stats['new_connections'] or 1
+                result[task] = {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'new_connections': stats['new_connections'],
+                    'avg_connect_ms': stats['connect_ms_total'] / new_connections,
+                    'max_connect_ms': stats['connect_ms_max'],
+                    'avg_response_ms': stats['response_ms_total'] / calls,
+                    'avg_total_ms': stats['total_ms_total'] / calls,
+                    'max_total_ms': stats['total_ms_max'],
+                }
+        return {'base_url': self.base_url, 'pool_size': self.pool_size, 'tasks': result}
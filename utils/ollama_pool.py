@@ -0,0 +1,204 @@
+import threading
+import time
+
+import requests
+
+from utils.cassette import CassetteMiss
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, OPEN
+from utils.ollama_client import OllamaClient
+from utils.ollama_registry import ModelRegistry
+
+
+class OllamaBackend:
+    """One Ollama server: its pooled client, model registry, circuit breaker and in-flight count."""
+
+    def __init__(self, base_url, registry_ttl=30.0, breaker_options=None, **client_options):
+        self.client = OllamaClient(base_url, **client_options)
+        self.registry = ModelRegistry(self.client, ttl=registry_ttl)
+        self.base_url = self.client.base_url
+        self.breaker = CircuitBreaker(self.base_url, **(breaker_options or {}))
+        self.in_flight = 0
+        self.routed = 0
+
+    def healthy(self):
+        return self.registry.state()['reachable']
+
+    def has_model(self, model):
+        return model is None or model in self.registry.models()
+
+
+class OllamaPool:
+    """Routes Ollama calls across several servers.
+
+    Every backend keeps its own keep-alive client and a model registry whose
+    background refresh doubles as the health probe. Each call goes to the
+    healthy backend that has the requested model and the fewest requests in
+    flight; a backend that refuses the connection is marked down and the
+    call moves on to the next one. Model checks (``find``, ``state``) answer
+    for the pool as a whole, so callers use it like a single registry.
+
+    Each backend also sits behind a circuit breaker. Backends whose circuit
+    is open are skipped, and when every circuit is open the call raises
+    ``CircuitOpenError`` at once instead of waiting out a timeout.
+    """
+
+    def __init__(self, base_urls, registry_ttl=30.0, breaker_options=None, **client_options):
+        if not base_urls:
+            raise ValueError("At least one Ollama URL is required")
+        self.backends = [
+            OllamaBackend(url, registry_ttl=registry_ttl, breaker_options=breaker_options, **client_options)
+            for url in base_urls
+        ]
+        self._lock = threading.Lock()
+        self._last_backend = threading.local()
+
+    @property
+    def base_url(self):
+        return ', '.join(backend.base_url for backend in self.backends)
+
+    # --- routing ---------------------------------------------------------
+
+    def _candidates(self, model):
+        """Backends to try, best first: healthy with the model, then healthy, then the rest."""
+        # A registry that has not refreshed yet answers with a blocking /api/tags call,
+        # so read health and models before taking the lock the in-flight counts share
+        status = []
+        for backend in self.backends:
+            healthy = backend.healthy()
+            status.append((backend, backend.breaker.state == OPEN, healthy and backend.has_model(model), healthy))
+        with self._lock:
+            ranked = sorted(status, key=lambda s: (s[1], not s[2], not s[3], s[0].in_flight, s[0].routed))
+        return [backend for backend, *_ in ranked]
+
+    def _acquire(self, backend):
+        with self._lock:
+            backend.in_flight += 1
+            backend.routed += 1
+        self._last_backend.backend = backend
+
+    def _release(self, backend):
+        with self._lock:
+            backend.in_flight -= 1
+
+    def request(self, method, path, task, model=None, **kwargs):
+        """Send a request to the least busy healthy backend, failing over on refused connections.
+
+        Raises CircuitOpenError without contacting Ollama when every backend's circuit is open.
+        """
+        last_error = None
+        for backend in self._candidates(model):
+            if not backend.breaker.allow():
+                continue
+            self._acquire(backend)
+            started = time.perf_counter()
+            try:
+                response = backend.client.request(method, path, task, **kwargs)
+            except CassetteMiss:
+                self._release(backend)
+                raise
+            except requests.exceptions.ConnectionError as e:
+                self._release(backend)
+                backend.breaker.record(False)
+                backend.registry.mark_unreachable(e)
+                print(f"[OLLAMA] {backend.base_url} unreachable, trying next backend")
+                last_error = e
+                continue
+            except Exception:
+                self._release(backend)
+                backend.breaker.record(False)
+                raise
+            backend.breaker.record(response.status_code < 500, (time.perf_counter() - started) * 1000.0)
+            if kwargs.get('stream') and response.status_code < 400:
+                # Released by iter_stream once the body has been read
+                response._ollama_backend = backend
+            else:
+                self._release(backend)
+            return response
+        if last_error is None:
+            raise CircuitOpenError("All Ollama backends are failing; not sending new requests for now")
+        raise last_error
+
+    def generate(self, payload, task):
+        """POST /api/generate."""
+        return self.request('POST', '/api/generate', task, model=payload.get('model'), json=payload)
+
+    def generate_stream(self, payload, task):
+        """POST /api/generate with streaming on; iterate the response with ``iter_stream``."""
+        payload = dict(payload, stream=True)
+        return self.request('POST', '/api/generate', task, model=payload.get('model'), json=payload, stream=True)
+
+    def iter_stream(self, response):
+        backend = getattr(response, '_ollama_backend', None)
+        try:
+            yield from OllamaClient.iter_stream(response)
+        finally:
+            if backend is not None:
+                response._ollama_backend = None
+                self._release(backend)
+
+    def last_timing(self):
+        """Timings of the most recent call made from this thread, with the backend it went to."""
+        backend = getattr(self._last_backend, 'backend', None)
+        if backend is None:
+            return None
+        timing = backend.client.last_timing()
+        return dict(timing, backend=backend.base_url) if timing else None
+
+    # --- model registry --------------------------------------------------
+
+    def start(self):
+        for backend in self.backends:
+            backend.registry.start()
+
+    def stop(self):
+        for backend in self.backends:
+            backend.registry.stop()
+
+    def refresh(self):
+        """Probe every backend now; returns True when at least one answered."""
+        return any([backend.registry.refresh() for backend in self.backends])
+
+    def models(self):
+        """Models installed on at least one healthy backend."""
+        names = []
+        for backend in self.backends:
+            # models() runs the first probe synchronously if the background one has not yet
+            installed = backend.registry.models()
+            if backend.healthy():
+                names.extend(name for name in installed if name not in names)
+        return names
+
+    def find(self, model_name):
+        """Return (True, full_name) if a healthy backend has ``model_name``, else (False, models)."""
+        models = self.models()
+        for model in models:
+            if model_name in model.lower():
+                return True, model
+        return False, models
+
+    def state(self):
+        """Combined registry state; reachable when any backend is."""
+        states = [(backend.base_url, backend.registry.state()) for backend in self.backends]
+        ages = [state['age_seconds'] for _, state in states if state['age_seconds'] is not None]
+        errors = [f"{url}: {state['last_error']}" for url, state in states if state['last_error']]
+        return {
+            'reachable': any(state['reachable'] for _, state in states),
+            'models': self.models(),
+            'last_refresh': max((state['last_refresh'] or 0 for _, state in states), default=None) or None,
+            'age_seconds': max(ages) if ages else None,
+            'last_error': '; '.join(errors) or None,
+            'backends': {url: state['reachable'] for url, state in states},
+        }
+
+    def stats(self):
+        """Per-backend health, load and latency."""
+        backends = []
+        for backend in self.backends:
+            stats = backend.client.stats()
+            with self._lock:
+                stats['in_flight'] = backend.in_flight
+                stats['routed'] = backend.routed
+            stats['healthy'] = backend.healthy()
+            stats['circuit'] = backend.breaker.stats()
+            backends.append(stats)
+        return {'backends': backends}
@@ -0,0 +1,96 @@
+import threading
+import time
+
+
+class ModelRegistry:
+    """In-memory view of the models installed in Ollama.
+
+    A daemon thread refreshes the ``/api/tags`` list every ``ttl`` seconds so
+    availability checks on the request path are answered from memory
+    instead of costing a round trip to Ollama.
+    """
+
+    def __init__(self, client, ttl=30.0):
+        self.client = client
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._models = []
+        self._reachable = False
+        self._last_refresh = None
+        self._last_error = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def fetch_tags(self):
+        """Fetch the raw model list from Ollama."""
+        return self.client.list_models()
+
+    def refresh(self):
+        """Re-read the model list now; returns True when Ollama answered."""
+        try:
+            models = self.fetch_tags()
+            with self._lock:
+                self._models = models
+                self._reachable = True
+                self._last_error = None
+                self._last_refresh = time.time()
+            return True
+        except Exception as e:
+            with self._lock:
+                self._reachable = False
+                self._last_error = str(e)
+                self._last_refresh = time.time()
+            return False
+
+    def mark_unreachable(self, error):
+        """Record a failed call so routing skips this server until the next successful refresh."""
+        with self._lock:
+            self._reachable = False
+            self._last_error = str(error)
+
+    def start(self):
+        """Start the background refresh thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='ollama-model-registry', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.ttl)
+
+    def _ensure_loaded(self):
+        # Before the first background refresh completes, answer from a synchronous one
+        if self._last_refresh is None:
+            self.refresh()
+
+    def models(self):
+        """Return the cached list of installed model names."""
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._models)
+
+    def find(self, model_name):
+        """Return (True, full_name) if a model matching ``model_name`` is installed, else (False, models)."""
+        models = self.models()
+        # Check for exact match or partial match (e.g., "llava:latest" or "llava:7b")
+        for model in models:
+            if model_name in model.lower():
+                return True, model
+        return False, models
+
+    def state(self):
+        """Snapshot of the cached registry state for health endpoints."""
+        with self._lock:
+            return {
+                'reachable': self._reachable,
+                'models': list(self._models),
+                'last_refresh': self._last_refresh,
+                'age_seconds': time.time() - self._last_refresh if self._last_refresh else None,
+                'last_error': self._last_error,
+            }
@@ -0,0 +1,111 @@
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+HIGHLIGHT_RGB = (255, 0, 0)
+HIGHLIGHT_ALPHA = 100
+OUTLINE_WIDTH = 5
+FONT_PATHS = ("arial.ttf", "C:/Windows/Fonts/arial.ttf", "DejaVuSans.ttf",
+              "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+
+@lru_cache(maxsize=32)
+def load_font(size):
+    """The first TrueType font found at ``size``, else PIL's built-in font; cached per size."""
+    for path in FONT_PATHS:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def highlight_box(location, width, height):
+    """Map llava's disease_location text to an (x1, y1, x2, y2) box, or None for no highlight."""
+    location = location.lower() if location else 'none'
+    if location == 'none' or 'no disease' in location:
+        return None
+    half_w, half_h = int(width * 0.5), int(height * 0.5)
+    if 'center' in location or 'middle' in location:
+        return int(width * 0.2), int(height * 0.2), int(width * 0.8), int(height * 0.8)
+    if 'top' in location and 'left' in location:
+        return 0, 0, half_w, half_h
+    if 'top' in location and 'right' in location:
+        return half_w, 0, width, half_h
+    if 'bottom' in location and 'left' in location:
+        return 0, half_h, half_w, height
+    if 'bottom' in location and 'right' in location:
+        return half_w, half_h, width, height
+    if 'top' in location:
+        return 0, 0, width, half_h
+    if 'bottom' in location:
+        return 0, half_h, width, height
+    if 'left' in location:
+        return 0, 0, half_w, height
+    if 'right' in location:
+        return half_w, 0, width, height
+    if 'entire' in location or 'whole' in location or 'all' in location:
+        return 0, 0, width, height
+    return int(width * 0.25), int(height * 0.25), int(width * 0.75), int(height * 0.75)
+
+
+def open_display_copy(image_path, max_side):
+    """Open an image already reduced to fit ``max_side`` (JPEGs are decoded at reduced scale)."""
+    img = Image.open(image_path)
+    scale = max_side / max(img.size) if max_side else 1.0
+    if scale < 1.0:
+        # draft() keeps both sides at least this large, so ask for the fitted size
+        img.draft('RGB', (int(img.width * scale), int(img.height * scale)))
+    img = img.convert('RGB')
+    if max_side:
+        img.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+    return img
+
+
+@lru_cache(maxsize=8)
+def blend_table(color=HIGHLIGHT_RGB, alpha=HIGHLIGHT_ALPHA):
+    """Per-channel lookup table giving ``color`` blended over every input value at ``alpha``/255."""
+    values = np.arange(256, dtype=np.uint16)
+    table = (values[None, :] * (255 - alpha) + np.array(color, dtype=np.uint16)[:, None] * alpha + 127) // 255
+    return table.astype(np.uint8).ravel().tolist()
+
+
+def blend_region(img, box, color=HIGHLIGHT_RGB, alpha=HIGHLIGHT_ALPHA):
+    """Alpha-blend ``color`` over ``box`` (inclusive, like ImageDraw) of an RGB image, in place.
+
+    The colour and alpha are fixed, so the blend is a per-channel table
+    lookup applied to the cropped region only.
+    """
+    x1, y1, x2, y2 = box
+    x2, y2 = min(x2, img.width - 1), min(y2, img.height - 1)
+    if x2 < x1 or y2 < y1:
+        return img
+    region = img.crop((x1, y1, x2 + 1, y2 + 1))
+    img.paste(region.point(blend_table(color, alpha)), (x1, y1))
+    return img
+
+
+def render_highlight(image_path, disease_location, disease_name, max_side=800):
+    """Draw the disease highlight and label on a display-sized copy of the image.
+
+    Only the highlighted box is blended, so no full-size RGBA copies are
+    made; the label font is loaded once per size.
+    """
+    img = open_display_copy(image_path, max_side)
+    if 'healthy' in disease_name.lower():
+        return img
+    box = highlight_box(disease_location, img.width, img.height)
+    if box is None:
+        return img
+
+    blend_region(img, box)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle(box, outline=HIGHLIGHT_RGB, width=OUTLINE_WIDTH)
+
+    font = load_font(max(24, int(img.width / 25)))
+    text = f"Disease: {disease_name}"
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    draw.rectangle([10, 10, 10 + right - left + 20, 10 + bottom - top + 20], fill=HIGHLIGHT_RGB)
+    draw.text((20, 20), text, fill=(255, 255, 255), font=font)
+    return img
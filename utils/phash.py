@@ -0,0 +1,251 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+
+
+def _grayscale(image, size):
+    if not isinstance(image, Image.Image):
+        image = Image.open(io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image)
+    # draft() lets the JPEG decoder downscale while decoding, which is much cheaper
+    image.draft('L', (size[0] * 4, size[1] * 4))
+    return np.asarray(image.convert('L').resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def _pack(bits):
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(image):
+    """64-bit difference hash: compares horizontally adjacent pixels of a 9x8 thumbnail."""
+    pixels = _grayscale(image, (9, 8))
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+
+_DCT_SIZE = 32
+_k = np.arange(_DCT_SIZE)
+_DCT_MATRIX = np.cos(np.pi * (2 * _k[None, :] + 1) * _k[:, None] / (2 * _DCT_SIZE)).astype(np.float32)
+
+
+def phash(image):
+    """64-bit perceptual hash: low-frequency DCT coefficients of a 32x32 thumbnail vs. their median."""
+    pixels = _grayscale(image, (_DCT_SIZE, _DCT_SIZE))
+    dct = _DCT_MATRIX @ pixels @ _DCT_MATRIX.T
+    low = dct[:8, :8].ravel()
+    return _pack(low > np.median(low[1:]))
+
+
+HASH_FUNCTIONS = {'dhash': dhash, 'phash': phash}
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _to_signed(value):
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class PerceptualIndex:
+    """Near-duplicate lookup of stored analysis results by perceptual hash.
+
+    Uses multi-index hashing: the 64-bit hash is split into
+    ``max_distance + 1`` bands, so by the pigeonhole principle any stored
+    hash within ``max_distance`` bits agrees exactly with the query on at
+    least one band. Only entries sharing a band are compared, which keeps a
+    lookup to a few dict probes plus a handful of popcounts even with
+    hundreds of thousands of stored hashes. Larger distances mean narrower
+    bands and more candidates per lookup.
+
+    Results live in SQLite so every worker shares them; the in-memory bands
+    only hold (hash, row id, created_at) and are topped up from rows written
+    by other workers every ``sync_interval`` seconds. Like the result cache,
+    entries expire after ``ttl_seconds`` and the table is trimmed to the
+    newest ``max_entries`` rows; rows removed by any worker are dropped from
+    the bands at the next sync.
+    """
+
+    def __init__(self, db_path, max_distance=4, hash_name='dhash', sync_interval=5.0,
+                 ttl_seconds=7 * 24 * 3600, max_entries=10000):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.hash_name = hash_name
+        self.hash_function = HASH_FUNCTIONS[hash_name]
+        self.sync_interval = sync_interval
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._bands = self._band_layout(max_distance + 1)
+        self._tables = [dict() for _ in self._bands]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_row_id = 0
+        self._first_row_id = 0
+        self._last_sync = 0.0
+        self._size = 0
+        self._adds_since_prune = 0
+        self._counts = {'hits': 0, 'misses': 0, 'adds': 0, 'candidates': 0, 'expired': 0, 'evictions': 0}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS phash_index ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, "
+                "algorithm TEXT NOT NULL, hash INTEGER NOT NULL, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_phash_index_created ON phash_index (created_at)")
+        self.prune()
+
+    @staticmethod
+    def _band_layout(count):
+        widths = [HASH_BITS // count + (1 if i < HASH_BITS % count else 0) for i in range(count)]
+        layout, shift = [], HASH_BITS
+        for width in widths:
+            shift -= width
+            layout.append((shift, (1 << width) - 1))
+        return layout
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, namespace, value, row_id, created_at):
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table.setdefault((namespace, (value >> shift) & mask), []).append((value, row_id, created_at))
+        self._size += 1
+
+    def _drop_below(self, first_row_id):
+        """Forget band entries for rows older than ``first_row_id`` (pruned from SQLite)."""
+        for table in self._tables:
+            for key in list(table):
+                kept = [entry for entry in table[key] if entry[1] >= first_row_id]
+                if kept:
+                    table[key] = kept
+                else:
+                    del table[key]
+        self._size = sum(len(entries) for entries in self._tables[0].values())
+        self._first_row_id = first_row_id
+
+    def _sync(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        try:
+            conn = self._connect()
+            # Pruning always removes the oldest rows, so everything below the smallest id left is gone
+            first_row_id = conn.execute("SELECT MIN(id) FROM phash_index").fetchone()[0]
+            if first_row_id is None:
+                # Empty table: every row we know of is gone (AUTOINCREMENT never reuses ids)
+                first_row_id = self._last_row_id + 1
+            rows = conn.execute(
+                "SELECT id, namespace, hash, created_at FROM phash_index WHERE id > ? AND algorithm = ? ORDER BY id",
+                (self._last_row_id, self.hash_name)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[PHASH] SQLite sync failed: {e}")
+            return
+        with self._lock:
+            if first_row_id > self._first_row_id:
+                self._drop_below(first_row_id)
+            for row_id, namespace, value, created_at in rows:
+                if row_id > self._last_row_id:
+                    self._insert(namespace, _to_unsigned(value), row_id, created_at)
+                    self._last_row_id = row_id
+
+    def hash_image(self, image):
+        return self.hash_function(image)
+
+    def lookup(self, namespace, image_hash):
+        """Return (stored result, distance) for the closest match within max_distance, or (None, None)."""
+        self._sync()
+        cutoff = time.time() - self.ttl
+        best = None
+        with self._lock:
+            seen = set()
+            for table, (shift, mask) in zip(self._tables, self._bands):
+                for value, row_id, created_at in table.get((namespace, (image_hash >> shift) & mask), ()):
+                    if row_id in seen or created_at < cutoff:
+                        continue
+                    seen.add(row_id)
+                    distance = hamming(value, image_hash)
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, row_id)
+            self._counts['candidates'] += len(seen)
+            self._counts['hits' if best else 'misses'] += 1
+        if best is None:
+            return None, None
+        row = self._connect().execute("SELECT value FROM phash_index WHERE id = ?", (best[1],)).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), best[0]
+
+    def add(self, namespace, image_hash, result):
+        """Store a result under its perceptual hash."""
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO phash_index (namespace, algorithm, hash, value, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (namespace, self.hash_name, _to_signed(image_hash), json.dumps(result), time.time())
+                )
+            with self._lock:
+                self._counts['adds'] += 1
+                self._adds_since_prune += 1
+                prune = self._adds_since_prune >= 50
+            if prune:
+                self.prune()
+            # Pick up our own row (and anything other workers wrote before it)
+            self._sync(force=True)
+            return cursor.lastrowid
+        except sqlite3.Error as e:
+            print(f"[PHASH] SQLite write failed: {e}")
+            return None
+
+    def prune(self):
+        """Drop expired rows and trim the table to the newest ``max_entries``."""
+        with self._lock:
+            self._adds_since_prune = 0
+        try:
+            with self._connect() as conn:
+                expired = conn.execute(
+                    "DELETE FROM phash_index WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+                trimmed = conn.execute(
+                    "DELETE FROM phash_index WHERE id IN ("
+                    "SELECT id FROM phash_index ORDER BY id DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+        except sqlite3.Error as e:
+            print(f"[PHASH] SQLite prune failed: {e}")
+            return
+        with self._lock:
+            self._counts['expired'] += max(expired, 0)
+            self._counts['evictions'] += max(trimmed, 0)
+        self._sync(force=True)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            counts['size'] = self._size
+        counts['max_distance'] = self.max_distance
+        counts['algorithm'] = self.hash_name
+        return counts
@@ -0,0 +1,80 @@
+import io
+import threading
+
+from PIL import Image, ImageOps
+
+
+ORIENTATION_TAG = 0x0112
+
+
+class ImagePreprocessor:
+    """Shrink uploads to the vision model's working resolution before base64 encoding.
+
+    Applies the EXIF orientation, fits the image inside ``max_side`` pixels
+    and re-encodes it as JPEG at ``quality``. If the image needed neither
+    rotating nor resizing and the result is not smaller than the upload
+    (already small, already compressed) the original bytes are sent
+    unchanged; a rotated image is always sent re-encoded, since the raw bytes
+    would reach the model sideways.
+    """
+
+    def __init__(self, max_side=672, quality=85, enabled=True):
+        self.max_side = max_side
+        self.quality = quality
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counts = {'images': 0, 'resized': 0, 'rotated': 0, 'passthrough': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def prepare(self, img_bytes):
+        """Return (payload_bytes, info) where info reports the bytes saved."""
+        payload = img_bytes
+        resized = rotated = False
+        if self.enabled:
+            try:
+                payload, resized, rotated = self._shrink(img_bytes)
+            except Exception as e:
+                print(f"[PREPROCESS] Could not preprocess image, sending original: {e}")
+                payload = img_bytes
+        if not (resized or rotated) and len(payload) >= len(img_bytes):
+            payload = img_bytes
+        reencoded = payload is not img_bytes
+
+        info = {
+            'original_bytes': len(img_bytes),
+            'payload_bytes': len(payload),
+            'bytes_saved': len(img_bytes) - len(payload),
+            'resized': resized,
+            'rotated': rotated,
+        }
+        with self._lock:
+            self._counts['images'] += 1
+            self._counts['resized' if reencoded else 'passthrough'] += 1
+            self._counts['rotated'] += int(rotated)
+            self._counts['bytes_in'] += info['original_bytes']
+            self._counts['bytes_out'] += info['payload_bytes']
+        return payload, info
+
+    def _shrink(self, img_bytes):
+        """Return (jpeg_bytes, resized, rotated)."""
+        img = Image.open(io.BytesIO(img_bytes))
+        original_size = img.size
+        rotated = img.getexif().get(ORIENTATION_TAG, 1) not in (None, 1)
+        # Let the JPEG decoder do most of the downscaling while decoding
+        img.draft('RGB', (self.max_side, self.max_side))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        resized = max(img.size) < max(original_size)
+
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=self.quality, optimize=True)
+        return buffer.getvalue(), resized, rotated
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts['bytes_saved'] = counts['bytes_in'] - counts['bytes_out']
+        counts['max_side'] = self.max_side
+        counts['quality'] = self.quality
+        return counts
@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+    return f"{module}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Low-overhead wall-clock sampler for a live process.
+
+    A background thread reads every thread's current stack with
+    ``sys._current_frames()`` each ``interval`` seconds, so the profiled
+    code runs unmodified; the cost is one stack walk per thread per sample.
+    Pass ``thread_ids`` to sample only those threads (used to profile a
+    single request). ``collapsed()`` returns the samples in the collapsed
+    stack format read by flamegraph.pl, speedscope and inferno: one line
+    per distinct stack, root first, frames separated by ``;``, then the
+    number of samples.
+    """
+
+    def __init__(self, interval=0.005, thread_ids=None, max_depth=128):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids else None
+        self.max_depth = max_depth
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            self._stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            self._sample()
+            next_at += self.interval
+            # Skip missed ticks rather than bursting to catch up
+            delay = next_at - time.perf_counter()
+            if delay < 0:
+                next_at = time.perf_counter()
+                delay = 0
+            self._stop.wait(delay)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def run(self, seconds):
+        """Sample for ``seconds`` and return self."""
+        self.start()
+        try:
+            self._stop.wait(seconds)
+        finally:
+            self.stop()
+        return self
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
@@ -0,0 +1,285 @@
+import threading
+
+# Appended to the variable part of every prompt, so all languages share the same static prefix
+LANGUAGE_INSTRUCTIONS = {
+    'en': "",
+    'kn': "IMPORTANT: Respond in Kannada (ಕನ್ನಡ) language. All text in the JSON response should be in Kannada script.",
+}
+
+
+class PromptTemplate:
+    """A versioned prompt split into a static system part and a short variable part.
+
+    The static instructions go in Ollama's ``system`` field, which the model
+    template places before the image and the user prompt, so consecutive
+    requests share an identical prefix and Ollama can reuse its KV cache for
+    it. The variable part (language instruction, user inputs) is precompiled
+    per language at import; ``render`` only fills in ``str.format`` fields.
+    """
+
+    def __init__(self, name, version, system, prompt, languages=None):
+        self.name = name
+        self.version = version
+        self.system = system
+        languages = LANGUAGE_INSTRUCTIONS if languages is None else languages
+        self._prompts = {
+            lang: f"{prompt}\n\n{instruction}".rstrip() if instruction else prompt
+            for lang, instruction in languages.items()
+        }
+        self._has_fields = '{' in prompt
+
+    @property
+    def key(self):
+        """Identifier used in cache keys; changes whenever the prompt text does."""
+        return f"{self.name}-{self.version}"
+
+    def render(self, lang, **values):
+        """Return (system, prompt) for a language."""
+        prompt = self._prompts.get(lang, self._prompts['en'])
+        if self._has_fields:
+            prompt = prompt.format(**values)
+        return self.system, prompt
+
+
+class PromptRegistry:
+    """Precompiled prompt templates plus the request options shared by every call.
+
+    ``payload`` builds the /api/generate body, including ``keep_alive`` so
+    the model stays loaded between requests. ``record`` reads the prompt
+    evaluation counters Ollama returns and keeps per-template totals, which
+    show how much prompt processing the shared prefix saves.
+    """
+
+    def __init__(self, templates, keep_alive='30m'):
+        self.templates = {template.name: template for template in templates}
+        self.keep_alive = keep_alive
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def get(self, name):
+        return self.templates[name]
+
+    def payload(self, name, lang, model, images=None, **values):
+        system, prompt = self.templates[name].render(lang, **values)
+        payload = {
+            "model": model,
+            "system": system,
+            "prompt": prompt,
+            "stream": False,
+        }
+        if images:
+            payload["images"] = images
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def record(self, name, lang, result_data):
+        """Log and accumulate prompt-eval time from an Ollama response (or final stream chunk)."""
+        count = result_data.get('prompt_eval_count')
+        duration_ns = result_data.get('prompt_eval_duration')
+        if count is None and duration_ns is None:
+            return
+        eval_ms = (duration_ns or 0) / 1e6
+        template = self.templates[name]
+        print(f"[PROMPT] {template.key} ({lang}): {count or 0} prompt tokens evaluated in {eval_ms:.0f} ms")
+        with self._lock:
+            stats = self._stats.setdefault(template.key, {'calls': 0, 'prompt_eval_count': 0, 'prompt_eval_ms': 0.0})
+            stats['calls'] += 1
+            stats['prompt_eval_count'] += count or 0
+            stats['prompt_eval_ms'] += eval_ms
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for key, stats in self._stats.items():
+                calls = stats['calls'] or 1
+                result[key] = dict(stats,
+                                   avg_prompt_eval_count=stats['prompt_eval_count'] / calls,
+                                   avg_prompt_eval_ms=stats['prompt_eval_ms'] / calls)
+        return {'keep_alive': self.keep_alive, 'templates': result}
+
+
+DISEASE_PROMPT = PromptTemplate(
+    'disease', 'v2',
+    system=(
+        "You are an expert agricultural pathologist with 20+ years of experience in plant disease diagnosis. "
+        "Analyze the given image with EXTREME CARE and ACCURACY.\n\n"
+
+        "=== STEP 1: FLORA DETECTION (CRITICAL) ===\n"
+        "First, determine if this image contains ANY FLORA (plants, crops, vegetation):\n"
+        "- Look for: plants, crops, trees, shrubs, leaves, stems, flowers, fruits, agricultural vegetation\n"
+        "- Be VERY CAREFUL: Only set flora_detected=false if there are ABSOLUTELY NO plants visible\n"
+        "- If you see ANY plant parts (even partially visible), flora_detected MUST be true\n"
+        "- Examples of NO FLORA: only soil, animals, objects, people, buildings, sky, vehicles, tools\n"
+        "- Examples of FLORA PRESENT: any leaves, stems, fruits, flowers, or plant parts\n\n"
+
+        "=== STEP 2: CROP IDENTIFICATION (CRITICAL - MUST BE ACCURATE) ===\n"
+        "If flora is detected, FIRST identify the crop/plant type ACCURATELY:\n\n"
+        "A. EXAMINE LEAF CHARACTERISTICS:\n"
+        "   - Leaf shape: long and narrow (wheat, rice, corn), broad and round (tomato, potato), oval (apple), heart-shaped (grape), etc.\n"
+        "   - Leaf texture: smooth, rough, waxy, hairy, glossy\n"
+        "   - Leaf color: green shades, yellow, brown, red\n"
+        "   - Leaf size: small, medium, large\n"
+        "   - Leaf arrangement: single, compound, alternate, opposite\n"
+        "   - Leaf margins: smooth, serrated, lobed, toothed\n\n"
+
+        "B. EXAMINE PLANT CHARACTERISTICS:\n"
+        "   - Stem type: woody, herbaceous, climbing, upright\n"
+        "   - Plant structure: grass-like (wheat, rice, corn), bushy (tomato, pepper), tree-like (apple, mango), vine (grape, cucumber)\n"
+        "   - Overall appearance: cereal crop, vegetable, fruit tree, legume, etc.\n\n"
+
+        "C. CROP IDENTIFICATION GUIDELINES:\n"
+        "   - WHEAT: Long, narrow, linear leaves with parallel veins, grass-like appearance, typically green to yellow-green\n"
+        "   - RICE: Similar to wheat but often in water, long narrow leaves, grass-like\n"
+        "   - CORN/MAIZE: Very long, broad leaves with prominent midrib, grass-like but larger\n"
+        "   - TOMATO: Broad, lobed leaves with serrated edges, compound leaves, distinctive tomato plant structure\n"
+        "   - POTATO: Compound leaves with multiple leaflets, distinctive potato plant appearance\n"
+        "   - APPLE: Oval to elliptical leaves, serrated margins, tree-like structure\n"
+        "   - MANGO: Lanceolate leaves, glossy, tree-like structure\n"
+        "   - GRAPE: Heart-shaped or lobed leaves, vine structure\n"
+        "   - PEPPER: Similar to tomato but smaller leaves, bushy structure\n"
+        "   - COTTON: Broad, lobed leaves, distinctive cotton plant appearance\n"
+        "   - SUGARCANE: Very long, narrow leaves, grass-like but very tall\n"
+        "   - BANANA: Very large, broad leaves, distinctive banana plant structure\n"
+        "   - COCONUT: Long, pinnate leaves, palm tree structure\n"
+        "   - ORANGE: Oval, glossy leaves, citrus tree structure\n"
+        "   - POMEGRANATE: Small, glossy, oval leaves, shrub-like structure\n\n"
+
+        "D. ACCURACY REQUIREMENTS:\n"
+        "   - Look at the ACTUAL image content, not assumptions\n"
+        "   - If you see wheat leaves (long, narrow, grass-like), crop_name MUST be 'Wheat'\n"
+        "   - If you see tomato leaves (broad, lobed, compound), crop_name MUST be 'Tomato'\n"
+        "   - If you see potato leaves (compound with leaflets), crop_name MUST be 'Potato'\n"
+        "   - If uncertain about crop type, use 'Unknown' - DO NOT GUESS\n"
+        "   - Be SPECIFIC: 'Wheat' not 'Grain', 'Tomato' not 'Vegetable', 'Apple' not 'Fruit'\n\n"
+
+        "=== STEP 3: DISEASE ANALYSIS (Only after accurate crop identification) ===\n"
+        "After identifying the crop correctly, perform DETAILED disease analysis:\n\n"
+
+        "A. VISUAL SYMPTOM IDENTIFICATION:\n"
+        "   - Examine the image carefully for disease symptoms\n"
+        "   - Look for: black/brown spots, yellowing, wilting, fungal growth, white powder, holes, discoloration, lesions, blisters\n"
+        "   - Note the pattern: scattered spots, concentrated areas, edge damage, center damage, entire leaf affected\n"
+        "   - Check color changes: yellowing, browning, blackening, whitening\n"
+        "   - Observe texture: powdery, fuzzy, slimy, dry, wet\n\n"
+
+        "B. DISEASE IDENTIFICATION:\n"
+        "   - Identify the SPECIFIC disease name if possible (e.g., 'Early Blight', 'Late Blight', 'Leaf Spot', 'Rust', 'Powdery Mildew', 'Downy Mildew', 'Anthracnose', 'Bacterial Spot')\n"
+        "   - Consider the CROP TYPE when identifying disease (wheat diseases are different from tomato diseases)\n"
+        "   - Wheat diseases: Rust, Powdery Mildew, Leaf Blight, Septoria, Fusarium\n"
+        "   - Tomato diseases: Early Blight, Late Blight, Leaf Spot, Bacterial Spot, Powdery Mildew\n"
+        "   - Potato diseases: Late Blight, Early Blight, Scab, Blackleg\n"
+        "   - If symptoms are unclear, use 'Unknown Disease' with Low confidence\n"
+        "   - If plant appears healthy (no symptoms), disease_name = 'Healthy'\n"
+        "   - Be SPECIFIC: 'Wheat Rust' or 'Tomato Early Blight' - include crop name in disease if helpful\n"
+        "   - DO NOT confuse diseases from different crops\n\n"
+
+        "C. CONFIDENCE ASSESSMENT:\n"
+        "   - High: Clear, distinct symptoms matching known disease patterns\n"
+        "   - Medium: Symptoms visible but not perfectly matching known patterns\n"
+        "   - Low: Unclear symptoms or ambiguous signs\n"
+        "   - If healthy: Always High confidence\n\n"
+
+        "D. SYMPTOM LISTING:\n"
+        "   - List ALL visible symptoms in detail\n"
+        "   - Be specific: 'Black circular spots with yellow halos' not just 'spots'\n"
+        "   - Include location: 'Yellowing on lower leaves', 'Brown spots on leaf edges'\n\n"
+
+        "E. TREATMENT RECOMMENDATION:\n"
+        "   - Provide ACTIONABLE, PRACTICAL advice for farmers\n"
+        "   - Include: specific treatment methods, timing, frequency\n"
+        "   - Mention: organic/natural remedies if applicable\n"
+        "   - Consider: prevention measures for future\n"
+        "   - Use simple language farmers can understand\n\n"
+
+        "F. DISEASE LOCATION:\n"
+        "   - Describe WHERE the disease appears: 'center of leaf', 'top-left', 'bottom-right', 'entire leaf', 'leaf edges', 'stem base', etc.\n"
+        "   - Be specific about location for accurate highlighting\n"
+        "   - If healthy: use 'none'\n\n"
+
+        "=== CRITICAL RULES ===\n"
+        "1. CROP IDENTIFICATION MUST BE ACCURATE - Look at the actual image, not assumptions\n"
+        "2. If you see wheat leaves (long, narrow, grass-like), crop_name MUST be 'Wheat' - NOT 'Tomato'\n"
+        "3. If you see tomato leaves (broad, lobed), crop_name MUST be 'Tomato' - NOT 'Wheat'\n"
+        "4. If disease_name is NOT 'No Flora Detected' or 'Unknown', then flora_detected MUST be true\n"
+        "5. If disease_name is 'Healthy', flora_detected MUST be true\n"
+        "6. Only set flora_detected=false if image contains ZERO plants\n"
+        "7. If flora_detected=false, disease_name MUST be 'No Flora Detected'\n"
+        "8. Be ACCURATE: Don't guess crops or diseases - use 'Unknown' if uncertain\n"
+        "9. Confidence should reflect certainty: High only for clear cases\n"
+        "10. CROP IDENTIFICATION IS CRITICAL - Wrong crop = Wrong disease identification\n\n"
+
+        "=== OUTPUT FORMAT ===\n"
+        "Output ONLY valid JSON (no markdown, no explanations, just JSON):\n"
+        '{\n'
+        '  "flora_detected": true/false,\n'
+        '  "crop_name": "ACCURATE crop name based on actual image (e.g., Wheat, Rice, Corn, Tomato, Potato, Apple, Mango, Grape, Pepper, Cotton, Sugarcane, Banana, Coconut, Orange, Pomegranate) or unknown if uncertain",\n'
+        '  "disease_name": "specific disease name matching the identified crop (e.g., Wheat Rust, Tomato Early Blight, Potato Late Blight, Leaf Spot, Powdery Mildew) or healthy or unknown",\n'
+        '  "symptoms_detected": ["detailed symptom 1", "detailed symptom 2", "detailed symptom 3"],\n'
+        '  "confidence_level": "Low/Medium/High",\n'
+        '  "treatment_tip": "detailed, actionable treatment recommendation in 2-3 sentences specific to the identified crop and disease",\n'
+        '  "disease_location": "specific location description (e.g., center of leaf, top-left corner, entire leaf, leaf edges, stem base, or none if healthy)"\n'
+        '}\n\n'
+
+        "REMEMBER:\n"
+        "- CROP IDENTIFICATION IS CRITICAL - Identify the crop FIRST by examining leaf shape, texture, and plant structure\n"
+        "- If you see wheat leaves, crop_name MUST be 'Wheat' - do NOT say 'Tomato'\n"
+        "- If you see tomato leaves, crop_name MUST be 'Tomato' - do NOT say 'Wheat'\n"
+        "- Accuracy is critical. If uncertain about crop, use 'Unknown' with Low confidence rather than guessing.\n"
+        "- Wrong crop identification leads to wrong disease identification."
+    ),
+    prompt="Analyze the attached image following the instructions above and output only the JSON object.",
+)
+
+SOIL_PROMPT = PromptTemplate(
+    'soil', 'v2',
+    system=(
+        "You are an expert agricultural consultant. Analyze this image carefully.\n\n"
+        "FIRST, check if this image contains SOIL. Look for:\n"
+        "- Soil samples, dirt, earth, ground\n"
+        "- Soil texture, color, composition\n"
+        "- Agricultural soil, farmland soil\n\n"
+        "If NO SOIL is detected (e.g., the image shows plants, animals, objects, people, buildings, or anything else that is NOT soil), "
+        "respond with soil_detected: false.\n\n"
+        "If SOIL IS detected, identify the soil type (Alluvial, Black, Clay, Red, Sandy, Loamy, Silt) and recommend suitable crops.\n\n"
+        "Respond in JSON format with these exact fields: "
+        '{"soil_detected": true/false, "soil_type": "name of soil type or No Soil Detected", "recommended_crops": ["crop1", "crop2", ...], "confidence": 0.95, "description": "brief description", "crop_recommendations": "detailed crop recommendations"}\n\n'
+        'If soil_detected is false, set soil_type to "No Soil Detected" and recommended_crops to an empty array.'
+    ),
+    prompt="Analyze the attached image following the instructions above and output only the JSON object.",
+)
+
+FERTILIZER_PROMPT = PromptTemplate(
+    'fertilizer', 'v2',
+    system=(
+        "You are an expert agricultural advisor with deep knowledge of crop nutrition, soil science, and irrigation management. "
+        "Provide SPECIFIC, DETAILED fertilizer recommendations based on the exact conditions given in the request "
+        "(CROP TO GROW, SOIL TYPE and WATER AVAILABILITY).\n\n"
+        "ANALYSIS REQUIRED:\n"
+        "1. Analyze the specific nutrient needs of the crop at different growth stages.\n"
+        "2. Consider how the soil type affects nutrient availability and what adjustments are needed.\n"
+        "3. Factor in water availability - low water may require different fertilizer types or application methods.\n"
+        "4. Provide SPECIFIC fertilizer recommendations (exact NPK ratios, organic alternatives, micronutrients if needed).\n"
+        "5. Give detailed application instructions tailored to these specific conditions.\n"
+        "6. Explain timing based on the crop's growth cycle and the soil's characteristics.\n\n"
+        "IMPORTANT: Make your recommendations SPECIFIC to these exact conditions. Different crops, soil types, and water levels require DIFFERENT approaches.\n"
+        "DO NOT give generic advice. Be specific about:\n"
+        "- Exact fertilizer type and NPK ratio (e.g., NPK 19:19:19, DAP, Urea, SSP, etc.)\n"
+        "- Specific quantities per acre/hectare if possible\n"
+        "- How the soil type affects the choice\n"
+        "- How the water availability impacts fertilizer application\n"
+        "- Crop-specific timing (apply at specific growth stages of the crop)\n\n"
+        "Respond in JSON format:\n"
+        '{"recommendation": "detailed 3-4 sentence explanation specific to the crop, soil and water conditions - explain WHY these specific fertilizers are recommended", '
+        '"fertilizer_type": "specific fertilizer name and NPK ratio (e.g., NPK 19:19:19, DAP 18:46:0, Urea 46:0:0, or organic alternatives) - MUST be specific to the crop and soil", '
+        '"application_method": "detailed step-by-step instructions (3-4 steps) specific to the crop and soil conditions, including quantities if possible", '
+        '"timing": "specific timing based on the crop\'s growth stages (e.g., before planting, at 30 days, during flowering, etc.) - MUST be crop-specific", '
+        '"soil_analysis": "detailed analysis of how the soil type affects the crop\'s growth and why specific fertilizers are needed, considering the water availability"}\n\n'
+        "Remember: Each crop-soil-water combination is UNIQUE. Provide recommendations that reflect these specific conditions, not generic advice."
+    ),
+    prompt=(
+        "CROP TO GROW: {crop_name}\n"
+        "SOIL TYPE: {soil_type}\n"
+        "WATER AVAILABILITY: {water_availability}%"
+    ),
+)
@@ -0,0 +1,389 @@
+import json
+import re
+
+# ---------------------------------------------
+# Crop alias index
+# ---------------------------------------------
+
+# Crop names in the order free-text extraction prefers them: cereals and grains
+# first (distinctive long, narrow leaves), then vegetables, fruits and others
+CROPS_BY_PRIORITY = [
+    'Wheat', 'Rice', 'Corn', 'Maize', 'Sugarcane',
+    'Potato', 'Tomato', 'Pepper', 'Cucumber', 'Pumpkin', 'Watermelon', 'Muskmelon',
+    'Banana', 'Coconut', 'Mango', 'Apple', 'Grape', 'Cherry', 'Orange', 'Pomegranate',
+    'Cotton', 'Chickpea', 'Kidneybeans', 'Pigeonpeas', 'Mothbeans', 'Mungbean', 'Blackgram', 'Lentil',
+]
+
+# Order used when a JSON crop_name only partially matches a known crop ("wheat leaf" -> Wheat)
+CROPS_FOR_VALIDATION = [
+    'Wheat', 'Rice', 'Corn', 'Maize', 'Tomato', 'Potato', 'Apple', 'Mango',
+    'Grape', 'Pepper', 'Cherry', 'Banana', 'Coconut', 'Orange', 'Pomegranate',
+    'Cotton', 'Sugarcane', 'Cucumber', 'Pumpkin', 'Watermelon', 'Muskmelon',
+    'Chickpea', 'Kidneybeans', 'Pigeonpeas', 'Mothbeans', 'Mungbean', 'Blackgram', 'Lentil',
+]
+
+CROP_ALIASES = {crop.lower(): crop for crop in CROPS_BY_PRIORITY}
+
+
+def normalize_crop_name(name):
+    """Map a model-supplied crop name onto a known crop.
+
+    Returns (crop, how) where how is 'exact', 'partial' or None when the
+    name is not a known crop (crop is then the capitalized input).
+    """
+    crop_lower = name.lower().strip()
+    if crop_lower in CROP_ALIASES:
+        return CROP_ALIASES[crop_lower], 'exact'
+    for crop in CROPS_FOR_VALIDATION:
+        if crop_lower in crop.lower() or crop.lower() in crop_lower:
+            return crop, 'partial'
+    return name.strip().capitalize(), None
+
+
+# ---------------------------------------------
+# JSON locator
+# ---------------------------------------------
+
+_DECODER = json.JSONDecoder()
+
+
+def strip_code_fence(text):
+    """Return the body of the first markdown code fence (```json or ```), or the text unchanged."""
+    start = text.find('```')
+    if start == -1:
+        return text
+    start += 7 if text.startswith('```json', start) else 3
+    end = text.find('```', start)
+    return text[start:end if end != -1 else len(text)].strip()
+
+
+def find_json_object(text):
+    """Return the first JSON object in a model response, or None.
+
+    Handles bare JSON, JSON inside a markdown fence and JSON surrounded by
+    prose by decoding from each ``{`` in turn instead of slicing fences.
+    """
+    start = text.find('{')
+    while start != -1:
+        try:
+            value, _ = _DECODER.raw_decode(text, start)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+        start = text.find('{', start + 1)
+    return None
+
+
+# ---------------------------------------------
+# Single-pass keyword scanner
+# ---------------------------------------------
+
+DISEASE_INDICATORS = [
+    "disease", "blight", "rust", "spot", "mildew", "fungal", "symptom",
+    "healthy", "leaf", "plant", "crop", "vegetation", "tomato", "potato",
+    "apple", "corn", "pepper", "grape", "cherry", "rice", "wheat", "maize",
+    "banana", "mango", "orange", "pomegranate", "coconut", "cotton", "sugarcane",
+    "anthracnose", "bacterial", "virus", "infection", "lesion", "discoloration",
+    "yellowing", "wilting", "rotting", "blister", "canker",
+]
+
+NO_FLORA_PHRASES = [
+    "no flora detected", "no plant detected", "no crop detected",
+    "no vegetation detected", "does not contain flora", "does not contain plants",
+    "no flora found", "no plants found", "no crops found",
+    "image does not show", "no plants visible", "no crops visible",
+]
+
+# Narrower lists used to double-check a text answer after JSON parsing failed
+STRICT_NO_FLORA_PHRASES = NO_FLORA_PHRASES[:9]
+PLANT_INDICATORS = [
+    "disease", "blight", "rust", "spot", "mildew", "leaf", "plant", "crop",
+    "symptom", "healthy", "tomato", "potato", "apple", "corn", "pepper",
+]
+
+# (keyword, disease name), first match wins
+DISEASE_KEYWORDS = [
+    ("early blight", "Early Blight"),
+    ("late blight", "Late Blight"),
+    ("leaf spot", "Leaf Spot"),
+    ("bacterial spot", "Leaf Spot"),
+    ("powdery mildew", "Powdery Mildew"),
+    ("downy mildew", "Downy Mildew"),
+    ("rust", "Rust"),
+    ("anthracnose", "Anthracnose"),
+    ("blight", "Blight"),
+    ("spot", "Leaf Spot"),
+    ("mildew", "Mildew"),
+    ("disease", "Disease Detected"),
+]
+
+SYMPTOM_KEYWORDS = [
+    ("black spots", "Black spots"),
+    ("brown spots", "Brown spots"),
+    ("yellow spots", "Yellow spots"),
+    ("circular spots", "Circular spots"),
+    ("yellowing", "Yellowing"),
+    ("wilting", "Wilting"),
+    ("powdery", "Powdery growth"),
+    ("fuzzy", "Fuzzy growth"),
+    ("holes", "Holes in leaves"),
+    ("discoloration", "Discoloration"),
+    ("lesions", "Lesions"),
+    ("blisters", "Blisters"),
+    ("rotting", "Rotting"),
+]
+
+CONFIDENCE_KEYWORDS = ["high confidence", "high", "certain", "low confidence", "uncertain", "unclear"]
+LOCATION_KEYWORDS = ["top", "bottom", "left", "right", "entire", "whole", "edge", "center", "middle"]
+
+NO_SOIL_PHRASES = [
+    "no soil", "no dirt", "not soil", "not a soil", "does not contain soil",
+    "no soil detected", "not soil image", "doesn't contain soil",
+]
+
+# (keyword, soil type, crops), first match wins
+SOIL_KEYWORDS = [
+    ("alluvial", "Alluvial", ["Rice", "Wheat", "Sugarcane", "Maize", "Cotton", "Soyabean", "Jute"]),
+    ("black", "Black", ["Virginia", "Wheat", "Jowar", "Millets", "Linseed", "Castor", "Sunflower"]),
+    ("clay", "Clay", ["Rice", "Lettuce", "Chard", "Broccoli", "Cabbage", "Snap Beans"]),
+    ("red", "Red", ["Cotton", "Wheat", "Pulses", "Millets", "Oil Seeds", "Potatoes"]),
+]
+
+
+def _trie_pattern(words):
+    """Regex matching the longest of ``words`` at a position, built as a trie so each
+    position costs one branch per character instead of one attempt per word."""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        end = node.get('') is True
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if end:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class KeywordScanner:
+    """Find every occurrence of a fixed set of keywords in one pass.
+
+    The keywords are compiled into a single trie-shaped alternation, so the
+    text is walked once by the regex engine instead of once per keyword.
+    Overlapping hits are kept: each search resumes one character after the
+    previous match, and shorter keywords that are prefixes of a longer match
+    ("black" in "black spots") are added from a precomputed table.
+    """
+
+    def __init__(self, keywords, whole_words=()):
+        self.keywords = sorted(set(keywords) | set(whole_words))
+        self.whole_words = frozenset(whole_words)
+        self._pattern = re.compile(_trie_pattern(self.keywords))
+        self._prefixes = {
+            keyword: tuple(other for other in self.keywords if other != keyword and keyword.startswith(other))
+            for keyword in self.keywords
+        }
+
+    def scan(self, text):
+        return TextScan(self, text)
+
+
+class TextScan:
+    """The keywords a scanner found in one response.
+
+    ``found`` holds keywords present anywhere as substrings (the semantics
+    of ``keyword in text``); ``words`` holds the scanner's whole-word
+    keywords (crop names) that also appear with word boundaries.
+    """
+
+    __slots__ = ('found', 'words')
+
+    def __init__(self, scanner, text):
+        text_lower = text.lower()
+        length = len(text_lower)
+        search = scanner._pattern.search
+        found = set()
+        words = set()
+        pos = 0
+        while True:
+            match = search(text_lower, pos)
+            if match is None:
+                break
+            start = match.start()
+            pos = start + 1
+            keyword = match.group()
+            for hit in (keyword, *scanner._prefixes[keyword]):
+                found.add(hit)
+                if hit in scanner.whole_words:
+                    end = start + len(hit)
+                    if (start == 0 or not _is_word_char(text_lower[start - 1])) and \
+                            (end == length or not _is_word_char(text_lower[end])):
+                        words.add(hit)
+        self.found = found
+        self.words = words
+
+    def __contains__(self, keyword):
+        return keyword in self.found
+
+    def any(self, keywords):
+        return not self.found.isdisjoint(keywords)
+
+    def first(self, pairs):
+        """Value of the first (keyword, value) pair whose keyword was found."""
+        for keyword, value in pairs:
+            if keyword in self.found:
+                return value
+        return None
+
+    def crop(self):
+        """Highest-priority crop mentioned as a whole word, or None."""
+        for crop in CROPS_BY_PRIORITY:
+            if crop.lower() in self.words:
+                return crop
+        return None
+
+
+DISEASE_SCANNER = KeywordScanner(
+    DISEASE_INDICATORS + NO_FLORA_PHRASES + PLANT_INDICATORS + CONFIDENCE_KEYWORDS + LOCATION_KEYWORDS
+    + [keyword for keyword, _ in DISEASE_KEYWORDS]
+    + [keyword for keyword, _ in SYMPTOM_KEYWORDS],
+    whole_words=CROP_ALIASES,
+)
+
+SOIL_SCANNER = KeywordScanner(NO_SOIL_PHRASES + [keyword for keyword, _, _ in SOIL_KEYWORDS])
+
+
+# ---------------------------------------------
+# Free-text fallbacks
+# ---------------------------------------------
+
+def parse_text_response(text, scan=None):
+    """Parse text response when JSON parsing fails - Enhanced for accuracy."""
+    scan = scan or DISEASE_SCANNER.scan(text)
+
+    # Only return "no flora" if explicitly stated AND no disease/plant indicators
+    # This prevents false positives when disease is mentioned
+    if scan.any(NO_FLORA_PHRASES) and not scan.any(DISEASE_INDICATORS):
+        return {
+            'label': 'No Flora Detected',
+            'score': 1.0,
+            'crop_name': 'No Flora',
+            'disease_name': 'No Flora Detected',
+            'description': 'No flora (plants, crops, or vegetation) detected in this image.',
+            'treatment_tip': 'Please upload an image containing plants, crops, or vegetation for analysis.',
+            'disease_location': 'none',
+            'symptoms_detected': [],
+            'confidence_level': 'High',
+            'no_flora': True
+        }
+
+    confidence = 0.75
+
+    # Extract disease name with more specificity
+    if "healthy" in scan and scan.any(("plant", "crop", "leaf")):
+        disease_name = "Healthy"
+    else:
+        disease_name = scan.first(DISEASE_KEYWORDS) or "Unknown"
+
+    crop_name = scan.crop() or "Unknown"
+    if crop_name != "Unknown":
+        print(f"Extracted crop from text: {crop_name}")
+
+    symptoms = [symptom for keyword, symptom in SYMPTOM_KEYWORDS if keyword in scan]
+
+    # If no specific symptoms found but disease mentioned, add generic
+    if not symptoms and disease_name.lower() != "healthy" and disease_name.lower() != "unknown":
+        symptoms.append("Disease symptoms detected")
+
+    # Enhanced confidence level determination
+    confidence_level = 'Medium'
+    if "high confidence" in scan or ("high" in scan and "certain" in scan):
+        confidence_level = 'High'
+    elif "low confidence" in scan or "uncertain" in scan or "unclear" in scan:
+        confidence_level = 'Low'
+    elif "healthy" in scan:
+        confidence_level = 'High'
+    elif disease_name.lower() == "unknown":
+        confidence_level = 'Low'
+
+    # Extract disease location if mentioned
+    disease_location = 'center'
+    if "top" in scan and "left" in scan:
+        disease_location = "top-left"
+    elif "top" in scan and "right" in scan:
+        disease_location = "top-right"
+    elif "bottom" in scan and "left" in scan:
+        disease_location = "bottom-left"
+    elif "bottom" in scan and "right" in scan:
+        disease_location = "bottom-right"
+    elif "entire" in scan or "whole" in scan:
+        disease_location = "entire leaf"
+    elif "edge" in scan:
+        disease_location = "leaf edges"
+
+    # Format description
+    if symptoms:
+        description = f"Symptoms: {', '.join(symptoms)}"
+    elif disease_name.lower() == "healthy":
+        description = "The plant appears healthy with no visible disease symptoms."
+    else:
+        description = f"Disease detected: {disease_name}"
+
+    disease_label = f"{crop_name} - {disease_name}" if crop_name != "Unknown" else disease_name
+
+    return {
+        'label': disease_label,
+        'score': confidence,
+        'crop_name': crop_name,
+        'disease_name': disease_name,
+        'description': description,
+        'treatment_tip': 'Please consult with an agricultural expert for specific treatment recommendations. Consider organic treatments and proper crop management practices.',
+        'disease_location': disease_location,
+        'symptoms_detected': symptoms,
+        'confidence_level': confidence_level,
+        'no_flora': False  # If we got here, flora is present
+    }
+
+
+def parse_soil_text_response(text, scan=None):
+    """Parse text response when JSON parsing fails."""
+    scan = scan or SOIL_SCANNER.scan(text)
+
+    # Check if no soil is detected
+    if scan.any(NO_SOIL_PHRASES):
+        return {
+            'soil_type': 'No Soil Detected',
+            'recommended_crops': [],
+            'confidence': 1.0,
+            'description': 'No soil detected in this image. Please upload an image containing soil samples, dirt, or agricultural soil.',
+            'crop_recommendations': 'Please upload a clear image of soil for analysis.',
+            'no_soil': True
+        }
+
+    soil_type, recommended_crops = "Unknown", []
+    for keyword, name, crops in SOIL_KEYWORDS:
+        if keyword in scan:
+            soil_type, recommended_crops = name, list(crops)
+            break
+
+    return {
+        'soil_type': soil_type,
+        'recommended_crops': recommended_crops,
+        'confidence': 0.75,
+        'description': text[:200] if len(text) > 200 else text,
+        'crop_recommendations': f"Based on {soil_type} soil, recommended crops: {', '.join(recommended_crops) if recommended_crops else 'Please consult an agricultural expert.'}",
+        'no_soil': False
+    }
@@ -0,0 +1,153 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(task, image_bytes, lang, prompt_version):
+    """Content-address an analysis by image bytes, language and prompt version."""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return f"{task}:{prompt_version}:{lang}:{digest}"
+
+
+class ResultCache:
+    """Two-tier cache for analysis results.
+
+    The first tier is an in-process LRU; the second is a SQLite table that
+    every gunicorn worker on the host shares. Entries expire after
+    ``ttl_seconds`` and each tier is trimmed to its size limit, dropping
+    the least recently used entries first.
+    """
+
+    def __init__(self, db_path, memory_entries=256, db_entries=10000, ttl_seconds=7 * 24 * 3600):
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.db_entries = db_entries
+        self.ttl = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counts = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expired': 0}
+        self._writes_since_prune = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_accessed ON result_cache (accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def get(self, key):
+        """Return the cached value for ``key`` or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._counts['memory_hits'] += 1
+                    return copy.deepcopy(value)
+                del self._memory[key]
+                self._counts['expired'] += 1
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM result_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                    self._count('expired')
+                    row = None
+                if row is not None:
+                    conn.execute("UPDATE result_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"[CACHE] SQLite read failed: {e}")
+            row = None
+
+        if row is None:
+            self._count('misses')
+            return None
+
+        value = json.loads(row[0])
+        self._remember(key, copy.deepcopy(value), row[1])
+        self._count('db_hits')
+        return value
+
+    def set(self, key, value):
+        """Store ``value`` (JSON-serialisable) under ``key`` in both tiers."""
+        now = time.time()
+        self._remember(key, copy.deepcopy(value), now)
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO result_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now)
+                )
+            self._count('sets')
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 50:
+                self.prune()
+        except sqlite3.Error as e:
+            print(f"[CACHE] SQLite write failed: {e}")
+
+    def _remember(self, key, value, created_at):
+        with self._lock:
+            self._memory[key] = (created_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self._counts['evictions'] += 1
+
+    def prune(self):
+        """Drop expired rows and trim the shared tier to ``db_entries``."""
+        self._writes_since_prune = 0
+        try:
+            with self._connect() as conn:
+                expired = conn.execute(
+                    "DELETE FROM result_cache WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+                trimmed = conn.execute(
+                    "DELETE FROM result_cache WHERE key IN ("
+                    "SELECT key FROM result_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.db_entries,)
+                ).rowcount
+            self._count('expired', max(expired, 0))
+            self._count('evictions', max(trimmed, 0))
+        except sqlite3.Error as e:
+            print(f"[CACHE] SQLite prune failed: {e}")
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            counts = dict(self._counts)
+            counts['memory_size'] = len(self._memory)
+        try:
+            counts['db_size'] = self._connect().execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+        except sqlite3.Error:
+            counts['db_size'] = None
+        lookups = counts['memory_hits'] + counts['db_hits'] + counts['misses']
+        counts['hit_rate'] = (counts['memory_hits'] + counts['db_hits']) / lookups if lookups else 0.0
+        return counts
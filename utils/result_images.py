@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+import threading
+import time
+
+from PIL import Image
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def image_digest(img):
+    """Hash of an image's pixels, so identical renders share one URL."""
+    h = hashlib.sha256(f"{img.mode}:{img.width}x{img.height}:".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()[:32]
+
+
+def choose_format(accept):
+    """WebP when the Accept header allows it, else JPEG."""
+    return 'webp' if 'image/webp' in (accept or '') else 'jpg'
+
+
+class ResultImageStore:
+    """Rendered result images on disk, addressed by a hash of their pixels.
+
+    ``store`` writes a lossless master once per distinct image and returns
+    its digest. ``variant`` encodes the master as WebP or JPEG at the
+    requested quality the first time that variant is asked for and keeps
+    the file, so later requests (and other gunicorn workers on the host)
+    are served straight from disk. Images older than ``ttl_seconds`` are
+    removed every ``prune_every`` stores.
+    """
+
+    def __init__(self, directory, quality=80, save_data_quality=50, ttl_seconds=7 * 24 * 3600, prune_every=100):
+        self.directory = directory
+        self.quality = quality
+        self.save_data_quality = save_data_quality
+        self.ttl = ttl_seconds
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._counts = {'stored': 0, 'reused': 0, 'encoded': 0, 'pruned': 0}
+        self._stores_since_prune = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def store(self, img):
+        """Keep ``img`` (RGB) and return its digest."""
+        img = img.convert('RGB')
+        digest = image_digest(img)
+        master = self._path(f"{digest}.png")
+        if os.path.exists(master):
+            os.utime(master)
+            self._count('reused')
+        else:
+            # Write under a temporary name so other workers never read a partial master
+            tmp = self._path(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+            img.save(tmp, format='PNG', compress_level=1)
+            os.replace(tmp, master)
+            self._count('stored')
+
+        with self._lock:
+            self._stores_since_prune += 1
+            prune = self._stores_since_prune >= self.prune_every
+            if prune:
+                self._stores_since_prune = 0
+        if prune:
+            self.prune()
+        return digest
+
+    def variant(self, digest, fmt, save_data=False):
+        """Return (path, mimetype, quality) for an encoded variant, or None for an unknown image."""
+        if not DIGEST_PATTERN.match(digest) or fmt not in FORMATS:
+            return None
+        quality = self.save_data_quality if save_data else self.quality
+        path = self._path(f"{digest}.q{quality}.{fmt}")
+        if not os.path.exists(path):
+            master = self._path(f"{digest}.png")
+            if not os.path.exists(master):
+                return None
+            pil_format, _ = FORMATS[fmt]
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with Image.open(master) as img:
+                img.save(tmp, format=pil_format, quality=quality, method=4 if pil_format == 'WEBP' else 0,
+                         optimize=pil_format == 'JPEG')
+            os.replace(tmp, path)
+            self._count('encoded')
+        return path, FORMATS[fmt][1], quality
+
+    def prune(self):
+        """Delete images (and their variants) not stored again within ttl_seconds."""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            try:
+                if name.endswith('.tmp'):
+                    # Another worker may be writing it; only clear leftovers from crashes
+                    expired = os.path.getmtime(path) < cutoff
+                else:
+                    master = self._path(f"{name.split('.', 1)[0]}.png")
+                    expired = not os.path.exists(master) or os.path.getmtime(master) < cutoff
+                if expired:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        self._count('pruned', removed)
+        return removed
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts.update({'directory': self.directory, 'quality': self.quality,
+                       'save_data_quality': self.save_data_quality})
+        return counts
@@ -0,0 +1,175 @@
+import copy
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Flight:
+    """Handed out by ``SingleFlight.claim``."""
+
+    def __init__(self):
+        self.result = None
+        self.shared = False
+
+
+class SingleFlight:
+    """Run at most one analysis per key at a time and share its result.
+
+    Within a worker, the first thread to ask for a key runs the function and
+    any thread asking for the same key meanwhile waits for that run and gets
+    a copy of its result (or its exception).
+
+    With ``db_path`` set, workers also coordinate through a lock table in a
+    shared SQLite file: the worker holding a key's lock runs the analysis
+    while the others wait for the lock to be released and then call
+    ``recheck`` (normally a lookup in the shared result cache) before
+    falling back to running it themselves. Locks expire after ``lock_ttl``
+    seconds so a crashed worker cannot block a key for good.
+    """
+
+    def __init__(self, db_path=None, lock_ttl=180.0, poll_interval=0.25):
+        self.db_path = db_path
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counts = {'leaders': 0, 'coalesced': 0, 'remote_waits': 0, 'remote_hits': 0}
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS single_flight ("
+                    "key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def do(self, key, fn, recheck=None):
+        """Return fn() for ``key``, sharing one execution among concurrent callers."""
+        with self.claim(key, recheck) as flight:
+            if flight.shared and flight.result is not None:
+                return flight.result
+            # Leading, or the run we waited for ended without a result
+            flight.result = fn()
+        return copy.deepcopy(flight.result)
+
+    @contextmanager
+    def claim(self, key, recheck=None):
+        """Context-manager form of ``do`` for callers that report progress while they work.
+
+        The block runs as the leader for ``key`` unless another run could be
+        shared: then ``flight.shared`` is True and ``flight.result`` holds a
+        copy of that run's result (None if it ended without one). A leader
+        sets ``flight.result`` for the callers waiting on it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counts['leaders'] += 1
+            else:
+                self._counts['coalesced'] += 1
+
+        flight = Flight()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            flight.result = copy.deepcopy(call.result)
+            flight.shared = True
+            yield flight
+            return
+
+        try:
+            locked, flight.result = self._hold(key, recheck)
+            flight.shared = flight.result is not None
+            try:
+                yield flight
+                call.result = flight.result
+            finally:
+                if locked:
+                    self._release(key)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _hold(self, key, recheck):
+        """Take the shared lock for ``key``; returns (locked, result another worker stored meanwhile)."""
+        if not self.db_path:
+            return False, None
+
+        waited = False
+        deadline = time.monotonic() + self.lock_ttl
+        while not self._acquire(key):
+            if not waited:
+                self._count('remote_waits')
+                waited = True
+            if time.monotonic() > deadline:
+                # The holder is taking too long; do the work ourselves
+                return False, None
+            time.sleep(self.poll_interval)
+
+        if waited and recheck is not None:
+            result = recheck()
+            if result is not None:
+                self._count('remote_hits')
+                return True, result
+        return True, None
+
+    def _acquire(self, key):
+        now = time.time()
+        try:
+            conn = self._connect()
+            cursor = conn.execute(
+                "INSERT INTO single_flight (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE single_flight.expires_at < ?",
+                (key, self.owner, now + self.lock_ttl, now)
+            )
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            print(f"[SINGLEFLIGHT] Lock table unavailable, running without it: {e}")
+            return True
+
+    def _release(self, key):
+        try:
+            self._connect().execute("DELETE FROM single_flight WHERE key = ? AND owner = ?", (key, self.owner))
+        except sqlite3.Error as e:
+            print(f"[SINGLEFLIGHT] Could not release lock: {e}")
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            counts['in_flight'] = len(self._calls)
+        counts['shared'] = bool(self.db_path)
+        return counts
@@ -0,0 +1,45 @@
+import json
+import re
+
+# A complete JSON value for a top-level field: string, boolean, null, number or flat array
+_VALUE = r'("(?:[^"\\]|\\.)*"|true|false|null|-?\d+(?:\.\d+)?(?=\s*[,}])|\[(?:[^\[\]"]|"(?:[^"\\]|\\.)*")*\])'
+
+
+class PartialFieldScanner:
+    """Pull finished fields out of a JSON object while it is still being generated.
+
+    Feed the model's output chunk by chunk; ``feed`` returns the
+    ``(name, value)`` pairs whose values became complete since the last
+    call. Each field is reported once.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self._patterns = {
+            name: re.compile(r'"' + re.escape(name) + r'"\s*:\s*' + _VALUE, re.DOTALL)
+            for name in self.fields
+        }
+        self.text = ''
+        self.found = {}
+
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+        for name in self.fields:
+            if name in self.found:
+                continue
+            match = self._patterns[name].search(self.text)
+            if match is None:
+                continue
+            try:
+                value = json.loads(match.group(1))
+            except ValueError:
+                continue
+            self.found[name] = value
+            completed.append((name, value))
+        return completed
+
+
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
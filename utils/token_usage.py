@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+# Counters Ollama returns with a finished generation (durations in nanoseconds)
+USAGE_FIELDS = ('prompt_eval_count', 'prompt_eval_duration', 'eval_count', 'eval_duration', 'load_duration')
+
+
+def _rate(tokens, ms):
+    return tokens / (ms / 1000.0) if ms else 0.0
+
+
+class TokenUsage:
+    """Per-call token and timing accounting from Ollama's response metadata.
+
+    ``record`` takes a non-streaming response body (or the final stream
+    chunk) and keeps running totals per (task, model, language): prompt
+    and generated tokens, the time Ollama spent on each, and model load
+    time. A call whose ``load_duration`` is at least ``cold_load_ms`` is
+    counted as a cold load, i.e. the model had to be loaded into memory
+    first. Each call is also appended as a JSON line to a size-rotated
+    log file when ``log_path`` is set.
+    """
+
+    def __init__(self, log_path=None, max_bytes=10 * 1024 * 1024, backups=5, cold_load_ms=1000.0):
+        self.log_path = log_path
+        self.cold_load_ms = cold_load_ms
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._logger = None
+        if log_path:
+            directory = os.path.dirname(log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger = logging.getLogger(f"{__name__}.{os.path.abspath(log_path)}")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            self._logger.handlers = [handler]
+
+    def record(self, task, lang, result_data, model=None):
+        """Account one finished generation; returns the per-call record, or None without counters."""
+        if not any(result_data.get(field) is not None for field in USAGE_FIELDS):
+            return None
+        prompt_ms = (result_data.get('prompt_eval_duration') or 0) / 1e6
+        eval_ms = (result_data.get('eval_duration') or 0) / 1e6
+        load_ms = (result_data.get('load_duration') or 0) / 1e6
+        entry = {
+            'ts': round(time.time(), 3),
+            'task': task,
+            'model': result_data.get('model') or model or 'unknown',
+            'lang': lang or 'unknown',
+            'prompt_tokens': result_data.get('prompt_eval_count') or 0,
+            'prompt_ms': round(prompt_ms, 3),
+            'eval_tokens': result_data.get('eval_count') or 0,
+            'eval_ms': round(eval_ms, 3),
+            'load_ms': round(load_ms, 3),
+            'cold_load': load_ms >= self.cold_load_ms,
+        }
+        entry['prompt_tokens_per_s'] = round(_rate(entry['prompt_tokens'], prompt_ms), 2)
+        entry['eval_tokens_per_s'] = round(_rate(entry['eval_tokens'], eval_ms), 2)
+
+        with self._lock:
+            totals = self._totals.setdefault((task, entry['model'], entry['lang']), {
+                'calls': 0, 'cold_loads': 0, 'prompt_tokens': 0, 'prompt_ms': 0.0,
+                'eval_tokens': 0, 'eval_ms': 0.0, 'load_ms': 0.0,
+            })
+            totals['calls'] += 1
+            totals['cold_loads'] += int(entry['cold_load'])
+            totals['prompt_tokens'] += entry['prompt_tokens']
+            totals['prompt_ms'] += prompt_ms
+            totals['eval_tokens'] += entry['eval_tokens']
+            totals['eval_ms'] += eval_ms
+            totals['load_ms'] += load_ms
+
+        print(f"[TOKENS] {task} {entry['model']} ({entry['lang']}): {entry['prompt_tokens']} prompt tokens at "
+              f"{entry['prompt_tokens_per_s']:.0f}/s, {entry['eval_tokens']} generated at "
+              f"{entry['eval_tokens_per_s']:.1f}/s" + (f", cold load {load_ms:.0f} ms" if entry['cold_load'] else ''))
+        if self._logger is not None:
+            try:
+                self._logger.info(json.dumps(entry))
+            except Exception as e:
+                print(f"[TOKENS] Could not write {self.log_path}: {e}")
+        return entry
+
+    def totals(self):
+        """Raw running totals as [((task, model, lang), totals_dict)], for the metrics exporter."""
+        with self._lock:
+            return [(key, dict(totals)) for key, totals in sorted(self._totals.items())]
+
+    def stats(self):
+        groups = []
+        for (task, model, lang), totals in self.totals():
+            calls = totals['calls'] or 1
+            groups.append(dict(
+                totals, task=task, model=model, lang=lang,
+                prompt_tokens_per_s=_rate(totals['prompt_tokens'], totals['prompt_ms']),
+                eval_tokens_per_s=_rate(totals['eval_tokens'], totals['eval_ms']),
+                avg_prompt_tokens=totals['prompt_tokens'] / calls,
+                avg_eval_tokens=totals['eval_tokens'] / calls,
+                avg_load_ms=totals['load_ms'] / calls,
+            ))
+        return {'log_path': self.log_path, 'cold_load_ms': self.cold_load_ms, 'groups': groups}